@@ -26,6 +26,9 @@ def create_app(config_name=None):
     config[config_name].init_app(app) 
 
     db.init_app(app)
+
+    from .utils.device_locks import init_device_locks
+    init_device_locks(app)
     # Set default limits untuk limiter dari config SETELAH app.config dimuat
     limiter.init_app(app)
     # Flask-Limiter akan membaca konfigurasinya (seperti RATELIMIT_STORAGE_URL) dari app.config
@@ -38,23 +41,56 @@ def create_app(config_name=None):
     app.register_blueprint(log_bp, url_prefix='/api/v1/logs') 
     app.register_blueprint(setting_bp, url_prefix='/api/v1/settings')
 
+    if app.config.get('REQUEST_DECOMPRESSION_ENABLED', True):
+        from .utils.request_decompression import RequestDecompressionMiddleware
+        app.wsgi_app = RequestDecompressionMiddleware(app.wsgi_app)
+
+    from .utils.cli_commands import register_cli_commands
+    register_cli_commands(app)
+
+    from .utils import metrics
+    metrics.init_app(app)
+
+    from .services.cursor_cache import cursor_cache
+    cursor_cache.init_app(app)
+
+    from .services.log_writer import log_writer
+    log_writer.init_app(app)
+
+    from .services.log_tail import log_tail_hub
+    log_tail_hub.init_app(app)
+
+    from .utils.scheduler_leader import scheduler_leader
+    scheduler_leader.init_app(app, scheduler)
+
+    if app.config.get('INGEST_ASYNC_MODE'):
+        from .services.ingest_queue import ingest_queue
+        ingest_queue.init_app(app)
+
     with app.app_context():
         db.create_all() 
+
+        from .services.search_index import init_search_schema
+        init_search_schema(app) # Tabel FTS5/tsvector tidak bisa dibuat lewat create_all
         
         from .services.setting_service import initialize_app_settings_on_startup
         initialize_app_settings_on_startup(app) 
 
-        if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-            if not scheduler.running:
-                from .utils.scheduler_tasks import schedule_cleanup_job
-                schedule_cleanup_job(app, scheduler) 
-                try:
-                    scheduler.start()
-                    app.logger.info("APScheduler started for log cleanup.")
-                except Exception as e: 
-                    app.logger.warning(f"APScheduler already running or failed to start: {e}")
+        if app.config.get('PREFORK_SERVER'):
+            # Thread tidak ikut ter-fork; gunicorn.conf.py memanggil start_background_services di setiap worker
+            app.logger.info("Background services will start in each worker process after fork.")
+        elif not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_background_services(app)
         else:
             app.logger.info("APScheduler not started in Flask debug reloader process (or not main process).")
             
     app.logger.info(f"Application '{app.name}' created with config '{config_name}'.") 
-    return app
\ No newline at end of file
+    return app
+
+def start_background_services(app):
+    """Memulai pemilihan leader scheduler dan worker ingest asinkron di proses ini."""
+    from .utils.scheduler_leader import scheduler_leader
+    scheduler_leader.start() # Hanya satu proses (leader) yang menjalankan job APScheduler
+    if app.config.get('INGEST_ASYNC_MODE'):
+        from .services.ingest_queue import ingest_queue
+        ingest_queue.start() # Memproses ulang job yang tertinggal di spool sejak sebelum restart
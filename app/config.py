@@ -16,9 +16,104 @@ class Config:
     # Uploads
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(BASE_DIR, 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    UPLOAD_READ_CHUNK_SIZE = int(os.environ.get('UPLOAD_READ_CHUNK_SIZE', 64 * 1024)) # Ukuran chunk saat membaca unggahan
+    BATCH_UPLOAD_MAX_DEVICES = int(os.environ.get('BATCH_UPLOAD_MAX_DEVICES', 500)) # Jumlah perangkat maksimum per batch
+    BATCH_UPLOAD_MAX_CONTENT_LENGTH = int(os.environ.get('BATCH_UPLOAD_MAX_CONTENT_LENGTH', 256 * 1024 * 1024)) # 256MB
+    UPLOAD_MAX_PENDING_ENTRY_SIZE = int(os.environ.get('UPLOAD_MAX_PENDING_ENTRY_SIZE', 1024 * 1024)) # Batas satu entri yang belum selesai
+    # File flock antar proses untuk lock perangkat: sejumlah tetap file stripe (crc32 path log), bukan satu
+    # file .lock per perangkat di pohon upload. Default <UPLOAD_FOLDER>/.locks (ikut volume upload bersama)
+    DEVICE_LOCK_FOLDER = os.environ.get('DEVICE_LOCK_FOLDER')
+    DEVICE_LOCK_FILES = int(os.environ.get('DEVICE_LOCK_FILES', 1024))
+    # Body request dengan Content-Encoding: gzip didekompresi secara streaming (batas ukuran = hasil dekompresi)
+    REQUEST_DECOMPRESSION_ENABLED = os.environ.get('REQUEST_DECOMPRESSION_ENABLED', 'True').lower() == 'true'
     
+    # Ingest asinkron: /upload hanya menyimpan payload ke spool lalu membalas 202
+    INGEST_ASYNC_MODE = os.environ.get('INGEST_ASYNC_MODE', 'False').lower() == 'true'
+    INGEST_SPOOL_FOLDER = os.environ.get('INGEST_SPOOL_FOLDER') or os.path.join(BASE_DIR, 'spool')
+    INGEST_WORKER_COUNT = int(os.environ.get('INGEST_WORKER_COUNT', 4))
+    INGEST_JOB_RESULT_RETENTION_HOURS = int(os.environ.get('INGEST_JOB_RESULT_RETENTION_HOURS', 72))
+    # Kegagalan sementara (exception/5xx) diulang dengan backoff eksponensial; job perangkat yang sama menunggu
+    INGEST_MAX_ATTEMPTS = int(os.environ.get('INGEST_MAX_ATTEMPTS', 5))
+    INGEST_RETRY_BACKOFF_SECONDS = float(os.environ.get('INGEST_RETRY_BACKOFF_SECONDS', 2))
+    INGEST_RETRY_MAX_BACKOFF_SECONDS = float(os.environ.get('INGEST_RETRY_MAX_BACKOFF_SECONDS', 300))
+    
+    # Penyimpanan log: 'plain' (satu file per perangkat) atau 'segmented' (segmen tertutup dikompresi gzip)
+    LOG_STORAGE_MODE = os.environ.get('LOG_STORAGE_MODE', 'plain').lower()
+    # Jumlah tingkat subdirektori hash (crc32) untuk file log perangkat di dalam folder package (0-4).
+    # 0 = layout datar lama; file lama dipindahkan bertahap saat ditulis atau dengan `flask migrate-log-layout`
+    LOG_STORAGE_FANOUT_LEVELS = int(os.environ.get('LOG_STORAGE_FANOUT_LEVELS', 2))
+    LOG_SEGMENT_MAX_BYTES = int(os.environ.get('LOG_SEGMENT_MAX_BYTES', 8 * 1024 * 1024))
+    LOG_SEGMENT_ROLL_DAILY = os.environ.get('LOG_SEGMENT_ROLL_DAILY', 'True').lower() == 'true'
+    LOG_SEGMENT_COMPRESS_LEVEL = int(os.environ.get('LOG_SEGMENT_COMPRESS_LEVEL', 6))
+
+    # View log: salinan gzip di-cache di disk untuk klien yang mengirim Accept-Encoding: gzip
+    LOG_VIEW_GZIP_ENABLED = os.environ.get('LOG_VIEW_GZIP_ENABLED', 'True').lower() == 'true'
+    LOG_VIEW_GZIP_MIN_SIZE = int(os.environ.get('LOG_VIEW_GZIP_MIN_SIZE', 1024))
+    LOG_VIEW_GZIP_LEVEL = int(os.environ.get('LOG_VIEW_GZIP_LEVEL', 6))
+
+    # Cache cursor dedup per perangkat (LRU di proses, atau redis://... agar dibagi antar worker)
+    CURSOR_CACHE_ENABLED = os.environ.get('CURSOR_CACHE_ENABLED', 'True').lower() == 'true'
+    CURSOR_CACHE_MAX_ENTRIES = int(os.environ.get('CURSOR_CACHE_MAX_ENTRIES', 10000))
+    CURSOR_CACHE_TTL_SECONDS = int(os.environ.get('CURSOR_CACHE_TTL_SECONDS', 300))
+    CURSOR_CACHE_STORAGE_URL = os.environ.get('CURSOR_CACHE_STORAGE_URL', 'memory://')
+
+    # Penulis file log: pool handle append per proses dan kebijakan fsync (none, upload, group)
+    LOG_WRITER_POOL_ENABLED = os.environ.get('LOG_WRITER_POOL_ENABLED', 'True').lower() == 'true'
+    LOG_WRITER_MAX_OPEN_FILES = int(os.environ.get('LOG_WRITER_MAX_OPEN_FILES', 256))
+    LOG_WRITER_IDLE_SECONDS = int(os.environ.get('LOG_WRITER_IDLE_SECONDS', 30))
+    LOG_WRITER_BUFFER_BYTES = int(os.environ.get('LOG_WRITER_BUFFER_BYTES', 256 * 1024)) # Batas buffer per writev
+    LOG_FSYNC_POLICY = os.environ.get('LOG_FSYNC_POLICY', 'none').lower()
+    LOG_FSYNC_GROUP_INTERVAL_MS = int(os.environ.get('LOG_FSYNC_GROUP_INTERVAL_MS', 10))
+
+    # Jendela dedup berbasis hash isi entri per perangkat (lihat app/services/dedup_window.py)
+    DEDUP_RECENT_HASHES = int(os.environ.get('DEDUP_RECENT_HASHES', 128)) # Hash entri terakhir yang dicek secara exact
+    DEDUP_BLOOM_BYTES = int(os.environ.get('DEDUP_BLOOM_BYTES', 1024)) # Ukuran per generasi Bloom filter (2 generasi)
+    DEDUP_BLOOM_HASHES = int(os.environ.get('DEDUP_BLOOM_HASHES', 7))
+    # Collapse entri berulang (isi sama selain timestamp) dalam satu unggahan menjadi satu entri dengan
+    # Occurrences/Last Timestamp (lihat app/services/entry_collapse.py); view dengan ?expand=true mengembalikannya
+    LOG_COLLAPSE_REPEATS = os.environ.get('LOG_COLLAPSE_REPEATS', 'False').lower() == 'true'
+    LOG_COLLAPSE_MAX_OPEN_RUNS = int(os.environ.get('LOG_COLLAPSE_MAX_OPEN_RUNS', 32)) # Jumlah entri berbeda yang ditahan sekaligus
+    LOG_COLLAPSE_WINDOW_SECONDS = int(os.environ.get('LOG_COLLAPSE_WINDOW_SECONDS', 300)) # Rentang maksimum satu entri collapse
+
+    # Rollup error per jam (endpoint, method, status code) untuk endpoint statistik
+    ERROR_ROLLUPS_ENABLED = os.environ.get('ERROR_ROLLUPS_ENABLED', 'True').lower() == 'true'
+    ERROR_ROLLUP_RETENTION_DAYS = int(os.environ.get('ERROR_ROLLUP_RETENTION_DAYS', 400))
+    ERROR_ROLLUP_MAX_SERIES_POINTS = int(os.environ.get('ERROR_ROLLUP_MAX_SERIES_POINTS', 2000))
+
+    # Pencarian full-text entri log (FTS5 di SQLite, tsvector di PostgreSQL)
+    SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'True').lower() == 'true'
+    SEARCH_PAGE_DEFAULT_LIMIT = int(os.environ.get('SEARCH_PAGE_DEFAULT_LIMIT', 50))
+    SEARCH_PAGE_MAX_LIMIT = int(os.environ.get('SEARCH_PAGE_MAX_LIMIT', 500))
+
+    # Server produksi (gunicorn.conf.py): app dimuat sekali di master, lalu di-fork ke beberapa worker
+    PREFORK_SERVER = os.environ.get('PREFORK_SERVER', 'False').lower() == 'true'
+    # Hanya satu proses yang memegang flock ini dan menjalankan job APScheduler
+    SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE') or os.path.join(BASE_DIR, 'instance', 'scheduler.lock')
+    SCHEDULER_LEADER_RETRY_SECONDS = int(os.environ.get('SCHEDULER_LEADER_RETRY_SECONDS', 15))
+
+    # Metrik Prometheus di /metrics (multi-proses: set PROMETHEUS_MULTIPROC_DIR, lihat app/utils/metrics.py)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_PATH = os.environ.get('METRICS_PATH', '/metrics')
+
+    # Live tail (server-sent events): setiap follower memakai satu thread worker selama stream terbuka,
+    # jadi LOG_TAIL_MAX_FOLLOWERS (per proses) harus lebih kecil dari GUNICORN_THREADS
+    LOG_TAIL_MAX_FOLLOWERS = int(os.environ.get('LOG_TAIL_MAX_FOLLOWERS', 2))
+    LOG_TAIL_POLL_SECONDS = float(os.environ.get('LOG_TAIL_POLL_SECONDS', 1.0)) # Cek ukuran log untuk unggahan di worker lain
+    LOG_TAIL_HEARTBEAT_SECONDS = int(os.environ.get('LOG_TAIL_HEARTBEAT_SECONDS', 15))
+    LOG_TAIL_MAX_SECONDS = int(os.environ.get('LOG_TAIL_MAX_SECONDS', 300)) # Stream ditutup lalu klien menyambung ulang dengan Last-Event-ID
+    LOG_TAIL_BUFFER_BYTES = int(os.environ.get('LOG_TAIL_BUFFER_BYTES', 1024 * 1024)) # Buffer entri terbaru bersama per perangkat
+
     # Pengaturan Aplikasi
+    METADATA_PAGE_DEFAULT_LIMIT = int(os.environ.get('METADATA_PAGE_DEFAULT_LIMIT', 100)) # Ukuran halaman default listing metadata
+    METADATA_PAGE_MAX_LIMIT = int(os.environ.get('METADATA_PAGE_MAX_LIMIT', 1000))
+    METADATA_STREAM_BATCH_SIZE = int(os.environ.get('METADATA_STREAM_BATCH_SIZE', 1000)) # yield_per untuk mode NDJSON
+    MERGED_STREAM_MAX_DEVICES = int(os.environ.get('MERGED_STREAM_MAX_DEVICES', 500)) # Batas perangkat per stream gabungan (satu file terbuka per perangkat)
+    MERGED_STREAM_REORDER_ENTRIES = int(os.environ.get('MERGED_STREAM_REORDER_ENTRIES', 64)) # Jendela pengurutan ulang entri terlambat per perangkat
+    CLEANUP_BATCH_SIZE = int(os.environ.get('CLEANUP_BATCH_SIZE', 500)) # Jumlah metadata per batch pada cleanup
+    CLEANUP_STAT_WORKERS = int(os.environ.get('CLEANUP_STAT_WORKERS', 8)) # Thread untuk stat file secara paralel
     DEFAULT_LOG_RETENTION_DAYS = int(os.environ.get('DEFAULT_LOG_RETENTION_DAYS', 30))
+    DEFAULT_MAX_BYTES_PER_DEVICE = int(os.environ.get('DEFAULT_MAX_BYTES_PER_DEVICE', 0)) # 0 = tanpa batas ukuran log per perangkat
+    SETTINGS_CACHE_TTL_SECONDS = int(os.environ.get('SETTINGS_CACHE_TTL_SECONDS', 30)) # Umur snapshot pengaturan di memori
     EXPECTED_API_KEY = os.environ.get("LOG_API_KEY") or "ganti-dengan-api-key-rahasia-anda"
     
     # Flask-Limiter
@@ -27,6 +122,8 @@ class Config:
     RATELIMIT_HEADERS_ENABLED = True
     RATELIMIT_DEFAULT = "200 per day;50 per hour;10 per minute" # Default limit untuk semua route
     RATELIMIT_UPLOAD_LOG = "30 per minute;500 per hour" # Limit khusus untuk upload
+    RATELIMIT_BATCH_UPLOAD_LOG = "10 per minute;200 per hour" # Limit khusus untuk upload batch
+    RATELIMIT_CURSOR = "60 per minute;1000 per hour" # Cursor dibaca sebelum setiap unggahan delta
 
     # Logging
     LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
@@ -9,6 +9,16 @@ class AppSetting(db.Model):
     def __repr__(self):
         return f'<AppSetting {self.key}={self.value}>'
 
+class PackageSetting(db.Model):
+    __tablename__ = 'package_settings'
+    package_id = db.Column(db.String(150), primary_key=True)
+    log_retention_days = db.Column(db.Integer, nullable=True) # None = ikut pengaturan global, 0 = tidak pernah kedaluwarsa
+    max_bytes_per_device = db.Column(db.BigInteger, nullable=True) # None = ikut pengaturan global, 0 = tanpa batas
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PackageSetting {self.package_id} retention:{self.log_retention_days} max_bytes:{self.max_bytes_per_device}>'
+
 class DeviceLogFile(db.Model):
     __tablename__ = 'device_log_files'
     id = db.Column(db.Integer, primary_key=True)
@@ -23,4 +33,47 @@ class DeviceLogFile(db.Model):
     __table_args__ = (db.UniqueConstraint('package_id', 'device_id', name='uq_package_device'),)
 
     def __repr__(self):
-        return f'<DeviceLogFile package:{self.package_id} device:{self.device_id} file:{self.server_filename}>'
\ No newline at end of file
+        return f'<DeviceLogFile package:{self.package_id} device:{self.device_id} file:{self.server_filename}>'
+
+class ErrorRollup(db.Model):
+    __tablename__ = 'error_rollups'
+    id = db.Column(db.Integer, primary_key=True)
+    package_id = db.Column(db.String(150), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False) # Awal bucket per jam (UTC, dari timestamp entri)
+    endpoint = db.Column(db.String(300), nullable=False) # Endpoint yang sudah dinormalisasi (tanpa query string/ID)
+    method = db.Column(db.String(10), nullable=False)
+    status_code = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+    # Constraint unik sekaligus indeks untuk query per package dan rentang waktu
+    __table_args__ = (
+        db.UniqueConstraint('package_id', 'bucket_start', 'endpoint', 'method', 'status_code', name='uq_error_rollup_bucket'),
+    )
+
+    def __repr__(self):
+        return f'<ErrorRollup {self.package_id} {self.bucket_start} {self.method} {self.endpoint} {self.status_code}={self.count}>'
+
+class LogSearchEntry(db.Model):
+    __tablename__ = 'log_search_entries'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True) # = rowid di FTS5 SQLite
+    package_id = db.Column(db.String(150), nullable=False)
+    device_id = db.Column(db.String(100), nullable=False)
+    entry_timestamp = db.Column(db.DateTime, nullable=False)
+    byte_offset = db.Column(db.BigInteger, nullable=False) # Offset logis entri di file log perangkat
+
+    __table_args__ = (
+        db.Index('ix_log_search_entries_device_offset', 'package_id', 'device_id', 'byte_offset'),
+    )
+
+    def __repr__(self):
+        return f'<LogSearchEntry {self.package_id}/{self.device_id} @{self.byte_offset}>'
+
+class DeviceDedupState(db.Model):
+    __tablename__ = 'device_dedup_states'
+    package_id = db.Column(db.String(150), primary_key=True)
+    device_id = db.Column(db.String(100), primary_key=True)
+    state = db.Column(db.LargeBinary, nullable=False) # DedupWindow.to_state(): ring hash entri terakhir + Bloom filter (beberapa KB)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DeviceDedupState {self.package_id}/{self.device_id} {len(self.state or b"")} bytes>'
@@ -1,6 +1,15 @@
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+import os
+from flask import Blueprint, request, jsonify, current_app, send_from_directory, send_file, Response, stream_with_context
+from werkzeug.utils import secure_filename
 from ..utils.decorators import require_api_key
 from ..services import log_service # Impor dari services package
+from ..services import log_storage
+from ..services import rollup_service
+from ..services import search_index
+from ..services import export_service
+from ..services import merge_service
+from ..services import entry_collapse
+from ..services import log_tail
 from .. import limiter # Impor limiter yang sudah diinisialisasi di app/__init__.py
 
 log_bp = Blueprint('logs', __name__)
@@ -16,38 +25,300 @@ def upload_log():
         return jsonify({"error": "No log_file part in the request"}), 400
     client_log_file = request.files['log_file']
     
-    response_data, status_code = log_service.process_log_upload(package_id, device_id, client_log_file)
+    if current_app.config.get("INGEST_ASYNC_MODE"):
+        response_data, status_code = log_service.queue_log_upload(package_id, device_id, client_log_file)
+    else:
+        response_data, status_code = log_service.process_log_upload(package_id, device_id, client_log_file)
+    return jsonify(response_data), status_code
+
+@log_bp.route('/jobs/<string:job_id>', methods=['GET'])
+@require_api_key
+def get_upload_job_status(job_id):
+    """Mengambil status job unggahan asinkron."""
+    response_data, status_code = log_service.get_ingest_job_status(job_id)
+    return jsonify(response_data), status_code
+
+@log_bp.route('/upload/batch', methods=['POST'])
+@require_api_key
+@limiter.limit(lambda: current_app.config.get("RATELIMIT_BATCH_UPLOAD_LOG", "10 per minute"))
+def upload_log_batch():
+    """Unggah log banyak perangkat sekaligus.
+
+    Field multipart package_id, device_id, dan log_file diulang dengan urutan yang sama untuk setiap
+    perangkat. Jika hanya ada satu package_id, nilainya dipakai untuk semua perangkat.
+    """
+    request.max_content_length = current_app.config.get("BATCH_UPLOAD_MAX_CONTENT_LENGTH")
+    package_ids = request.form.getlist('package_id')
+    device_ids = request.form.getlist('device_id')
+    client_log_files = request.files.getlist('log_file')
+
+    if not client_log_files:
+        return jsonify({"error": "No log_file part in the request"}), 400
+    if len(package_ids) == 1:
+        package_ids = package_ids * len(client_log_files)
+    if not (len(package_ids) == len(device_ids) == len(client_log_files)):
+        return jsonify({"error": "package_id, device_id and log_file parts must have the same count"}), 400
+
+    response_data, status_code = log_service.process_batch_log_upload(
+        list(zip(package_ids, device_ids, client_log_files))
+    )
+    return jsonify(response_data), status_code
+
+def _metadata_listing_response(package_id=None):
+    """Mode listing metadata: NDJSON streaming (?format=ndjson), halaman keyset (limit/cursor/updated_since),
+    atau list penuh seperti sebelumnya jika tidak ada parameter."""
+    cursor = request.args.get('cursor')
+    updated_since = request.args.get('updated_since')
+    wants_ndjson = request.args.get('format') == 'ndjson' or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+    if wants_ndjson:
+        result, status_code = log_service.iter_logs_metadata_ndjson(package_id, cursor, updated_since)
+        if status_code != 200:
+            return jsonify(result), status_code
+        return Response(stream_with_context(result), mimetype='application/x-ndjson')
+    if 'limit' in request.args or cursor or updated_since:
+        response_data, status_code = log_service.get_logs_metadata_page(
+            package_id, request.args.get('limit'), cursor, updated_since
+        )
+        return jsonify(response_data), status_code
+    if package_id is None:
+        response_data, status_code = log_service.get_all_logs_metadata()
+    else:
+        response_data, status_code = log_service.get_logs_metadata_for_package(package_id)
     return jsonify(response_data), status_code
 
 @log_bp.route('/metadata', methods=['GET'])
 @require_api_key
 def get_metadata_all():
     """Mengambil semua metadata log."""
-    response_data, status_code = log_service.get_all_logs_metadata()
-    return jsonify(response_data), status_code
+    return _metadata_listing_response()
     
 @log_bp.route('/metadata/<string:package_id>', methods=['GET'])
 @require_api_key
 def get_metadata_by_package(package_id):
     """Mengambil metadata log untuk package_id tertentu."""
-    response_data, status_code = log_service.get_logs_metadata_for_package(package_id)
+    return _metadata_listing_response(package_id)
+
+@log_bp.route('/cache/stats', methods=['GET'])
+@require_api_key
+def get_cursor_cache_stats():
+    """Statistik cache cursor dedup (hit/miss) untuk proses ini."""
+    return jsonify(log_service.get_cursor_cache_stats()), 200
+
+@log_bp.route('/cursor/<string:package_id>/<string:device_id>', methods=['GET'])
+@require_api_key
+@limiter.limit(lambda: current_app.config.get("RATELIMIT_CURSOR", "60 per minute"))
+def get_device_cursor(package_id, device_id):
+    """Timestamp terakhir di server; klien cukup mengunggah entri yang lebih baru (unggahan delta)."""
+    response_data, status_code = log_service.get_device_cursor(package_id, device_id)
+    return jsonify(response_data), status_code
+
+@log_bp.route('/cursor/batch', methods=['POST'])
+@require_api_key
+@limiter.limit(lambda: current_app.config.get("RATELIMIT_CURSOR", "60 per minute"))
+def get_device_cursors_batch():
+    """Cursor banyak perangkat sekaligus. Body JSON: {"devices": [{"package_id": ..., "device_id": ...}, ...]}."""
+    request_data = request.get_json(silent=True)
+    devices = request_data.get('devices') if isinstance(request_data, dict) else None
+    if not isinstance(devices, list) or not all(isinstance(device, dict) for device in devices):
+        return jsonify({"error": "Request body must be JSON with a 'devices' list"}), 400
+    response_data, status_code = log_service.get_device_cursors(
+        [(device.get('package_id'), device.get('device_id')) for device in devices]
+    )
+    return jsonify(response_data), status_code
+
+@log_bp.route('/search', methods=['GET'])
+@require_api_key
+def search_logs():
+    """Pencarian full-text entri log satu package (?package_id=&q=&device_id=&from=&to=&limit=&cursor=)."""
+    response_data, status_code = search_index.search_log_entries(
+        request.args.get('package_id'), request.args.get('q'), request.args.get('device_id'),
+        request.args.get('from'), request.args.get('to'), request.args.get('limit'), request.args.get('cursor')
+    )
+    return jsonify(response_data), status_code
+
+@log_bp.route('/stats/<string:package_id>/top', methods=['GET'])
+@require_api_key
+def get_error_stats_top(package_id):
+    """Top-N endpoint/method/status_code dari tabel rollup (?by=&from=&to=&status=5xx&limit=)."""
+    response_data, status_code = rollup_service.get_top_errors(
+        package_id, request.args.get('by', 'endpoint'), request.args.get('from'), request.args.get('to'),
+        request.args.get('status'), request.args.get('limit')
+    )
     return jsonify(response_data), status_code
 
+@log_bp.route('/stats/<string:package_id>/timeseries', methods=['GET'])
+@require_api_key
+def get_error_stats_timeseries(package_id):
+    """Deret waktu jumlah entri per jam/hari dari tabel rollup (?interval=&from=&to=&endpoint=&method=&status=)."""
+    response_data, status_code = rollup_service.get_error_timeseries(
+        package_id, request.args.get('interval', 'hour'), request.args.get('from'), request.args.get('to'),
+        request.args.get('endpoint'), request.args.get('method'), request.args.get('status')
+    )
+    return jsonify(response_data), status_code
+
+@log_bp.route('/export/<string:package_id>', methods=['GET'])
+@require_api_key
+def export_package_logs(package_id):
+    """Unduh semua log perangkat sebuah package sebagai arsip tar (default) atau zip yang di-stream.
+
+    Query: format=tar|zip, updated_since (opsional). Jika ada file log yang menyusut selama ekspor,
+    arsip diakhiri member EXPORT_WARNINGS.json berisi daftar member yang terpotong.
+    """
+    archive_format = request.args.get('format', 'tar')
+    result, status_code = export_service.iter_package_export(package_id, archive_format, request.args.get('updated_since'))
+    if status_code != 200:
+        return jsonify(result), status_code
+    return Response(
+        stream_with_context(result),
+        mimetype=export_service.ARCHIVE_MIMETYPES[archive_format],
+        headers={"Content-Disposition": f'attachment; filename="{secure_filename(package_id)}-logs.{archive_format}"'}
+    )
+
+@log_bp.route('/merged/<string:package_id>', methods=['GET'])
+@require_api_key
+def stream_merged_package_logs(package_id):
+    """Entri log semua perangkat sebuah package dalam satu stream terurut timestamp.
+
+    Query: from, to, device_id (boleh diulang), format=ndjson|text, limit (opsional).
+    """
+    output_format = request.args.get('format', 'ndjson')
+    result, status_code = merge_service.iter_package_merged_entries(
+        package_id, request.args.getlist('device_id'), request.args.get('from'), request.args.get('to'),
+        output_format, request.args.get('limit')
+    )
+    if status_code != 200:
+        return jsonify(result), status_code
+    return Response(stream_with_context(result), mimetype=merge_service.MERGED_STREAM_FORMATS[output_format])
+
+@log_bp.route('/tail/<string:package_id>/<string:device_id>', methods=['GET'])
+@require_api_key
+def tail_device_log(package_id, device_id):
+    """Live tail log perangkat sebagai server-sent events (text/event-stream).
+
+    Query: offset (mulai dari offset byte ini; default hanya entri baru), format=text|json.
+    Header Last-Event-ID (dikirim otomatis oleh EventSource saat menyambung ulang) didahulukan dari offset.
+    """
+    output_format = request.args.get('format', 'text')
+    result, status_code = log_tail.iter_device_tail_events(
+        package_id, device_id, request.args.get('offset'), request.headers.get('Last-Event-ID'), output_format
+    )
+    if status_code != 200:
+        return jsonify(result), status_code
+    return Response(
+        stream_with_context(result),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # Jangan di-buffer oleh reverse proxy
+    )
+
 @log_bp.route('/view/<string:package_id>/<string:device_id>', methods=['GET'])
 @require_api_key
 def view_specific_log(package_id, device_id):
+    """Isi log perangkat; from/to membatasi jendela waktu, expand=true mengembangkan entri collapse."""
+    from_param = request.args.get('from')
+    to_param = request.args.get('to')
+    expand = request.args.get('expand', '').lower() in ('1', 'true')
+    if from_param or to_param:
+        # Hanya kirim entri dalam jendela waktu; posisi byte dicari lewat indeks sidecar
+        result = log_service.get_log_file_range(package_id, device_id, from_param, to_param)
+        if isinstance(result[0], dict):
+            return jsonify(result[0]), result[1]
+        filepath, start_offset, end_offset = result
+        log_version = log_storage.get_log_version(filepath)
+        if expand:
+            return _send_expanded_log(filepath, log_version, start_offset, end_offset)
+        response = Response(
+            log_storage.iter_log_bytes(filepath, start_offset, end_offset),
+            mimetype='text/plain',
+            headers={"Content-Length": str(end_offset - start_offset)}
+        )
+        response.set_etag(log_service.build_log_etag(log_version, start_offset, end_offset))
+        response.last_modified = log_version.mtime_ns / 1e9
+        return response.make_conditional(request)
+
     result = log_service.get_log_file_content(package_id, device_id)
-    if isinstance(result, tuple) and len(result) == 2: # Sukses, dapat path dan filename
+    if not isinstance(result[0], dict): # Sukses, dapat path dan filename
         directory, filename = result
         try:
-            return send_from_directory(
-                directory,
-                filename,
-                as_attachment=False,
-                mimetype='text/plain'
-            )
+            if expand:
+                filepath = os.path.join(directory, filename)
+                log_version = log_storage.get_log_version(filepath)
+                return _send_expanded_log(filepath, log_version, 0, log_version.size)
+            return _send_log_file(directory, filename)
         except Exception as e:
             current_app.logger.error(f"Error sending file {filename} from {directory}: {e}", exc_info=True)
             return jsonify({"error": f"Could not send file: {str(e)}"}), 500
-    else: # Error, result adalah dict
-        return jsonify(result), result.get("status_code", 404) # Asumsi error dict punya status_code
\ No newline at end of file
+    else: # Error, result adalah (dict, status_code)
+        error_body, status_code = result
+        return jsonify(error_body), status_code
+
+def _send_log_file(directory, filename):
+    """Mengirim file log utuh dengan ETag/If-Modified-Since, Range, dan gzip jika klien mendukung."""
+    filepath = os.path.join(directory, filename)
+    log_version = log_storage.get_log_version(filepath)
+    etag = log_service.build_log_etag(log_version)
+
+    # Request Range selalu dilayani tanpa kompresi agar offset byte sesuai dengan file log
+    use_gzip = (
+        current_app.config.get("LOG_VIEW_GZIP_ENABLED")
+        and request.accept_encodings["gzip"]
+        and "Range" not in request.headers
+        and log_version.size >= current_app.config.get("LOG_VIEW_GZIP_MIN_SIZE", 1024)
+    )
+    if use_gzip:
+        response = send_file(
+            log_service.get_gzip_view_copy(filepath, log_version),
+            mimetype='text/plain',
+            etag=etag + "-gzip",
+            last_modified=log_version.mtime_ns / 1e9,
+            conditional=True
+        )
+        response.headers["Content-Encoding"] = "gzip"
+    elif log_storage.has_sealed_segments(filepath):
+        response = _send_segmented_log(filepath, log_version, etag)
+    else:
+        response = send_from_directory(
+            directory,
+            filename,
+            as_attachment=False,
+            mimetype='text/plain',
+            etag=etag,
+            conditional=True
+        )
+    response.vary.add("Accept-Encoding")
+    return response
+
+def _send_expanded_log(filepath, log_version, start_offset, end_offset):
+    """Streaming log dengan setiap entri collapse dikembalikan menjadi entri per kemunculan (tanpa Content-Length)."""
+    response = Response(
+        entry_collapse.iter_expanded_log_bytes(
+            filepath, start_offset, end_offset, current_app.config.get('UPLOAD_MAX_PENDING_ENTRY_SIZE', 1024 * 1024)
+        ),
+        mimetype='text/plain'
+    )
+    response.set_etag(log_service.build_log_etag(log_version, start_offset, end_offset, "expanded"))
+    response.last_modified = log_version.mtime_ns / 1e9
+    return response.make_conditional(request)
+
+def _send_segmented_log(filepath, log_version, etag):
+    """Streaming log tersegmentasi (didekompresi on-the-fly) dengan dukungan conditional GET dan Range."""
+    response = Response(mimetype='text/plain')
+    response.set_etag(etag)
+    response.last_modified = log_version.mtime_ns / 1e9
+    response.accept_ranges = "bytes"
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    # Range ditangani sendiri agar segmen sebelum offset awal tidak perlu didekompresi
+    start_offset, end_offset = 0, log_version.size
+    if request.range is not None:
+        byte_range = request.range.range_for_length(log_version.size)
+        if byte_range is None:
+            return Response(status=416, headers={"Content-Range": f"bytes */{log_version.size}"})
+        start_offset, end_offset = byte_range
+        response.status_code = 206
+        response.content_range = request.range.to_content_range_header(log_version.size)
+    response.response = log_storage.iter_log_bytes(filepath, start_offset, end_offset)
+    response.content_length = end_offset - start_offset
+    return response
\ No newline at end of file
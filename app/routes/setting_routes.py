@@ -24,8 +24,56 @@ def manage_log_retention():
 
     elif request.method == 'GET':
         try:
-            days = setting_service.get_log_retention_days_from_db()
+            days = setting_service.get_setting('LOG_RETENTION_DAYS')
             return jsonify({"log_retention_days": days}), 200
         except Exception as e:
             current_app.logger.error(f"Error fetching log retention setting: {e}", exc_info=True)
-            return jsonify({"error": "Failed to fetch log retention setting"}), 500
\ No newline at end of file
+            return jsonify({"error": "Failed to fetch log retention setting"}), 500
+
+@setting_bp.route('/max_bytes_per_device', methods=['GET', 'POST'])
+@require_api_key
+def manage_max_bytes_per_device():
+    """Batas ukuran log global per perangkat (0 = tanpa batas); entri tertua dipotong oleh cleanup."""
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not data or 'max_bytes' not in data:
+            return jsonify({"error": "Missing 'max_bytes' in request body"}), 400
+        try:
+            setting_service.set_setting('MAX_BYTES_PER_DEVICE', data['max_bytes'])
+            return jsonify({"message": f"Max log size per device set to {data['max_bytes']} bytes."}), 200
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            current_app.logger.error(f"Error updating max bytes setting: {e}", exc_info=True)
+            return jsonify({"error": "Failed to update max bytes setting"}), 500
+
+    return jsonify({"max_bytes_per_device": setting_service.get_setting('MAX_BYTES_PER_DEVICE')}), 200
+
+@setting_bp.route('/packages', methods=['GET'])
+@require_api_key
+def list_package_settings():
+    """Daftar override pengaturan per package."""
+    return jsonify(setting_service.list_package_settings()), 200
+
+@setting_bp.route('/packages/<string:package_id>', methods=['GET', 'PUT', 'DELETE'])
+@require_api_key
+def manage_package_settings(package_id):
+    """Override retensi (hari) dan ukuran maksimum log per perangkat untuk satu package."""
+    if request.method == 'PUT':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        try:
+            return jsonify(setting_service.set_package_settings(package_id, data)), 200
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            current_app.logger.error(f"Error updating settings for package {package_id}: {e}", exc_info=True)
+            return jsonify({"error": "Failed to update package settings"}), 500
+
+    if request.method == 'DELETE':
+        if not setting_service.delete_package_settings(package_id):
+            return jsonify({"error": f"No settings override for package ID: {package_id}"}), 404
+        return jsonify({"message": f"Settings override for package {package_id} removed."}), 200
+
+    return jsonify(setting_service.get_package_settings(package_id)), 200
\ No newline at end of file
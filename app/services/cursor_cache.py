@@ -0,0 +1,155 @@
+import json
+import time
+import base64
+import datetime
+import threading
+from collections import OrderedDict, namedtuple
+
+# Cursor dedup per perangkat yang disimpan di cache: apakah baris metadata sudah ada, timestamp entri
+# terakhir yang diproses, nama file di server, dan blob state jendela dedup (bytes, atau None).
+DeviceCursor = namedtuple(
+    'DeviceCursor', ['exists', 'last_processed_entry_timestamp', 'server_filename', 'dedup_state'], defaults=(None,)
+)
+REDIS_KEY_PREFIX = "mobile-log:cursor:"
+
+
+class CursorCache:
+    """Cache write-through untuk cursor dedup per perangkat di depan tabel device_log_files.
+
+    Setiap entri disimpan bersama versi file log (ukuran logis, mtime) saat commit. Entri hanya
+    dipakai jika versi file masih sama, sehingga perubahan oleh proses lain (unggahan di worker lain,
+    cleanup retensi) otomatis membuat cache miss. Backend default adalah LRU di memori proses dengan
+    TTL pendek; dengan CURSOR_CACHE_STORAGE_URL redis://... cache dibagi antar proses.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.max_entries = 10000
+        self.ttl_seconds = 300
+        self.backend = 'memory'
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CURSOR_CACHE_ENABLED', True)
+        self.max_entries = app.config.get('CURSOR_CACHE_MAX_ENTRIES', 10000)
+        self.ttl_seconds = app.config.get('CURSOR_CACHE_TTL_SECONDS', 300)
+        storage_url = app.config.get('CURSOR_CACHE_STORAGE_URL', 'memory://')
+        self._redis = None
+        self.backend = 'memory'
+        if storage_url.startswith(('redis://', 'rediss://')):
+            # Cache bersama diminta secara eksplisit; jangan diam-diam turun ke cache per proses
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("CURSOR_CACHE_STORAGE_URL points to Redis but the 'redis' package is not installed.") from e
+            self._redis = redis.Redis.from_url(storage_url)
+            self.backend = 'redis'
+        self.clear()
+
+    def _count(self, counter_name):
+        with self._lock:
+            setattr(self, counter_name, getattr(self, counter_name) + 1)
+
+    def get(self, device_key, log_version):
+        """Cursor dari cache jika ada, belum kedaluwarsa, dan versi file log-nya masih sama; selain itu None."""
+        if not self.enabled:
+            return None
+        cached = self._redis_get(device_key) if self._redis is not None else self._memory_get(device_key)
+        if cached is None:
+            self._count('misses')
+            return None
+        cursor, cached_version = cached
+        if cached_version != log_version:
+            self._count('stale')
+            self._count('misses')
+            self.invalidate(device_key)
+            return None
+        self._count('hits')
+        return cursor
+
+    def put(self, device_key, cursor, log_version):
+        """Menyimpan cursor setelah commit berhasil; log_version = versi file log saat itu (atau None)."""
+        if not self.enabled:
+            return
+        if self._redis is not None:
+            self._redis_put(device_key, cursor, log_version)
+            return
+        with self._lock:
+            self._entries[device_key] = (cursor, log_version, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(device_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, device_key):
+        if self._redis is not None:
+            self._redis.delete(self._redis_key(device_key))
+            return
+        with self._lock:
+            self._entries.pop(device_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.stale = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": self.backend,
+                "entries": len(self._entries) if self._redis is None else None,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+            }
+
+    def _memory_get(self, device_key):
+        with self._lock:
+            cached = self._entries.get(device_key)
+            if cached is None:
+                return None
+            cursor, log_version, expires_at = cached
+            if expires_at <= time.monotonic():
+                del self._entries[device_key]
+                return None
+            self._entries.move_to_end(device_key)
+            return cursor, log_version
+
+    @staticmethod
+    def _redis_key(device_key):
+        return REDIS_KEY_PREFIX + "\0".join(device_key)
+
+    def _redis_get(self, device_key):
+        raw_value = self._redis.get(self._redis_key(device_key))
+        if raw_value is None:
+            return None
+        data = json.loads(raw_value)
+        last_timestamp = data['last_processed_entry_timestamp']
+        cursor = DeviceCursor(
+            data['exists'],
+            datetime.datetime.fromisoformat(last_timestamp) if last_timestamp else None,
+            data['server_filename'],
+            base64.b64decode(data['dedup_state']) if data.get('dedup_state') else None
+        )
+        return cursor, tuple(data['log_version']) if data['log_version'] is not None else None
+
+    def _redis_put(self, device_key, cursor, log_version):
+        self._redis.set(self._redis_key(device_key), json.dumps({
+            "exists": cursor.exists,
+            "last_processed_entry_timestamp": cursor.last_processed_entry_timestamp.isoformat() if cursor.last_processed_entry_timestamp else None,
+            "server_filename": cursor.server_filename,
+            "dedup_state": base64.b64encode(cursor.dedup_state).decode('ascii') if cursor.dedup_state else None,
+            "log_version": list(log_version) if log_version is not None else None
+        }), px=int(self.ttl_seconds * 1000))
+
+
+cursor_cache = CursorCache()
@@ -0,0 +1,128 @@
+import struct
+import hashlib
+from collections import deque
+
+# Jendela dedup per perangkat berbasis hash isi entri (menggantikan dedup hanya berdasarkan timestamp).
+#
+#   recent     -> ring hash 64-bit dari entri terakhir yang ditambahkan (pemeriksaan exact)
+#   bloom      -> dua generasi Bloom filter (current/previous) untuk riwayat yang lebih lama
+#   floor      -> timestamp; entri dengan timestamp <= floor selalu dianggap duplikat
+#
+# Saat generasi current penuh, generasi previous dibuang dan floor naik ke timestamp terbesar pada
+# saat previous ditutup, sehingga setiap entri yang hash-nya sudah tidak disimpan pasti berada di
+# bawah floor. Entri yang lebih baru dari timestamp terbesar perangkat selalu baru (tanpa Bloom),
+# jadi false positive Bloom hanya mungkin terjadi pada entri lama/terlambat atau dengan timestamp sama.
+STATE_VERSION = 1
+STATE_HEADER = struct.Struct('<BBHHI23s23s') # versi, jumlah hash Bloom, isi ring, ukuran Bloom, isi current, floor, max saat previous ditutup
+EMPTY_TIMESTAMP = b"\0" * 23
+
+
+def _encode_timestamp(timestamp_str):
+    return timestamp_str.encode('ascii') if timestamp_str else EMPTY_TIMESTAMP
+
+def _decode_timestamp(raw_value):
+    return raw_value.decode('ascii') if raw_value != EMPTY_TIMESTAMP else None
+
+
+class DedupWindow:
+    """State dedup satu perangkat; disimpan sebagai blob beberapa KB dengan to_state()/from_state().
+
+    Timestamp disimpan sebagai string lebar tetap (YYYY-MM-DD HH:MM:SS.mmm) sehingga bisa
+    dibandingkan langsung dengan group timestamp dari LOG_ENTRY_REGEX.
+    """
+
+    def __init__(self, recent_size=128, bloom_bytes=1024, bloom_hash_count=7, floor_timestamp_str=None):
+        self.recent = deque(maxlen=recent_size)
+        self._recent_set = set()
+        self.bloom_hash_count = bloom_hash_count
+        self.current_bloom = bytearray(bloom_bytes)
+        self.previous_bloom = bytearray(bloom_bytes)
+        self.current_count = 0
+        self.floor_timestamp_str = floor_timestamp_str
+        self.previous_closed_max_str = None
+        self._bloom_bits = bloom_bytes * 8
+        # Kapasitas per generasi untuk false positive ~1%
+        self.generation_capacity = max(1, self._bloom_bits // 10)
+
+    @classmethod
+    def from_state(cls, state, max_timestamp_str, recent_size=128, bloom_bytes=1024, bloom_hash_count=7):
+        """Membangun jendela dari blob tersimpan.
+
+        Tanpa state (perangkat lama atau baru), floor = max_timestamp_str sehingga perilakunya sama
+        dengan dedup timestamp lama sampai jendela terisi. Jika ukuran Bloom di konfigurasi berubah,
+        Bloom lama dibuang dan floor dinaikkan ke max_timestamp_str; ring tetap dipakai.
+        """
+        window = cls(recent_size, bloom_bytes, bloom_hash_count, max_timestamp_str)
+        if not state:
+            return window
+        version, stored_hash_count, recent_count, stored_bloom_bytes, current_count, floor, previous_closed_max = \
+            STATE_HEADER.unpack_from(state)
+        if version != STATE_VERSION:
+            return window
+        offset = STATE_HEADER.size
+        recent_hashes = struct.unpack_from(f'<{recent_count}Q', state, offset)
+        offset += recent_count * 8
+        for entry_hash in recent_hashes[-recent_size:]:
+            window._remember_recent(entry_hash)
+
+        window.floor_timestamp_str = _decode_timestamp(floor)
+        if stored_bloom_bytes == bloom_bytes and stored_hash_count == bloom_hash_count:
+            window.current_bloom[:] = state[offset:offset + bloom_bytes]
+            window.previous_bloom[:] = state[offset + bloom_bytes:offset + 2 * bloom_bytes]
+            window.current_count = current_count
+            window.previous_closed_max_str = _decode_timestamp(previous_closed_max)
+        elif max_timestamp_str and (window.floor_timestamp_str is None or max_timestamp_str > window.floor_timestamp_str):
+            window.floor_timestamp_str = max_timestamp_str
+        return window
+
+    def to_state(self):
+        return b"".join((
+            STATE_HEADER.pack(
+                STATE_VERSION, self.bloom_hash_count, len(self.recent), len(self.current_bloom), self.current_count,
+                _encode_timestamp(self.floor_timestamp_str), _encode_timestamp(self.previous_closed_max_str)
+            ),
+            struct.pack(f'<{len(self.recent)}Q', *self.recent),
+            bytes(self.current_bloom),
+            bytes(self.previous_bloom)
+        ))
+
+    @staticmethod
+    def hash_entry(entry_text):
+        return int.from_bytes(hashlib.blake2b(entry_text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    def _bit_positions(self, entry_hash):
+        # Double hashing: k posisi dari dua bagian 32-bit hash yang sama
+        low, high = entry_hash & 0xFFFFFFFF, (entry_hash >> 32) | 1
+        return [(low + index * high) % self._bloom_bits for index in range(self.bloom_hash_count)]
+
+    @staticmethod
+    def _bloom_contains(bloom, positions):
+        return all(bloom[position >> 3] & (1 << (position & 7)) for position in positions)
+
+    def contains(self, entry_hash):
+        if entry_hash in self._recent_set:
+            return True
+        positions = self._bit_positions(entry_hash)
+        return self._bloom_contains(self.current_bloom, positions) or self._bloom_contains(self.previous_bloom, positions)
+
+    def _remember_recent(self, entry_hash):
+        if len(self.recent) == self.recent.maxlen:
+            self._recent_set.discard(self.recent[0])
+        self.recent.append(entry_hash)
+        self._recent_set.add(entry_hash)
+
+    def add(self, entry_hash, max_timestamp_str):
+        """Mencatat entri yang baru ditambahkan; max_timestamp_str = timestamp terbesar perangkat setelahnya."""
+        self._remember_recent(entry_hash)
+        for position in self._bit_positions(entry_hash):
+            self.current_bloom[position >> 3] |= 1 << (position & 7)
+        self.current_count += 1
+        if self.current_count >= self.generation_capacity:
+            if self.previous_closed_max_str and (
+                self.floor_timestamp_str is None or self.previous_closed_max_str > self.floor_timestamp_str
+            ):
+                self.floor_timestamp_str = self.previous_closed_max_str
+            self.previous_bloom = self.current_bloom
+            self.current_bloom = bytearray(len(self.previous_bloom))
+            self.current_count = 0
+            self.previous_closed_max_str = max_timestamp_str
@@ -0,0 +1,138 @@
+import re
+import hashlib
+import datetime
+from collections import OrderedDict
+from .log_index import ENTRY_START_LINE
+from .log_storage import open_log_reader
+
+# Mode collapse (LOG_COLLAPSE_REPEATS): entri berulang yang identik selain timestamp-nya disimpan
+# sekali, dengan dua baris tambahan tepat setelah baris Timestamp:
+#
+#   --- API Error Log ---
+#   Timestamp: 2026-01-01 10:00:00.000        <- kemunculan pertama (dipakai indeks dan urutan)
+#   Occurrences: 1200
+#   Last Timestamp: 2026-01-01 10:04:59.500   <- kemunculan terakhir
+#   Device Name: ...
+#
+# Format ini tetap cocok dengan LOG_ENTRY_REGEX, sehingga indeks, retensi, pencarian, dan ekspor
+# memperlakukannya sebagai satu entri biasa. Collapse hanya terjadi di dalam satu unggahan karena
+# file log bersifat append-only; entri yang sudah tertulis tidak pernah diubah.
+ENTRY_END_LINE = b"--- End Log Entry ---"
+OCCURRENCES_FIELD = "Occurrences: "
+LAST_TIMESTAMP_FIELD = "Last Timestamp: "
+TIMESTAMP_LINE_REGEX = re.compile(r"^\s*Timestamp: .*$", re.MULTILINE)
+COLLAPSE_FIELDS_REGEX = re.compile(rb"Timestamp: ([^\r\n]*)(\r?\n)Occurrences: (\d+)\r?\nLast Timestamp: ([^\r\n]*)\r?\n")
+
+
+def fingerprint_entry(entry_text):
+    """Hash 64-bit isi entri tanpa baris Timestamp, dengan spasi di awal/akhir setiap baris diabaikan."""
+    normalized = "\n".join(
+        line.strip() for line in TIMESTAMP_LINE_REGEX.sub("", entry_text, count=1).splitlines() if line.strip()
+    )
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
+
+
+class _RepeatRun:
+    __slots__ = ('entry_text', 'timestamp_str', 'timestamp_obj', 'last_timestamp_str', 'count')
+
+    def __init__(self, entry_text, timestamp_str, timestamp_obj):
+        self.entry_text = entry_text
+        self.timestamp_str = timestamp_str
+        self.timestamp_obj = timestamp_obj
+        self.last_timestamp_str = timestamp_str
+        self.count = 1
+
+    def to_entry(self):
+        """(teks entri yang ditulis, timestamp kemunculan pertama)."""
+        if self.count == 1:
+            return self.entry_text, self.timestamp_obj
+        # Disisipkan di akhir baris Timestamp (bukan langsung setelah 23 karakter timestamp-nya)
+        insert_at = self.entry_text.index(self.timestamp_str) + len(self.timestamp_str)
+        line_end = self.entry_text.find("\n", insert_at)
+        insert_at = line_end if line_end != -1 else len(self.entry_text)
+        return (
+            f"{self.entry_text[:insert_at]}\n{OCCURRENCES_FIELD}{self.count}\n"
+            f"{LAST_TIMESTAMP_FIELD}{self.last_timestamp_str}{self.entry_text[insert_at:]}"
+        ), self.timestamp_obj
+
+
+class EntryCollapser:
+    """Menggabungkan entri berulang dalam satu unggahan.
+
+    Entri yang fingerprint-nya sama dengan salah satu run yang masih terbuka ditambahkan ke run
+    tersebut. Run ditulis sesuai urutan kemunculan pertamanya, saat jumlah run terbuka melebihi
+    max_open_runs atau saat entri terbaru lebih dari window_seconds setelah kemunculan pertamanya.
+    """
+
+    def __init__(self, max_open_runs=32, window_seconds=300):
+        self.max_open_runs = max_open_runs
+        self.window = datetime.timedelta(seconds=window_seconds)
+        self._runs = OrderedDict()
+        self.collapsed_count = 0
+
+    def add(self, entry_text, timestamp_str, timestamp_obj):
+        """Menambahkan satu entri; mengembalikan list (teks entri, timestamp) yang siap ditulis."""
+        ready = []
+        while self._runs and next(iter(self._runs.values())).timestamp_obj < timestamp_obj - self.window:
+            ready.append(self._runs.popitem(last=False)[1].to_entry())
+        fingerprint = fingerprint_entry(entry_text)
+        run = self._runs.get(fingerprint)
+        if run is not None and timestamp_obj >= run.timestamp_obj:
+            run.count += 1
+            if timestamp_str > run.last_timestamp_str:
+                run.last_timestamp_str = timestamp_str
+            self.collapsed_count += 1
+            return ready
+        if run is not None:
+            # Entri lebih lama dari kemunculan pertama run: tulis run lama dulu agar urutan tetap terjaga
+            ready.append(self._runs.pop(fingerprint).to_entry())
+        self._runs[fingerprint] = _RepeatRun(entry_text, timestamp_str, timestamp_obj)
+        if len(self._runs) > self.max_open_runs:
+            ready.append(self._runs.popitem(last=False)[1].to_entry())
+        return ready
+
+    def drain(self):
+        """Semua run yang masih terbuka, sesuai urutan kemunculan pertama."""
+        runs, self._runs = self._runs, OrderedDict()
+        return [run.to_entry() for run in runs.values()]
+
+
+def expand_entry(entry_bytes):
+    """Mengembalikan entri collapse menjadi sebanyak Occurrences entri biasa.
+
+    Waktu kemunculan di antara yang pertama dan terakhir tidak disimpan, sehingga semua salinan
+    memakai timestamp pertama kecuali salinan terakhir yang memakai Last Timestamp.
+    """
+    match = COLLAPSE_FIELDS_REGEX.search(entry_bytes)
+    if match is None:
+        return [entry_bytes]
+    first_timestamp, line_break, occurrences, last_timestamp = match.groups()
+    before, after = entry_bytes[:match.start()], entry_bytes[match.end():]
+    first_copy = before + b"Timestamp: " + first_timestamp + line_break + after
+    last_copy = before + b"Timestamp: " + last_timestamp + line_break + after
+    return [first_copy] * (int(occurrences) - 1) + [last_copy]
+
+def iter_expanded_log_bytes(log_filepath, start_offset, end_offset, max_entry_size=1024 * 1024):
+    """Seperti log_storage.iter_log_bytes, tetapi setiap entri collapse dikembangkan kembali."""
+    with open_log_reader(log_filepath, start_offset, end_offset) as log_file:
+        entry_lines = None
+        entry_size = 0
+        for line in log_file:
+            if line.startswith(ENTRY_START_LINE):
+                if entry_lines:
+                    yield b"".join(entry_lines) # Entri sebelumnya tanpa penanda akhir: kirim apa adanya
+                entry_lines, entry_size = [line], len(line)
+                continue
+            if entry_lines is None:
+                yield line
+                continue
+            entry_lines.append(line)
+            entry_size += len(line)
+            if line.startswith(ENTRY_END_LINE):
+                yield from expand_entry(b"".join(entry_lines))
+                entry_lines = None
+            elif entry_size > max_entry_size:
+                yield b"".join(entry_lines)
+                entry_lines = None
+        if entry_lines:
+            yield b"".join(entry_lines)
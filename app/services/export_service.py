@@ -0,0 +1,174 @@
+import time
+import json
+import tarfile
+import zipfile
+from flask import current_app
+from werkzeug.utils import secure_filename
+from ..models import db, DeviceLogFile
+from .log_storage import get_log_version, iter_log_bytes, device_log_path, locate_device_log
+
+# Ekspor seluruh log perangkat sebuah package sebagai arsip yang dibuat on-the-fly. Arsip tidak
+# pernah disusun di memori atau di file sementara: header dan isi setiap file log langsung
+# di-yield per chunk, sehingga memori tetap konstan berapa pun ukuran package.
+#
+# Isi file dikirim lewat generator Python, bukan wsgi.file_wrapper/sendfile: file_wrapper hanya
+# bisa membungkus satu file per respons (tidak bisa diselingi header member arsip), dan segmen
+# tertutup disimpan terkompresi gzip sehingga isi logisnya memang harus didekompresi di Python.
+#
+# Ukuran member ditulis di header sebelum isinya dibaca. Jika file menyusut di tengah ekspor
+# (retensi), member diisi baris kosong sampai ukuran header, lalu arsip ditutup dengan member
+# EXPORT_WARNINGS_MEMBER berisi daftar member yang terpotong.
+ARCHIVE_MIMETYPES = {
+    'tar': 'application/x-tar',
+    'zip': 'application/zip',
+}
+EXPORT_CHUNK_SIZE = 256 * 1024
+ZIP_MIN_TIMESTAMP = 315532800 # 1980-01-01, tanggal terkecil yang bisa disimpan format zip
+EXPORT_WARNINGS_MEMBER = "EXPORT_WARNINGS.json"
+
+
+class _ArchiveSink:
+    """Tujuan tulis zipfile yang tidak bisa di-seek; byte yang ditulis diambil dengan drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_export_members(package_id, updated_since):
+    """(nama member, path file log, versi log) untuk setiap perangkat, dibaca per batch keyset.
+
+    Transaksi baca ditutup setelah setiap batch agar unduhan yang lama tidak menahan lock DB.
+    """
+    from .log_service import _metadata_select
+
+    package_folder_name = secure_filename(package_id)
+    batch_size = current_app.config.get('METADATA_STREAM_BATCH_SIZE', 1000)
+    last_seen_id = None
+    while True:
+        rows = db.session.execute(_metadata_select(package_id, updated_since, last_seen_id).limit(batch_size)).all()
+        db.session.rollback()
+        if not rows:
+            return
+        last_seen_id = rows[-1].id
+        for row in rows:
+            filepath = locate_device_log(device_log_path(package_id, row.server_filename))
+            try:
+                log_version = get_log_version(filepath)
+            except FileNotFoundError:
+                continue # Metadata tanpa file (misalnya sudah dihapus retensi)
+            yield f"{package_folder_name}/{row.server_filename}", filepath, log_version
+
+def _iter_member_bytes(member_name, filepath, size, truncated_members):
+    """Isi logis file log sebanyak size byte (ukuran saat header ditulis).
+
+    Entri yang ditambahkan setelahnya tidak ikut. Jika file menyusut di tengah jalan (cleanup),
+    sisanya diisi baris kosong agar ukuran member tetap sesuai header, dan member dicatat di
+    truncated_members.
+    """
+    sent_size = 0
+    try:
+        for chunk in iter_log_bytes(filepath, 0, size, EXPORT_CHUNK_SIZE):
+            sent_size += len(chunk)
+            yield chunk
+    except FileNotFoundError:
+        pass
+    if sent_size < size:
+        current_app.logger.warning(f"Log file {filepath} shrank during export; padding {size - sent_size} bytes.")
+        truncated_members.append({"member": member_name, "size": size, "available_size": sent_size})
+        while sent_size < size:
+            padding_size = min(EXPORT_CHUNK_SIZE, size - sent_size)
+            sent_size += padding_size
+            yield b"\n" * padding_size
+
+def _warnings_document(truncated_members):
+    """Isi EXPORT_WARNINGS_MEMBER: member yang isinya tidak lengkap karena file menyusut saat ekspor."""
+    return json.dumps({
+        "truncated_members": truncated_members,
+        "message": "These members were padded with empty lines up to 'size'; only the first 'available_size' bytes are log data."
+    }, indent=2).encode('utf-8') + b"\n"
+
+def _iter_tar_member(member_name, size, mtime, member_bytes):
+    tar_info = tarfile.TarInfo(member_name)
+    tar_info.size = size
+    tar_info.mtime = mtime
+    tar_info.mode = 0o644
+    header = tar_info.tobuf(format=tarfile.PAX_FORMAT)
+    yield header
+    yield from member_bytes
+    padding_size = -size % tarfile.BLOCKSIZE
+    if padding_size:
+        yield tarfile.NUL * padding_size
+
+def _generate_tar(members):
+    written_size = 0
+    truncated_members = []
+    for member_name, filepath, log_version in members:
+        for data in _iter_tar_member(
+            member_name, log_version.size, log_version.mtime_ns // 1_000_000_000,
+            _iter_member_bytes(member_name, filepath, log_version.size, truncated_members)
+        ):
+            written_size += len(data)
+            yield data
+    if truncated_members:
+        document = _warnings_document(truncated_members)
+        for data in _iter_tar_member(EXPORT_WARNINGS_MEMBER, len(document), int(time.time()), (document,)):
+            written_size += len(data)
+            yield data
+    # Penutup arsip: dua blok kosong, lalu genapkan ke kelipatan RECORDSIZE seperti tarfile
+    written_size += 2 * tarfile.BLOCKSIZE
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE + (-written_size % tarfile.RECORDSIZE))
+
+def _generate_zip(members):
+    sink = _ArchiveSink()
+    truncated_members = []
+    # Tujuan tidak bisa di-seek, jadi zipfile menulis ukuran dan CRC di data descriptor setelah isi file
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for member_name, filepath, log_version in members:
+            modified_time = max(log_version.mtime_ns // 1_000_000_000, ZIP_MIN_TIMESTAMP)
+            zip_info = zipfile.ZipInfo(member_name, date_time=time.localtime(modified_time)[:6])
+            zip_info.compress_type = zipfile.ZIP_DEFLATED
+            zip_info.external_attr = 0o644 << 16
+            with archive.open(zip_info, 'w', force_zip64=log_version.size >= zipfile.ZIP64_LIMIT) as member_file:
+                for chunk in _iter_member_bytes(member_name, filepath, log_version.size, truncated_members):
+                    member_file.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+        if truncated_members:
+            archive.writestr(EXPORT_WARNINGS_MEMBER, _warnings_document(truncated_members))
+            yield sink.drain()
+    yield sink.drain() # Central directory ditulis saat arsip ditutup
+
+def iter_package_export(package_id, archive_format='tar', updated_since_str=None):
+    """Validasi parameter lalu kembalikan (generator byte arsip, 200) atau (error_dict, status_code).
+
+    updated_since membatasi ekspor ke perangkat yang menerima entri baru sejak waktu tersebut.
+    """
+    from .log_service import _parse_time_bound
+
+    if not package_id:
+        return {"error": "Package ID is required"}, 400
+    if archive_format not in ARCHIVE_MIMETYPES:
+        return {"error": f"Invalid 'format': {archive_format} (expected one of: {', '.join(ARCHIVE_MIMETYPES)})"}, 400
+    try:
+        updated_since = _parse_time_bound(updated_since_str, 'updated_since')
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    if db.session.query(DeviceLogFile.id).filter_by(package_id=package_id).first() is None:
+        return {"message": f"No log metadata found for package ID: {package_id}"}, 404
+
+    members = _iter_export_members(package_id, updated_since)
+    return (_generate_tar(members) if archive_format == 'tar' else _generate_zip(members)), 200
@@ -0,0 +1,371 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import zlib
+import hashlib
+import datetime
+import threading
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+
+try: # fcntl hanya tersedia di POSIX; ingest asinkron membutuhkannya untuk lock antar proses
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Layout spool:
+#   pending/<job_id>.log + pending/<job_id>.json   -> job diterima, menunggu diproses (atau menunggu retry)
+#   processing/<job_id>.json                       -> job sedang diproses
+#   queues/<device_key>/<job_id>                   -> penanda urutan job per perangkat (file kosong)
+#   queues/<device_key>/.drain.lock                -> flock: hanya satu proses yang memproses antrian perangkat
+#   done/<job_id>.json                             -> hasil akhir job (sukses atau gagal)
+#
+# Job untuk pasangan (package_id, device_id) yang sama diproses berurutan di semua worker gunicorn:
+# proses yang memegang lock drain perangkat selalu memproses penanda job tertua lebih dulu, dan job
+# yang gagal sementara menahan job sesudahnya sampai retry berhasil atau batas percobaan habis.
+PENDING_DIR = 'pending'
+PROCESSING_DIR = 'processing'
+QUEUES_DIR = 'queues'
+DONE_DIR = 'done'
+DRAIN_LOCK_NAME = '.drain.lock'
+INCOMING_PREFIX = '.incoming-'
+JOB_ID_REGEX = re.compile(r"^[0-9a-f]{16}-[0-9a-f]{12}$")
+
+
+def _new_job_id():
+    # Prefix waktu (hex lebar tetap) membuat urutan nama file = urutan penerimaan job
+    return f"{time.time_ns():016x}-{uuid.uuid4().hex[:12]}"
+
+def _device_key(package_id, device_id):
+    return hashlib.blake2b(f"{package_id}\0{device_id}".encode('utf-8'), digest_size=8).hexdigest()
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _try_lock(path):
+    """Membuka (membuat) path dan mengambil flock eksklusif tanpa menunggu; mengembalikan fd, atau None
+    jika lock sedang dipegang proses lain. Lock dilepas kernel saat proses mati."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class IngestQueue:
+    """Antrian ingest asinkron dengan spool di disk dan pool worker thread.
+
+    Job dijadwalkan per perangkat: worker thread yang menerima kunci perangkat mencoba mengambil lock
+    drain perangkat itu lalu memproses semua job perangkat tersebut sesuai urutan penerimaan. Jika
+    lock dipegang proses lain, proses itu yang akan memproses job baru (dicek ulang setelah lock
+    dilepas). Payload disimpan di spool sebelum respons 202 dikirim; kegagalan sementara (exception
+    atau status 5xx) diulang dengan backoff sampai INGEST_MAX_ATTEMPTS, dan job yang belum selesai
+    diproses ulang saat aplikasi dimulai kembali.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._queues = []
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._retry_timers = {}
+        self._retry_lock = threading.Lock()
+
+    def init_app(self, app):
+        if fcntl is None:
+            raise RuntimeError("INGEST_ASYNC_MODE requires fcntl (POSIX) for cross-process spool locking.")
+        self.app = app
+        spool_folder = app.config['INGEST_SPOOL_FOLDER']
+        for sub_dir in (PENDING_DIR, PROCESSING_DIR, QUEUES_DIR, DONE_DIR):
+            os.makedirs(os.path.join(spool_folder, sub_dir), exist_ok=True)
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def _spool_path(self, sub_dir, filename):
+        return os.path.join(self.app.config['INGEST_SPOOL_FOLDER'], sub_dir, filename)
+
+    def _queue_dir(self, device_key):
+        return self._spool_path(QUEUES_DIR, device_key)
+
+    def start(self):
+        """Menjalankan worker thread dan memasukkan kembali job yang tertinggal di spool."""
+        with self._start_lock:
+            if self._threads:
+                return
+            worker_count = max(1, int(self.app.config.get('INGEST_WORKER_COUNT', 4)))
+            self._queues = [queue.Queue() for _ in range(worker_count)]
+            for index, worker_queue in enumerate(self._queues):
+                thread = threading.Thread(
+                    target=self._worker_loop, args=(worker_queue,), name=f"ingest-worker-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            recovered_count = self._recover_spooled_jobs()
+            self.app.logger.info(f"Ingest queue started with {worker_count} workers ({recovered_count} spooled jobs recovered).")
+
+    def _recover_spooled_jobs(self):
+        # Setiap job di pending/processing mendapat penanda antrian (yang hilang karena crash dibuat
+        # ulang), lalu antrian perangkatnya dijadwalkan. Job di processing milik proses yang mati
+        # diproses ulang oleh pemegang lock drain berikutnya; nama lama <job_id>.<pid>.json dari
+        # versi sebelumnya dikembalikan ke pending.
+        processing_dir = os.path.join(self.app.config['INGEST_SPOOL_FOLDER'], PROCESSING_DIR)
+        for filename in os.listdir(processing_dir):
+            parts = filename.split('.')
+            if len(parts) == 3 and JOB_ID_REGEX.match(parts[0]) and parts[2] == 'json':
+                try:
+                    os.replace(os.path.join(processing_dir, filename), self._spool_path(PENDING_DIR, f"{parts[0]}.json"))
+                except OSError:
+                    pass # Sudah dipulihkan oleh proses lain
+
+        recovered_count = 0
+        device_keys = set()
+        for sub_dir in (PROCESSING_DIR, PENDING_DIR):
+            folder = os.path.join(self.app.config['INGEST_SPOOL_FOLDER'], sub_dir)
+            for filename in sorted(os.listdir(folder)):
+                job_id, extension = os.path.splitext(filename)
+                if extension != '.json' or not JOB_ID_REGEX.match(job_id):
+                    continue
+                try:
+                    job = _read_json(os.path.join(folder, filename))
+                except (OSError, ValueError):
+                    continue
+                device_key = _device_key(job['package_id'], job['device_id'])
+                self._add_queue_marker(device_key, job_id)
+                device_keys.add(device_key)
+                recovered_count += 1
+        for device_key in sorted(device_keys):
+            self._dispatch(device_key)
+        return recovered_count
+
+    def _add_queue_marker(self, device_key, job_id):
+        queue_dir = self._queue_dir(device_key)
+        os.makedirs(queue_dir, exist_ok=True)
+        with open(os.path.join(queue_dir, job_id), 'ab'):
+            pass
+
+    def _dispatch(self, device_key):
+        self._queues[zlib.crc32(device_key.encode('ascii')) % len(self._queues)].put(device_key)
+
+    def submit_upload(self, package_id, device_id, client_log_file):
+        """Menyimpan payload unggahan ke spool lalu menjadwalkannya; mengembalikan data job."""
+        if not self._threads:
+            self.start()
+        incoming_path = self._spool_path(PENDING_DIR, f"{INCOMING_PREFIX}{uuid.uuid4().hex}.log")
+        payload_path = None
+        json_path = None
+        try:
+            client_log_file.save(incoming_path)
+            # Job id (urutan antrian) dibuat setelah payload lengkap diterima, bukan saat unggahan mulai
+            job_id = _new_job_id()
+            job = {
+                "job_id": job_id,
+                "package_id": package_id,
+                "device_id": device_id,
+                "filename": client_log_file.filename,
+                "accepted_at": datetime.datetime.utcnow().isoformat() + "Z",
+                "attempts": 0
+            }
+            payload_path = self._spool_path(PENDING_DIR, f"{job_id}.log")
+            os.replace(incoming_path, payload_path)
+            # File .json ditulis setelah payload: job hanya dianggap ada setelah payload lengkap di disk
+            json_path = self._spool_path(PENDING_DIR, f"{job_id}.json")
+            _write_json_atomic(json_path, job)
+            device_key = _device_key(package_id, device_id)
+            self._add_queue_marker(device_key, job_id)
+        except Exception:
+            for path in (incoming_path, payload_path, json_path):
+                if path:
+                    _remove_if_exists(path)
+            raise
+        self._dispatch(device_key)
+        return job
+
+    def _worker_loop(self, worker_queue):
+        while True:
+            device_key = worker_queue.get()
+            try:
+                self._drain_device(device_key)
+            except Exception as e:
+                self.app.logger.error(f"Unexpected error in ingest worker for device queue {device_key}: {e}", exc_info=True)
+            finally:
+                worker_queue.task_done()
+
+    def _queued_job_ids(self, queue_dir):
+        try:
+            return sorted(name for name in os.listdir(queue_dir) if JOB_ID_REGEX.match(name))
+        except FileNotFoundError:
+            return []
+
+    def _drain_device(self, device_key):
+        queue_dir = self._queue_dir(device_key)
+        os.makedirs(queue_dir, exist_ok=True)
+        while True:
+            lock_fd = _try_lock(os.path.join(queue_dir, DRAIN_LOCK_NAME))
+            if lock_fd is None:
+                return # Proses lain sedang memproses antrian ini dan akan mengecek ulang setelah selesai
+            try:
+                retry_delay = self._drain_locked_queue(queue_dir)
+            finally:
+                os.close(lock_fd)
+            if retry_delay is not None:
+                self._schedule_retry(device_key, retry_delay)
+                return
+            # Dicek ulang setelah lock dilepas: job yang masuk saat lock dipegang (dan proses
+            # pengirimnya gagal mengambil lock) tetap diproses
+            if not self._queued_job_ids(queue_dir):
+                return
+
+    def _drain_locked_queue(self, queue_dir):
+        """Memproses job antrian perangkat sesuai urutan; harus memegang lock drain.
+
+        Mengembalikan jumlah detik sampai job terdepan boleh dicoba lagi jika sedang menunggu backoff,
+        atau None jika antrian kosong.
+        """
+        for job_id in self._queued_job_ids(queue_dir):
+            job = self._load_queued_job(job_id)
+            if job is not None:
+                retry_delay = job.get('retry_at', 0) - time.time()
+                if retry_delay > 0:
+                    return retry_delay # Job sesudahnya ikut menunggu agar urutan perangkat terjaga
+                if not self._run_job(job):
+                    return self._retry_backoff_seconds(job['attempts'])
+            _remove_if_exists(os.path.join(queue_dir, job_id))
+        return None
+
+    def _load_queued_job(self, job_id):
+        """Data job untuk penanda antrian, atau None jika job sudah selesai (sisa file dibersihkan)."""
+        if os.path.exists(self._spool_path(DONE_DIR, f"{job_id}.json")):
+            # Crash setelah hasil ditulis: bersihkan sisa payload/job
+            for path in (self._spool_path(PENDING_DIR, f"{job_id}.log"), self._spool_path(PENDING_DIR, f"{job_id}.json"),
+                         self._spool_path(PROCESSING_DIR, f"{job_id}.json")):
+                _remove_if_exists(path)
+            return None
+        for sub_dir in (PROCESSING_DIR, PENDING_DIR): # processing = percobaan sebelumnya terhenti (crash)
+            try:
+                return _read_json(self._spool_path(sub_dir, f"{job_id}.json"))
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                self.app.logger.error(f"Corrupt spooled job file for {job_id}; skipping it.")
+                return None
+        return None
+
+    def _retry_backoff_seconds(self, attempts):
+        base_seconds = self.app.config.get('INGEST_RETRY_BACKOFF_SECONDS', 2)
+        return min(base_seconds * (2 ** max(0, attempts - 1)), self.app.config.get('INGEST_RETRY_MAX_BACKOFF_SECONDS', 300))
+
+    def _schedule_retry(self, device_key, delay_seconds):
+        with self._retry_lock:
+            if device_key in self._retry_timers:
+                return
+            timer = threading.Timer(delay_seconds, self._fire_retry, args=(device_key,))
+            timer.daemon = True
+            self._retry_timers[device_key] = timer
+        timer.start()
+
+    def _fire_retry(self, device_key):
+        with self._retry_lock:
+            self._retry_timers.pop(device_key, None)
+        self._dispatch(device_key)
+
+    def _run_job(self, job):
+        """Memproses satu job; True jika selesai (hasil ditulis ke done), False jika dijadwalkan ulang."""
+        from . import log_service
+
+        job_id = job['job_id']
+        payload_path = self._spool_path(PENDING_DIR, f"{job_id}.log")
+        processing_path = self._spool_path(PROCESSING_DIR, f"{job_id}.json")
+        attempts = job.get('attempts', 0) + 1
+        _write_json_atomic(processing_path, {**job, "attempts": attempts})
+        _remove_if_exists(self._spool_path(PENDING_DIR, f"{job_id}.json"))
+
+        with self.app.app_context():
+            try:
+                with open(payload_path, 'rb') as payload_stream:
+                    response_data, status_code = log_service.process_log_upload(
+                        job['package_id'], job['device_id'],
+                        FileStorage(stream=payload_stream, filename=job.get('filename') or 'upload.log')
+                    )
+            except FileNotFoundError as e:
+                current_app.logger.error(f"Payload of spooled job {job_id} is missing: {e}")
+                response_data, status_code = {"error": "Spooled payload is missing"}, 410
+            except Exception as e:
+                current_app.logger.error(f"Error processing spooled job {job_id}: {e}", exc_info=True)
+                response_data, status_code = {"error": f"Could not process log file: {str(e)}"}, 500
+
+        max_attempts = self.app.config.get('INGEST_MAX_ATTEMPTS', 5)
+        if status_code >= 500 and attempts < max_attempts:
+            # Kegagalan sementara (DB/disk): payload tetap di spool, job kembali ke pending dengan backoff
+            retry_delay = self._retry_backoff_seconds(attempts)
+            _write_json_atomic(self._spool_path(PENDING_DIR, f"{job_id}.json"), {
+                **job,
+                "attempts": attempts,
+                "retry_at": time.time() + retry_delay,
+                "last_error": response_data,
+                "last_status_code": status_code
+            })
+            _remove_if_exists(processing_path)
+            self.app.logger.warning(f"Spooled job {job_id} failed (attempt {attempts}/{max_attempts}); retrying in {retry_delay:.1f}s.")
+            return False
+
+        _write_json_atomic(self._spool_path(DONE_DIR, f"{job_id}.json"), {
+            **job,
+            "attempts": attempts,
+            "status": "succeeded" if status_code < 400 else "failed",
+            "status_code": status_code,
+            "result": response_data,
+            "finished_at": datetime.datetime.utcnow().isoformat() + "Z"
+        })
+        for path in (payload_path, processing_path):
+            _remove_if_exists(path)
+        return True
+
+    def get_job_status(self, job_id):
+        """Mengembalikan status job dari spool, atau None jika job tidak dikenal."""
+        if not JOB_ID_REGEX.match(job_id or ''):
+            return None
+        for sub_dir, status in ((DONE_DIR, None), (PROCESSING_DIR, "processing"), (PENDING_DIR, "queued")):
+            try:
+                job = _read_json(self._spool_path(sub_dir, f"{job_id}.json"))
+            except FileNotFoundError:
+                continue
+            return job if status is None else {**job, "status": status}
+        return None
+
+    def purge_finished_jobs(self, max_age_hours):
+        """Menghapus hasil job yang sudah selesai (dan payload unggahan yang terputus) lebih dari max_age_hours jam yang lalu."""
+        cutoff = time.time() - max_age_hours * 3600
+        purged_count = 0
+        for sub_dir, prefix in ((DONE_DIR, ''), (PENDING_DIR, INCOMING_PREFIX)):
+            with os.scandir(os.path.join(self.app.config['INGEST_SPOOL_FOLDER'], sub_dir)) as entries:
+                for entry in entries:
+                    try:
+                        if entry.name.startswith(prefix) and entry.is_file() and entry.stat().st_mtime < cutoff:
+                            os.remove(entry.path)
+                            purged_count += 1
+                    except OSError:
+                        continue
+        return purged_count
+
+
+ingest_queue = IngestQueue()
@@ -0,0 +1,248 @@
+import os
+import re
+import struct
+import datetime
+import tempfile
+from .log_storage import open_log_reader, logical_size
+from ..utils.device_locks import device_file_locks
+
+# Setiap entri di <device_id>.log punya satu record 16 byte di <device_id>.idx:
+#   int64  timestamp (ms sejak epoch) terbesar sampai dengan entri ini (running max)
+#   uint64 offset byte logis awal entri (lihat log_storage untuk mode segmented)
+# Running max membuat kolom timestamp selalu terurut meskipun satu unggahan berisi entri yang
+# tidak berurutan, sehingga rentang waktu bisa dicari dengan binary search.
+INDEX_RECORD = struct.Struct('<qQ')
+INDEX_FILE_SUFFIX = '.idx'
+EPOCH = datetime.datetime(1970, 1, 1)
+ENTRY_START_LINE = b"--- API Error Log ---"
+TIMESTAMP_LINE_REGEX = re.compile(rb"^\s*Timestamp: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})")
+
+
+def index_path_for(log_filepath):
+    base, _ = os.path.splitext(log_filepath)
+    return base + INDEX_FILE_SUFFIX
+
+def timestamp_to_ms(timestamp_obj):
+    return (timestamp_obj - EPOCH) // datetime.timedelta(milliseconds=1)
+
+def _read_record(index_file, record_number):
+    index_file.seek(record_number * INDEX_RECORD.size)
+    return INDEX_RECORD.unpack(index_file.read(INDEX_RECORD.size))
+
+def read_last_record(index_filepath):
+    """Mengembalikan record terakhir (max_ts_ms, offset) atau None jika indeks kosong/tidak ada."""
+    try:
+        with open(index_filepath, 'rb') as index_file:
+            record_count = os.fstat(index_file.fileno()).st_size // INDEX_RECORD.size
+            return _read_record(index_file, record_count - 1) if record_count else None
+    except FileNotFoundError:
+        return None
+
+def iter_entry_offsets(log_file, start_offset=0):
+    """Memindai log (mode biner, sudah diposisikan di start_offset) dan menghasilkan (offset, timestamp) per entri."""
+    offset = start_offset
+    pending_offset = None
+    for line in log_file:
+        if line.startswith(ENTRY_START_LINE):
+            pending_offset = offset
+        elif pending_offset is not None:
+            match = TIMESTAMP_LINE_REGEX.match(line)
+            if match:
+                timestamp_obj = datetime.datetime.strptime(match.group(1).decode('ascii'), "%Y-%m-%d %H:%M:%S.%f")
+                yield pending_offset, timestamp_obj
+            pending_offset = None
+        offset += len(line)
+
+def _create_temp_index(index_filepath):
+    """File sementara dengan nama unik di direktori indeks (bukan nama tetap yang bisa dipakai bersamaan)."""
+    fd, tmp_filepath = tempfile.mkstemp(
+        prefix=os.path.basename(index_filepath) + '.', suffix='.tmp', dir=os.path.dirname(index_filepath)
+    )
+    return os.fdopen(fd, 'wb'), tmp_filepath
+
+def rebuild_log_index(log_filepath):
+    """Membangun ulang file indeks dari isi file log; ditulis atomik lewat file sementara.
+
+    Harus dipanggil saat memegang lock perangkat (lihat ensure_log_index untuk pembaca tanpa lock).
+    """
+    index_filepath = index_path_for(log_filepath)
+    index_file, tmp_filepath = _create_temp_index(index_filepath)
+    running_max_ms = None
+    try:
+        with index_file, open_log_reader(log_filepath) as log_file:
+            for offset, timestamp_obj in iter_entry_offsets(log_file):
+                timestamp_ms = timestamp_to_ms(timestamp_obj)
+                running_max_ms = timestamp_ms if running_max_ms is None else max(running_max_ms, timestamp_ms)
+                index_file.write(INDEX_RECORD.pack(running_max_ms, offset))
+        os.replace(tmp_filepath, index_filepath)
+    except Exception:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
+    return index_filepath
+
+def _index_out_of_sync(log_filepath, index_filepath):
+    log_size = logical_size(log_filepath)
+    last_record = read_last_record(index_filepath)
+    if last_record is None:
+        return not (log_size == 0 and os.path.exists(index_filepath))
+    return last_record[1] >= log_size # File log dipotong/diganti tanpa memperbarui indeks
+
+def ensure_log_index(log_filepath, lock_filepath=None):
+    """Memastikan indeks ada dan mencakup file log; membangun ulang jika hilang atau tidak sinkron.
+
+    Pemanggil yang belum memegang lock perangkat (jalur baca) harus mengisi lock_filepath dengan
+    path kanonik log: rebuild lalu dijalankan di bawah lock yang sama dengan upload dan retensi,
+    setelah dicek ulang, sehingga tidak menimpa indeks yang baru saja diperpanjang atau digeser.
+    """
+    index_filepath = index_path_for(log_filepath)
+    if not _index_out_of_sync(log_filepath, index_filepath):
+        return index_filepath
+    if lock_filepath is None:
+        return rebuild_log_index(log_filepath)
+    os.makedirs(os.path.dirname(lock_filepath), exist_ok=True)
+    with device_file_locks([lock_filepath]):
+        if _index_out_of_sync(log_filepath, index_filepath):
+            rebuild_log_index(log_filepath)
+    return index_filepath
+
+
+class LogIndexAppender:
+    """Mengumpulkan record indeks selama append lalu menuliskannya sekaligus ke file .idx."""
+
+    def __init__(self, log_filepath, log_size_before_append):
+        self.index_filepath = index_path_for(log_filepath)
+        if log_size_before_append == 0:
+            # Log baru (atau sudah dihapus oleh retensi): buang record lama yang mungkin tertinggal
+            if os.path.exists(self.index_filepath):
+                os.truncate(self.index_filepath, 0)
+        elif read_last_record(self.index_filepath) is None:
+            # Log lama yang dibuat sebelum ada indeks: bangun dulu agar offset tetap konsisten
+            rebuild_log_index(log_filepath)
+        last_record = read_last_record(self.index_filepath)
+        self.running_max_ms = last_record[0] if last_record else None
+        self.start_size = os.path.getsize(self.index_filepath) if os.path.exists(self.index_filepath) else 0
+        self._records = bytearray()
+
+    def add(self, timestamp_obj, offset):
+        timestamp_ms = timestamp_to_ms(timestamp_obj)
+        if self.running_max_ms is None or timestamp_ms > self.running_max_ms:
+            self.running_max_ms = timestamp_ms
+        self._records += INDEX_RECORD.pack(self.running_max_ms, offset)
+
+    def flush(self, write_session):
+        """Menulis record yang terkumpul lewat sesi log_writer yang sama dengan file log-nya (ikut kebijakan fsync)."""
+        if self._records:
+            write_session.open_append(self.index_filepath).write(bytes(self._records))
+            self._records = bytearray()
+
+
+def _first_record_above(index_file, record_count, threshold_ms, inclusive):
+    """Binary search: nomor record pertama dengan max_ts >= threshold (inclusive) atau > threshold."""
+    low, high = 0, record_count
+    while low < high:
+        middle = (low + high) // 2
+        max_ts_ms = _read_record(index_file, middle)[0]
+        if max_ts_ms > threshold_ms or (inclusive and max_ts_ms == threshold_ms):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+def find_byte_range(log_filepath, from_timestamp=None, to_timestamp=None, lock_filepath=None):
+    """Mencari rentang byte [start, end) di file log untuk entri dengan timestamp dalam [from, to].
+
+    Hanya membaca O(log n) record dari file indeks. lock_filepath: lihat ensure_log_index.
+    """
+    index_filepath = ensure_log_index(log_filepath, lock_filepath)
+    log_size = logical_size(log_filepath)
+    with open(index_filepath, 'rb') as index_file:
+        record_count = os.fstat(index_file.fileno()).st_size // INDEX_RECORD.size
+        if record_count == 0:
+            return 0, 0
+
+        start_record = 0
+        if from_timestamp is not None:
+            start_record = _first_record_above(index_file, record_count, timestamp_to_ms(from_timestamp), inclusive=True)
+        end_record = record_count
+        if to_timestamp is not None:
+            end_record = _first_record_above(index_file, record_count, timestamp_to_ms(to_timestamp), inclusive=False)
+        if start_record >= end_record:
+            return 0, 0
+
+        start_offset = _read_record(index_file, start_record)[1]
+        end_offset = _read_record(index_file, end_record)[1] if end_record < record_count else log_size
+        return start_offset, end_offset
+
+
+def read_first_timestamp_ms(index_filepath):
+    """Timestamp (ms) entri pertama menurut indeks, atau None jika indeks kosong/tidak ada."""
+    try:
+        with open(index_filepath, 'rb') as index_file:
+            record = index_file.read(INDEX_RECORD.size)
+    except FileNotFoundError:
+        return None
+    return INDEX_RECORD.unpack(record)[0] if len(record) == INDEX_RECORD.size else None
+
+def find_retention_cut(log_filepath, cutoff_timestamp):
+    """Mencari titik potong retensi: (nomor record pertama yang dipertahankan, offset logisnya, jumlah record).
+
+    Record pertama yang dipertahankan adalah record pertama dengan max_ts >= cutoff; semua entri
+    sebelumnya lebih tua dari cutoff. Jika tidak ada, offset = ukuran logis log (semua entri lama).
+    """
+    index_filepath = ensure_log_index(log_filepath)
+    with open(index_filepath, 'rb') as index_file:
+        record_count = os.fstat(index_file.fileno()).st_size // INDEX_RECORD.size
+        first_kept = _first_record_above(index_file, record_count, timestamp_to_ms(cutoff_timestamp), inclusive=True)
+        if first_kept < record_count:
+            return first_kept, _read_record(index_file, first_kept)[1], record_count
+    return first_kept, logical_size(log_filepath), record_count
+
+def shift_log_index(log_filepath, first_kept_record, trim_offset):
+    """Menulis ulang indeks setelah prefix log dipotong: buang record awal dan geser offset-nya.
+
+    Harus dipanggil saat memegang lock perangkat.
+    """
+    index_filepath = index_path_for(log_filepath)
+    target, tmp_filepath = _create_temp_index(index_filepath)
+    try:
+        with target, open(index_filepath, 'rb') as source:
+            source.seek(first_kept_record * INDEX_RECORD.size)
+            while True:
+                chunk = source.read(INDEX_RECORD.size * 4096)
+                if not chunk:
+                    break
+                target.write(b"".join(
+                    INDEX_RECORD.pack(max_ts_ms, offset - trim_offset)
+                    for max_ts_ms, offset in INDEX_RECORD.iter_unpack(chunk)
+                ))
+        os.replace(tmp_filepath, index_filepath)
+    except Exception:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
+
+def find_size_cut(log_filepath, max_bytes):
+    """Mencari titik potong agar ukuran logis log <= max_bytes dengan membuang entri tertua.
+
+    Mengembalikan (nomor record pertama yang dipertahankan, offset logisnya, jumlah record), sama
+    seperti find_retention_cut; (0, 0, jumlah record) jika log sudah cukup kecil.
+    """
+    index_filepath = ensure_log_index(log_filepath)
+    log_size = logical_size(log_filepath)
+    with open(index_filepath, 'rb') as index_file:
+        record_count = os.fstat(index_file.fileno()).st_size // INDEX_RECORD.size
+        if log_size <= max_bytes:
+            return 0, 0, record_count
+        # Binary search: record pertama yang mulai pada atau setelah log_size - max_bytes
+        min_offset = log_size - max_bytes
+        low, high = 0, record_count
+        while low < high:
+            middle = (low + high) // 2
+            if _read_record(index_file, middle)[1] >= min_offset:
+                high = middle
+            else:
+                low = middle + 1
+        if low < record_count:
+            return low, _read_record(index_file, low)[1], record_count
+    return low, log_size, record_count
@@ -1,15 +1,41 @@
 import os
+import gzip
+import time
+import logging
+import codecs
+import threading
 import datetime
 import re
+import json
 from flask import current_app, jsonify
+from sqlalchemy import select, tuple_, and_, or_, case
 from werkzeug.utils import secure_filename
-from ..models import db, DeviceLogFile
+from ..models import db, DeviceLogFile, DeviceDedupState
+from ..utils.device_locks import device_file_locks
+from ..utils import metrics
+from .log_index import LogIndexAppender, find_byte_range
+from .log_storage import (
+    maybe_roll_active_segment, load_segments, sealed_length, open_log_reader, get_log_version,
+    device_log_path, locate_device_log, adopt_legacy_log
+)
+from .cursor_cache import cursor_cache, DeviceCursor
+from .dedup_window import DedupWindow
+from .entry_collapse import EntryCollapser
+from .log_writer import log_writer
+from .log_tail import log_tail_hub
+from .rollup_service import RollupAccumulator
+from .search_index import SearchIndexBatch, search_enabled
 
 # Regex dan format datetime bisa dipindah ke modul utilitas jika digunakan di banyak tempat
 LOG_ENTRY_REGEX = re.compile(
     r"--- API Error Log ---\s*Timestamp: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})\s*([\s\S]*?)--- End Log Entry ---"
 )
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f" # Format dari Flutter termasuk milidetik
+LOG_ENTRY_START_MARKER = "--- API Error Log ---"
+LOG_ENTRY_END_MARKER = "--- End Log Entry ---"
+# Timestamp memiliki lebar tetap (YYYY-MM-DD HH:MM:SS.mmm), sehingga urutan string = urutan waktu
+TIMESTAMP_FIELD_PREFIX = b"Timestamp: "
+TIMESTAMP_STR_LENGTH = 23
 
 def parse_timestamp_from_log_entry_str(timestamp_str):
     try:
@@ -20,34 +46,138 @@ def parse_timestamp_from_log_entry_str(timestamp_str):
         except ValueError:
             return None
 
-def process_log_upload(package_id, device_id, client_log_file):
-    """Memproses unggahan file log dari klien."""
+def truncate_timestamp_for_compare(timestamp_obj):
+    """String timestamp lebar tetap yang dibulatkan ke bawah ke milidetik, atau None.
+
+    Timestamp entri selalu presisi milidetik, sehingga string entri <= hasilnya jika dan hanya jika
+    entri tidak lebih baru dari timestamp_obj.
+    """
+    return timestamp_obj.strftime(DATETIME_FORMAT)[:TIMESTAMP_STR_LENGTH] if timestamp_obj else None
+
+def load_dedup_window(dedup_state, last_known_timestamp_obj):
+    """Jendela dedup perangkat dari blob state; tanpa state, floor = timestamp terakhir (perilaku lama)."""
+    return DedupWindow.from_state(
+        dedup_state, truncate_timestamp_for_compare(last_known_timestamp_obj),
+        recent_size=current_app.config.get('DEDUP_RECENT_HASHES', 128),
+        bloom_bytes=current_app.config.get('DEDUP_BLOOM_BYTES', 1024),
+        bloom_hash_count=current_app.config.get('DEDUP_BLOOM_HASHES', 7)
+    )
+
+def _is_seekable(stream):
+    try:
+        return stream.seekable()
+    except (AttributeError, OSError, ValueError):
+        return False
+
+def find_first_newer_entry_offset(stream, last_known_timestamp_str, chunk_size=None):
+    """Mencari offset byte tempat parsing perlu dimulai agar semua entri yang lebih baru tetap terbaca.
+
+    Stream dipindai sebagai bytes (tanpa decode, regex, maupun strptime) untuk mencari field
+    Timestamp pertama yang lebih baru dari last_known_timestamp_str. Offset yang dikembalikan adalah
+    posisi tepat setelah penanda akhir entri sebelumnya, sehingga hasil parsing dari offset itu sama
+    dengan parsing dari awal. Jika urutan file acak, timestamp baru akan ditemukan lebih awal dan
+    otomatis kembali ke pemindaian penuh. Mengembalikan None jika tidak ada entri yang lebih baru.
+    Posisi stream tidak dikembalikan; pemanggil harus melakukan seek sendiri.
+    """
+    chunk_size = chunk_size or current_app.config.get('UPLOAD_READ_CHUNK_SIZE', 64 * 1024)
+    last_known = last_known_timestamp_str.encode('ascii')
+    end_marker = LOG_ENTRY_END_MARKER.encode('ascii')
+    prefix_len = len(TIMESTAMP_FIELD_PREFIX)
+    overlap = max(prefix_len + TIMESTAMP_STR_LENGTH, len(end_marker)) - 1
+
+    data_pos = stream.tell() # Offset absolut dari data[0]
+    safe_offset = data_pos
+    data = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        is_final = not chunk
+        data += chunk
+        scan_limit = len(data) if is_final else max(len(data) - overlap, 0)
+
+        idx = data.find(TIMESTAMP_FIELD_PREFIX, 0, scan_limit + prefix_len - 1)
+        while idx != -1 and idx < scan_limit:
+            value_start = idx + prefix_len
+            if data[value_start:value_start + TIMESTAMP_STR_LENGTH] > last_known:
+                end_idx = data.rfind(end_marker, 0, idx)
+                return data_pos + end_idx + len(end_marker) if end_idx != -1 else safe_offset
+            idx = data.find(TIMESTAMP_FIELD_PREFIX, value_start, scan_limit + prefix_len - 1)
+
+        if is_final:
+            return None
+        end_idx = data.rfind(end_marker, 0, scan_limit + len(end_marker) - 1)
+        if end_idx != -1:
+            safe_offset = data_pos + end_idx + len(end_marker)
+        data = data[scan_limit:]
+        data_pos += scan_limit
+
+def _pending_tail(buffer, consumed_until):
+    """Mengembalikan sisa buffer yang masih mungkin menjadi bagian dari entri di chunk berikutnya."""
+    rest_start = consumed_until
+    # Header sebelum penanda akhir terakhir sudah pasti tidak akan match lagi
+    last_end_marker = buffer.rfind(LOG_ENTRY_END_MARKER, consumed_until)
+    if last_end_marker != -1:
+        rest_start = last_end_marker + len(LOG_ENTRY_END_MARKER)
+    pending_header = buffer.find(LOG_ENTRY_START_MARKER, rest_start)
+    if pending_header != -1:
+        return buffer[pending_header:]
+    # Simpan ekor pendek saja, siapa tahu penanda awal terpotong di batas chunk
+    return buffer[max(rest_start, len(buffer) - len(LOG_ENTRY_START_MARKER) + 1):]
+
+def iter_log_entries(stream, chunk_size=None, max_pending_chars=None):
+    """Membaca stream unggahan per chunk dan menghasilkan match LOG_ENTRY_REGEX secara bertahap.
+
+    Entri yang terpotong di batas chunk dibawa ke chunk berikutnya, sehingga hasilnya sama
+    dengan LOG_ENTRY_REGEX.finditer pada seluruh isi file tanpa perlu memuat semuanya ke memori.
+    """
+    chunk_size = chunk_size or current_app.config.get('UPLOAD_READ_CHUNK_SIZE', 64 * 1024)
+    max_pending_chars = max_pending_chars or current_app.config.get('UPLOAD_MAX_PENDING_ENTRY_SIZE', 1024 * 1024)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ""
+
+    while True:
+        chunk = stream.read(chunk_size)
+        is_final = not chunk
+        buffer += decoder.decode(chunk or b"", final=is_final)
+
+        consumed_until = 0
+        for match in LOG_ENTRY_REGEX.finditer(buffer):
+            yield match
+            consumed_until = match.end()
+        if is_final:
+            return
+
+        buffer = _pending_tail(buffer, consumed_until)
+        if len(buffer) > max_pending_chars:
+            # Entri tanpa penanda akhir yang terlalu besar dibuang agar memori tetap terbatas
+            next_header = buffer.find(LOG_ENTRY_START_MARKER, 1)
+            current_app.logger.warning(
+                f"Dropping {len(buffer) if next_header == -1 else next_header} chars of unterminated log entry data "
+                f"(limit {max_pending_chars})."
+            )
+            buffer = buffer[next_header:] if next_header != -1 else ""
+
+def _validate_upload_request(package_id, device_id, client_log_file):
+    """Mengembalikan (error_dict, status_code) jika parameter unggahan tidak valid, atau None."""
     if not package_id:
         return {"error": "Package ID is required"}, 400
     if not device_id:
         return {"error": "Device ID is required"}, 400
     if not client_log_file or client_log_file.filename == '':
         return {"error": "No log file part in the request or no selected file"}, 400
+    return None
 
-    # Struktur folder: uploads/<package_id>/<device_id>.log
-    # Nama file di server hanya berdasarkan device_id karena sudah di dalam folder package_id
-    server_filename_base = secure_filename(device_id) + ".log"
-    
-    package_upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(package_id))
-    if not os.path.exists(package_upload_folder):
-        try:
-            os.makedirs(package_upload_folder)
-            current_app.logger.info(f"Created upload directory for package: {package_upload_folder}")
-        except OSError as e:
-            current_app.logger.error(f"Could not create directory {package_upload_folder}: {e}", exc_info=True)
-            return {"error": f"Server error: Could not create storage directory for package."}, 500
-            
-    server_filepath = os.path.join(package_upload_folder, server_filename_base)
-
-    device_log_metadata = DeviceLogFile.query.filter_by(package_id=package_id, device_id=device_id).first()
-    last_known_timestamp_obj = None
-    if device_log_metadata and device_log_metadata.last_processed_entry_timestamp:
-        last_known_timestamp_obj = device_log_metadata.last_processed_entry_timestamp
+def _ensure_device_log_folder(server_filepath):
+    """Membuat folder tempat file log perangkat (folder package dan subdirektori fan-out) jika belum ada."""
+    device_log_folder = os.path.dirname(server_filepath)
+    if not os.path.exists(device_log_folder):
+        os.makedirs(device_log_folder, exist_ok=True)
+        current_app.logger.info(f"Created upload directory: {device_log_folder}")
+    return device_log_folder
+
+def _log_last_known_timestamp(package_id, device_id, last_known_timestamp_obj):
+    if not current_app.logger.isEnabledFor(logging.INFO):
+        return # Dipanggil per perangkat di setiap unggahan; hindari format string yang tidak akan dicatat
+    if last_known_timestamp_obj:
         current_app.logger.info(
             f"Package {package_id}, Device {device_id}: Last known timestamp is {last_known_timestamp_obj.strftime(DATETIME_FORMAT)}"
         )
@@ -56,112 +186,728 @@ def process_log_upload(package_id, device_id, client_log_file):
             f"Package {package_id}, Device {device_id}: No previous log metadata or no timestamp. Processing all entries."
         )
 
+def _append_new_entries(package_id, device_id, client_log_file, server_filepath, last_known_timestamp_obj,
+                        dedup_state=None, rollups=None, search_documents=None):
+    """Menambahkan entri yang belum pernah diterima ke file log server.
+
+    Duplikat dikenali dari hash isi entri (DedupWindow dari dedup_state), sehingga entri berbeda
+    dengan milidetik yang sama atau entri terlambat karena jam perangkat mundur tetap diterima.
+    Entri yang lebih baru dari last_known_timestamp_obj selalu baru; entri di bawah floor jendela
+    selalu duplikat. Dengan LOG_COLLAPSE_REPEATS, entri berulang dalam unggahan ini disimpan sekali
+    (lihat entry_collapse). Indeks sidecar (.idx) ikut diperbarui. Jika rollups/search_documents diberikan,
+    hitungan rollup dan dokumen indeks pencarian entri baru ditambahkan ke sana setelah append
+    berhasil. Mengembalikan (jumlah entri baru, timestamp terbesar, list (path, ukuran awal) untuk
+    rollback jika commit DB gagal, state dedup baru atau None jika tidak berubah). Jika terjadi error
+    di tengah jalan, file log dan indeks dikembalikan ke ukuran semula.
+    """
     new_entries_appended_count = 0
+    parsed_count = 0
+    duplicate_count = 0
+    skipped_bytes = 0
+    parse_seconds = 0.0
     current_max_timestamp_in_upload = last_known_timestamp_obj # Inisialisasi dengan timestamp terakhir yang diketahui
+    # Objek jendela baru setiap unggahan: state di cache tidak ikut berubah jika unggahan gagal
+    dedup_window = load_dedup_window(dedup_state, last_known_timestamp_obj)
+    floor_timestamp_str = dedup_window.floor_timestamp_str
+    max_timestamp_str = truncate_timestamp_for_compare(last_known_timestamp_obj)
+    logger = current_app.logger
 
+    write_session = None
+    log_append = None
+    index_appender = None
+    rollback_points = []
+    upload_rollups = RollupAccumulator() if rollups is not None else None
+    upload_documents = SearchIndexBatch() if search_documents is not None else None
+    entry_collapser = None
+    if current_app.config.get('LOG_COLLAPSE_REPEATS'):
+        entry_collapser = EntryCollapser(
+            current_app.config.get('LOG_COLLAPSE_MAX_OPEN_RUNS', 32), current_app.config.get('LOG_COLLAPSE_WINDOW_SECONDS', 300)
+        )
     try:
-        client_log_content = client_log_file.read().decode('utf-8')
-        entries_to_append_str = []
-        
-        for match in LOG_ENTRY_REGEX.finditer(client_log_content):
-            timestamp_str = match.group(1)
-            full_entry_text = match.group(0) 
-            entry_timestamp_obj = parse_timestamp_from_log_entry_str(timestamp_str)
-
-            if not entry_timestamp_obj:
-                current_app.logger.warning(
-                    f"Could not parse timestamp: {timestamp_str} for package {package_id}, device {device_id}. Skipping entry."
+        upload_stream = getattr(client_log_file, 'stream', client_log_file)
+        has_new_entries = True
+        started = time.perf_counter()
+        if floor_timestamp_str is not None and _is_seekable(upload_stream):
+            # Klien mengirim ulang seluruh log lokalnya; lompati bagian di bawah floor yang sudah pasti duplikat
+            upload_start = upload_stream.tell()
+            skip_offset = find_first_newer_entry_offset(upload_stream, floor_timestamp_str)
+            has_new_entries = skip_offset is not None
+            if has_new_entries:
+                skipped_bytes = skip_offset - upload_start
+            else:
+                skipped_bytes = upload_stream.seek(0, os.SEEK_END) - upload_start
+            upload_stream.seek(skip_offset if has_new_entries else upload_start)
+            if has_new_entries and skip_offset > upload_start and logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"Package {package_id}, Device {device_id}: skipped {skip_offset - upload_start} bytes of already processed entries."
                 )
-                continue
+        parse_seconds = time.perf_counter() - started
 
-            if last_known_timestamp_obj is None or entry_timestamp_obj > last_known_timestamp_obj:
-                entries_to_append_str.append(full_entry_text + "\n") 
+        # Entri dibaca dan ditulis secara bertahap, sehingga memori per unggahan tetap kecil.
+        # Waktu di dalam parser (baca chunk + regex) dihitung terpisah dari waktu menulis file.
+        entries = iter_log_entries(upload_stream) if has_new_entries else iter(())
+        while True:
+            parse_started = time.perf_counter()
+            match = next(entries, None)
+            parse_seconds += time.perf_counter() - parse_started
+            if match is None:
+                # Akhir unggahan: run yang masih ditahan collapser ikut ditulis
+                entries_to_write = entry_collapser.drain() if entry_collapser is not None else ()
+            else:
+                parsed_count += 1
+                timestamp_str = match.group(1)
+                if floor_timestamp_str is not None and timestamp_str <= floor_timestamp_str:
+                    duplicate_count += 1
+                    continue # Di bawah floor: pasti duplikat, cukup bandingkan string tanpa hash maupun strptime
+                entry_text = match.group(0)
+                entry_hash = DedupWindow.hash_entry(entry_text)
+                if max_timestamp_str is not None and timestamp_str <= max_timestamp_str and dedup_window.contains(entry_hash):
+                    duplicate_count += 1
+                    continue # Tidak lebih baru dari entri terakhir dan isinya sudah pernah diterima
+
+                entry_timestamp_obj = parse_timestamp_from_log_entry_str(timestamp_str)
+
+                if not entry_timestamp_obj:
+                    logger.warning(
+                        f"Could not parse timestamp: {timestamp_str} for package {package_id}, device {device_id}. Skipping entry."
+                    )
+                    continue
+
+                # Rollup dan cursor dihitung per kemunculan, meskipun entri berulang disimpan sekali
+                if upload_rollups is not None:
+                    upload_rollups.add_entry(package_id, entry_timestamp_obj, entry_text)
                 new_entries_appended_count += 1
                 if current_max_timestamp_in_upload is None or entry_timestamp_obj > current_max_timestamp_in_upload:
                     current_max_timestamp_in_upload = entry_timestamp_obj
-        
-        if entries_to_append_str:
-            with open(server_filepath, 'a', encoding='utf-8') as f_server:
-                for entry_text in entries_to_append_str:
-                    f_server.write(entry_text)
-            current_app.logger.info(
-                f"{new_entries_appended_count} new log entries appended for package {package_id}, device {device_id} to {server_filepath}"
-            )
-        else:
-            current_app.logger.info(f"No new log entries to append for package {package_id}, device {device_id}.")
+                if max_timestamp_str is None or timestamp_str > max_timestamp_str:
+                    max_timestamp_str = timestamp_str
+                dedup_window.add(entry_hash, max_timestamp_str)
+                if entry_collapser is not None:
+                    entries_to_write = entry_collapser.add(entry_text, timestamp_str, entry_timestamp_obj)
+                else:
+                    entries_to_write = ((entry_text, entry_timestamp_obj),)
 
-        # Update atau buat metadata di DB
-        if device_log_metadata is None:
-            device_log_metadata = DeviceLogFile(
-                package_id=package_id,
-                device_id=device_id,
-                server_filename=server_filename_base, # Simpan hanya nama file, bukan path lengkap
-                last_processed_entry_timestamp=current_max_timestamp_in_upload
-            )
-            db.session.add(device_log_metadata)
+            for stored_text, stored_timestamp_obj in entries_to_write:
+                if log_append is None:
+                    # Mode segmented: segmen aktif yang penuh/dari hari sebelumnya ditutup dulu
+                    maybe_roll_active_segment(server_filepath)
+                    logical_base_offset = sealed_length(load_segments(server_filepath))
+                    # Handle dari pool log_writer; entri unggahan ini dikumpulkan lalu ditulis dengan writev
+                    write_session = log_writer.session()
+                    log_append = write_session.open_append(server_filepath)
+                    rollback_points.append((server_filepath, log_append.start_size))
+                    index_appender = LogIndexAppender(server_filepath, logical_base_offset + log_append.start_size)
+                    rollback_points.append((index_appender.index_filepath, index_appender.start_size))
+                entry_offset = logical_base_offset + log_append.tell()
+                index_appender.add(stored_timestamp_obj, entry_offset)
+                log_append.write((stored_text + "\n").encode('utf-8'))
+                if upload_documents is not None:
+                    upload_documents.add_entry(package_id, device_id, stored_timestamp_obj, entry_offset, stored_text)
+            if match is None:
+                break
+
+        if write_session is not None:
+            index_appender.flush(write_session)
+            write_session.commit() # Sisa buffer ditulis, lalu fsync sesuai LOG_FSYNC_POLICY
+            write_session = None
+            invalidate_view_cache(server_filepath)
+        append_seconds = time.perf_counter() - started - parse_seconds
+        if logger.isEnabledFor(logging.INFO):
+            if log_append is not None:
+                logger.info(
+                    f"{new_entries_appended_count} new log entries appended for package {package_id}, device {device_id} to {server_filepath}"
+                )
+            else:
+                logger.info(f"No new log entries to append for package {package_id}, device {device_id}.")
+    except Exception:
+        if write_session is not None:
+            write_session.abort()
+        # Batalkan entri yang sudah terlanjur ditulis agar tidak terduplikasi saat klien mengulang
+        _rollback_appended_entries(rollback_points)
+        raise
+
+    metrics.ENTRIES_PARSED.inc(parsed_count)
+    metrics.ENTRIES_APPENDED.inc(new_entries_appended_count)
+    metrics.ENTRIES_SKIPPED_DUPLICATE.inc(duplicate_count)
+    if entry_collapser is not None:
+        metrics.ENTRIES_COLLAPSED.inc(entry_collapser.collapsed_count)
+    metrics.BYTES_SKIPPED_AHEAD.inc(skipped_bytes)
+    metrics.UPLOAD_PARSE_SECONDS.observe(parse_seconds)
+    metrics.UPLOAD_APPEND_SECONDS.observe(append_seconds)
+    if upload_rollups is not None:
+        rollups.merge(upload_rollups)
+    if upload_documents is not None:
+        search_documents.merge(upload_documents)
+    new_dedup_state = dedup_window.to_state() if new_entries_appended_count else None
+    return new_entries_appended_count, current_max_timestamp_in_upload, rollback_points, new_dedup_state
+
+def _rollback_appended_entries(appended_files):
+    """Memotong file log (dan indeksnya) kembali ke ukuran sebelum unggahan yang gagal."""
+    for server_filepath, start_offset in reversed(appended_files):
+        try:
+            os.truncate(server_filepath, start_offset)
+        except OSError as e:
+            current_app.logger.error(f"Could not roll back appended entries in {server_filepath}: {e}", exc_info=True)
+
+def _apply_upload_metadata(metadata_exists, package_id, device_id, server_filename_base,
+                           last_known_timestamp_obj, current_max_timestamp_in_upload):
+    """Membuat atau memperbarui metadata DeviceLogFile di session (tanpa commit)."""
+    device_log_metadata = DeviceLogFile.query.filter_by(package_id=package_id, device_id=device_id).first() if metadata_exists else None
+    if device_log_metadata is None:
+        device_log_metadata = DeviceLogFile(
+            package_id=package_id,
+            device_id=device_id,
+            server_filename=server_filename_base, # Simpan hanya nama file, bukan path lengkap
+            last_processed_entry_timestamp=current_max_timestamp_in_upload
+        )
+        db.session.add(device_log_metadata)
+    elif current_max_timestamp_in_upload and \
+         (last_known_timestamp_obj is None or current_max_timestamp_in_upload > last_known_timestamp_obj):
+        device_log_metadata.last_processed_entry_timestamp = current_max_timestamp_in_upload
+        device_log_metadata.updated_at = datetime.datetime.utcnow() # Update manual jika tidak otomatis
+    return device_log_metadata
+
+def _dialect_insert():
+    """Mengembalikan fungsi insert yang mendukung ON CONFLICT untuk dialect DB aktif, atau None."""
+    dialect_name = db.session.get_bind().dialect.name
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+def _save_upload_metadata(metadata_changes):
+    """Menyimpan metadata hasil unggahan ke session (tanpa commit).
+
+    metadata_changes adalah dict (package_id, device_id) -> (apakah metadata sudah ada, server_filename,
+    timestamp terakhir sebelum unggahan, timestamp terbesar setelah unggahan, state dedup, apakah state
+    dedup berubah). Di PostgreSQL dan SQLite semua baris ditulis dengan satu INSERT ... ON CONFLICT DO
+    UPDATE; timestamp hanya maju, tidak pernah mundur, meskipun ada penulis lain. Dialect lain memakai
+    jalur ORM biasa.
+    """
+    for (package_id, device_id), (metadata_exists, _, last_known_timestamp_obj, current_max_timestamp_in_upload, _, _) in (
+        metadata_changes.items() if current_app.logger.isEnabledFor(logging.INFO) else ()
+    ):
+        if not metadata_exists:
             current_app.logger.info(f"Created new metadata entry for package {package_id}, device {device_id}.")
         elif current_max_timestamp_in_upload and \
              (last_known_timestamp_obj is None or current_max_timestamp_in_upload > last_known_timestamp_obj):
-            device_log_metadata.last_processed_entry_timestamp = current_max_timestamp_in_upload
-            device_log_metadata.updated_at = datetime.datetime.utcnow() # Update manual jika tidak otomatis
             current_app.logger.info(
                 f"Updated last_processed_entry_timestamp for package {package_id}, device {device_id} to "
                 f"{current_max_timestamp_in_upload.strftime(DATETIME_FORMAT)}."
             )
-        
-        db.session.commit()
 
-        return {
-            "message": f"Log processed. {new_entries_appended_count} new entries appended.",
+    insert = _dialect_insert()
+    if insert is None:
+        for (package_id, device_id), change in metadata_changes.items():
+            _apply_upload_metadata(change[0], package_id, device_id, *change[1:4])
+        _save_dedup_states(metadata_changes, insert)
+        return
+
+    now = datetime.datetime.utcnow()
+    stmt = insert(DeviceLogFile).values([
+        {
             "package_id": package_id,
             "device_id": device_id,
-            "server_filename_stored": server_filename_base,
-            "last_processed_timestamp_on_server": current_max_timestamp_in_upload.strftime(DATETIME_FORMAT) if current_max_timestamp_in_upload else (last_known_timestamp_obj.strftime(DATETIME_FORMAT) if last_known_timestamp_obj else None)
-        }, 200
+            "server_filename": server_filename_base,
+            "last_processed_entry_timestamp": current_max_timestamp_in_upload,
+            "created_at": now,
+            "updated_at": now
+        }
+        for (package_id, device_id), (_, server_filename_base, _, current_max_timestamp_in_upload, _, _) in metadata_changes.items()
+    ])
+    table = DeviceLogFile.__table__
+    timestamp_advanced = and_(
+        stmt.excluded.last_processed_entry_timestamp.isnot(None),
+        or_(
+            table.c.last_processed_entry_timestamp.is_(None),
+            stmt.excluded.last_processed_entry_timestamp > table.c.last_processed_entry_timestamp
+        )
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.package_id, table.c.device_id],
+        set_={
+            "last_processed_entry_timestamp": case(
+                (timestamp_advanced, stmt.excluded.last_processed_entry_timestamp),
+                else_=table.c.last_processed_entry_timestamp
+            ),
+            "updated_at": case((timestamp_advanced, now), else_=table.c.updated_at)
+        }
+    )
+    db.session.execute(stmt)
+    _save_dedup_states(metadata_changes, insert)
+
+def _save_dedup_states(metadata_changes, insert):
+    """Menyimpan state jendela dedup yang berubah ke session (tanpa commit), satu transaksi dengan metadata."""
+    changed_states = {device_key: change[4] for device_key, change in metadata_changes.items() if change[5]}
+    if not changed_states:
+        return
+    now = datetime.datetime.utcnow()
+    if insert is None:
+        for (package_id, device_id), dedup_state in changed_states.items():
+            db.session.merge(DeviceDedupState(package_id=package_id, device_id=device_id, state=dedup_state, updated_at=now))
+        return
+    stmt = insert(DeviceDedupState).values([
+        {"package_id": package_id, "device_id": device_id, "state": dedup_state, "updated_at": now}
+        for (package_id, device_id), dedup_state in changed_states.items()
+    ])
+    table = DeviceDedupState.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.package_id, table.c.device_id],
+        set_={"state": stmt.excluded.state, "updated_at": now}
+    )
+    db.session.execute(stmt)
+
+def _current_log_version(server_filepath):
+    try:
+        return tuple(get_log_version(server_filepath))
+    except FileNotFoundError:
+        return None
+
+def _load_device_cursors(server_filepath_by_key):
+    """Cursor dedup untuk setiap (package_id, device_id): dari cache jika masih valid, sisanya dengan
+    satu SELECT kolom (termasuk state jendela dedup). Harus dipanggil saat memegang lock perangkat."""
+    cursors = {}
+    missing_keys = []
+    for device_key, server_filepath in server_filepath_by_key.items():
+        cursor = cursor_cache.get(device_key, _current_log_version(server_filepath))
+        if cursor is None:
+            missing_keys.append(device_key)
+        else:
+            cursors[device_key] = cursor
+    if missing_keys:
+        rows = db.session.execute(
+            select(
+                DeviceLogFile.package_id, DeviceLogFile.device_id,
+                DeviceLogFile.last_processed_entry_timestamp, DeviceLogFile.server_filename, DeviceDedupState.state
+            ).outerjoin(DeviceDedupState, and_(
+                DeviceDedupState.package_id == DeviceLogFile.package_id, DeviceDedupState.device_id == DeviceLogFile.device_id
+            )).where(tuple_(DeviceLogFile.package_id, DeviceLogFile.device_id).in_(missing_keys))
+        ).all()
+        for row in rows:
+            cursors[(row.package_id, row.device_id)] = DeviceCursor(
+                True, row.last_processed_entry_timestamp, row.server_filename, row.state
+            )
+        for device_key in missing_keys:
+            cursors.setdefault(device_key, DeviceCursor(False, None, None))
+    return cursors
+
+def _remember_device_cursors(metadata_changes, server_filepath_by_key):
+    """Write-through setelah commit: cursor baru disimpan ke cache bersama versi file log saat ini."""
+    for device_key, (_, server_filename_base, _, current_max_timestamp_in_upload, dedup_state, _) in metadata_changes.items():
+        cursor_cache.put(
+            device_key,
+            DeviceCursor(True, current_max_timestamp_in_upload, server_filename_base, dedup_state),
+            _current_log_version(server_filepath_by_key[device_key])
+        )
+
+def _build_upload_response(package_id, device_id, server_filename_base, new_entries_appended_count,
+                           last_known_timestamp_obj, current_max_timestamp_in_upload):
+    return {
+        "message": f"Log processed. {new_entries_appended_count} new entries appended.",
+        "package_id": package_id,
+        "device_id": device_id,
+        "server_filename_stored": server_filename_base,
+        "last_processed_timestamp_on_server": current_max_timestamp_in_upload.strftime(DATETIME_FORMAT) if current_max_timestamp_in_upload else (last_known_timestamp_obj.strftime(DATETIME_FORMAT) if last_known_timestamp_obj else None)
+    }
+
+def process_log_upload(package_id, device_id, client_log_file):
+    """Memproses unggahan file log dari klien."""
+    validation_error = _validate_upload_request(package_id, device_id, client_log_file)
+    if validation_error:
+        return validation_error
+
+    # Struktur folder: uploads/<package_id>/<xx>/<yy>/<device_id>.log (lihat device_log_path)
+    # Nama file di server hanya berdasarkan device_id karena sudah di dalam folder package_id
+    server_filename_base = secure_filename(device_id) + ".log"
+    server_filepath = device_log_path(package_id, server_filename_base)
+
+    try:
+        _ensure_device_log_folder(server_filepath)
+    except OSError as e:
+        current_app.logger.error(f"Could not create directory for package {package_id}: {e}", exc_info=True)
+        return {"error": f"Server error: Could not create storage directory for package."}, 500
+
+    try:
+        # Baca cursor, append, dan commit dalam satu lock agar unggahan paralel tidak saling tumpang tindih
+        with device_file_locks([server_filepath]):
+            response = _process_locked_log_upload(
+                package_id, device_id, client_log_file, server_filepath, server_filename_base
+            )
+    except Exception as e:
+        current_app.logger.error(f"Error processing log for package {package_id}, device {device_id}: {e}", exc_info=True)
+        return {"error": f"Could not process log file: {str(e)}"}, 500
+    # Follower live tail dibangunkan setelah lock dilepas, karena follower membaca di bawah lock yang sama
+    log_tail_hub.notify(server_filepath)
+    return response
+
+def _process_locked_log_upload(package_id, device_id, client_log_file, server_filepath, server_filename_base):
+    device_key = (package_id, device_id)
+    adopt_legacy_log(server_filepath) # File dari layout datar lama dipindah sebelum ditulis
+    device_cursor = _load_device_cursors({device_key: server_filepath})[device_key]
+    last_known_timestamp_obj = device_cursor.last_processed_entry_timestamp
+    _log_last_known_timestamp(package_id, device_id, last_known_timestamp_obj)
+
+    appended_files = []
+    rollups = RollupAccumulator() if current_app.config.get('ERROR_ROLLUPS_ENABLED', True) else None
+    search_documents = SearchIndexBatch() if search_enabled() else None
+    try:
+        new_entries_appended_count, current_max_timestamp_in_upload, rollback_points, new_dedup_state = _append_new_entries(
+            package_id, device_id, client_log_file, server_filepath, last_known_timestamp_obj, device_cursor.dedup_state,
+            rollups, search_documents
+        )
+        appended_files.extend(rollback_points)
+
+        # Update atau buat metadata di DB
+        metadata_changes = {
+            device_key: (
+                device_cursor.exists, server_filename_base, last_known_timestamp_obj, current_max_timestamp_in_upload,
+                new_dedup_state or device_cursor.dedup_state, new_dedup_state is not None
+            )
+        }
+        commit_started = time.perf_counter()
+        _save_upload_metadata(metadata_changes)
+        if rollups is not None:
+            rollups.flush() # Rollup ikut transaksi yang sama dengan metadata
+        if search_documents is not None:
+            search_documents.flush()
+        db.session.commit()
+        metrics.DB_COMMIT_SECONDS.observe(time.perf_counter() - commit_started)
+        _remember_device_cursors(metadata_changes, {device_key: server_filepath})
+
+        return _build_upload_response(
+            package_id, device_id, server_filename_base, new_entries_appended_count,
+            last_known_timestamp_obj, current_max_timestamp_in_upload
+        ), 200
 
     except Exception as e:
         db.session.rollback()
+        _rollback_appended_entries(appended_files)
+        cursor_cache.invalidate(device_key)
         current_app.logger.error(f"Error processing log for package {package_id}, device {device_id}: {e}", exc_info=True)
         return {"error": f"Could not process log file: {str(e)}"}, 500
 
+def queue_log_upload(package_id, device_id, client_log_file):
+    """Menyimpan unggahan ke spool ingest asinkron dan langsung mengembalikan job id (202)."""
+    validation_error = _validate_upload_request(package_id, device_id, client_log_file)
+    if validation_error:
+        return validation_error
+
+    from .ingest_queue import ingest_queue
+    try:
+        job = ingest_queue.submit_upload(package_id, device_id, client_log_file)
+    except Exception as e:
+        current_app.logger.error(f"Could not spool log upload for package {package_id}, device {device_id}: {e}", exc_info=True)
+        return {"error": f"Could not queue log file: {str(e)}"}, 500
+
+    if current_app.logger.isEnabledFor(logging.INFO):
+        current_app.logger.info(f"Queued log upload job {job['job_id']} for package {package_id}, device {device_id}.")
+    return {
+        "message": "Log accepted for processing.",
+        "job_id": job['job_id'],
+        "package_id": package_id,
+        "device_id": device_id,
+        "status": "queued"
+    }, 202
+
+def get_ingest_job_status(job_id):
+    """Mengambil status job ingest asinkron."""
+    if not current_app.config.get('INGEST_ASYNC_MODE'):
+        return {"error": "Asynchronous ingestion is not enabled"}, 404
+    from .ingest_queue import ingest_queue
+    job_status = ingest_queue.get_job_status(job_id)
+    if job_status is None:
+        return {"error": f"Job not found: {job_id}"}, 404
+    return job_status, 200
+
+def process_batch_log_upload(upload_items):
+    """Memproses unggahan log banyak perangkat dalam satu request dengan satu transaksi DB.
+
+    upload_items adalah list tuple (package_id, device_id, client_log_file). Metadata semua perangkat
+    diambil dengan satu query dan disimpan dengan satu commit; hasil dikembalikan per perangkat.
+    """
+    if not upload_items:
+        return {"error": "No log files in the batch request"}, 400
+    max_devices = current_app.config.get('BATCH_UPLOAD_MAX_DEVICES', 500)
+    if len(upload_items) > max_devices:
+        return {"error": f"Too many devices in one batch (max {max_devices})"}, 400
+
+    results = [None] * len(upload_items)
+    valid_indexes = []
+    for index, (package_id, device_id, client_log_file) in enumerate(upload_items):
+        validation_error = _validate_upload_request(package_id, device_id, client_log_file)
+        if validation_error:
+            error_body, status_code = validation_error
+            results[index] = {**error_body, "package_id": package_id, "device_id": device_id, "status_code": status_code}
+        else:
+            valid_indexes.append(index)
+
+    server_filepaths = {}
+    for index in list(valid_indexes):
+        package_id, device_id, _ = upload_items[index]
+        try:
+            server_filepaths[index] = device_log_path(package_id, secure_filename(device_id) + ".log")
+            _ensure_device_log_folder(server_filepaths[index])
+        except OSError as e:
+            current_app.logger.error(f"Could not create directory for package {package_id}: {e}", exc_info=True)
+            results[index] = {
+                "error": "Server error: Could not create storage directory for package.",
+                "package_id": package_id, "device_id": device_id, "status_code": 500
+            }
+            valid_indexes.remove(index)
+
+    try:
+        with device_file_locks(server_filepaths.values()):
+            _process_locked_batch_upload(upload_items, valid_indexes, server_filepaths, results)
+    except Exception as e:
+        current_app.logger.error(f"Error processing batch log upload: {e}", exc_info=True)
+        for index in valid_indexes:
+            if results[index] is None or results[index]["status_code"] == 200:
+                package_id, device_id, _ = upload_items[index]
+                results[index] = {
+                    "error": f"Could not process log file: {str(e)}",
+                    "package_id": package_id, "device_id": device_id, "status_code": 500
+                }
+    for server_filepath in server_filepaths.values():
+        log_tail_hub.notify(server_filepath)
+
+    succeeded_count = sum(1 for result in results if result["status_code"] == 200)
+    if succeeded_count == len(results):
+        status_code = 200
+    elif succeeded_count:
+        status_code = 207 # Sebagian perangkat gagal, lihat status_code per hasil
+    else:
+        status_code = 500 if any(result["status_code"] >= 500 for result in results) else 400
+    return {
+        "message": f"Batch processed. {succeeded_count} of {len(results)} device logs succeeded.",
+        "results": results
+    }, status_code
+
+
+def _process_locked_batch_upload(upload_items, valid_indexes, server_filepaths, results):
+    # Cursor dari cache, sisanya dengan satu SELECT untuk seluruh perangkat di batch
+    server_filepath_by_key = {(upload_items[i][0], upload_items[i][1]): server_filepaths[i] for i in valid_indexes}
+    for server_filepath in server_filepath_by_key.values():
+        adopt_legacy_log(server_filepath)
+    device_cursors = _load_device_cursors(server_filepath_by_key)
+    # Perangkat yang sama bisa muncul lebih dari sekali; unggahan berikutnya memakai cursor terbaru
+    cursor_by_key = {key: cursor.last_processed_entry_timestamp for key, cursor in device_cursors.items()}
+    dedup_state_by_key = {key: cursor.dedup_state for key, cursor in device_cursors.items()}
+
+    metadata_changes = {}
+    appended_files = []
+    rollups = RollupAccumulator() if current_app.config.get('ERROR_ROLLUPS_ENABLED', True) else None
+    search_documents = SearchIndexBatch() if search_enabled() else None
+    for index in valid_indexes:
+        package_id, device_id, client_log_file = upload_items[index]
+        device_key = (package_id, device_id)
+        last_known_timestamp_obj = cursor_by_key[device_key]
+        _log_last_known_timestamp(package_id, device_id, last_known_timestamp_obj)
+        server_filename_base = os.path.basename(server_filepaths[index])
+
+        try:
+            new_entries_appended_count, current_max_timestamp_in_upload, rollback_points, new_dedup_state = _append_new_entries(
+                package_id, device_id, client_log_file, server_filepaths[index], last_known_timestamp_obj,
+                dedup_state_by_key[device_key], rollups, search_documents
+            )
+        except Exception as e:
+            current_app.logger.error(f"Error processing log for package {package_id}, device {device_id}: {e}", exc_info=True)
+            results[index] = {
+                "error": f"Could not process log file: {str(e)}",
+                "package_id": package_id, "device_id": device_id, "status_code": 500
+            }
+            continue
+
+        appended_files.extend(rollback_points)
+        cursor_by_key[device_key] = current_max_timestamp_in_upload
+        if new_dedup_state is not None:
+            dedup_state_by_key[device_key] = new_dedup_state
+        original_change = metadata_changes.get(device_key)
+        metadata_changes[device_key] = (
+            device_cursors[device_key].exists,
+            server_filename_base,
+            original_change[2] if original_change else last_known_timestamp_obj,
+            current_max_timestamp_in_upload,
+            dedup_state_by_key[device_key],
+            new_dedup_state is not None or bool(original_change and original_change[5])
+        )
+        results[index] = {
+            **_build_upload_response(
+                package_id, device_id, server_filename_base, new_entries_appended_count,
+                last_known_timestamp_obj, current_max_timestamp_in_upload
+            ),
+            "status_code": 200
+        }
+
+    try:
+        commit_started = time.perf_counter()
+        if metadata_changes:
+            _save_upload_metadata(metadata_changes)
+        if rollups is not None:
+            rollups.flush() # Satu upsert rollup untuk seluruh batch
+        if search_documents is not None:
+            search_documents.flush()
+        db.session.commit()
+        metrics.DB_COMMIT_SECONDS.observe(time.perf_counter() - commit_started)
+    except Exception:
+        db.session.rollback()
+        _rollback_appended_entries(appended_files)
+        for device_key in server_filepath_by_key:
+            cursor_cache.invalidate(device_key)
+        raise
+    _remember_device_cursors(metadata_changes, server_filepath_by_key)
+
+
+METADATA_COLUMNS = (
+    DeviceLogFile.id, DeviceLogFile.package_id, DeviceLogFile.device_id, DeviceLogFile.server_filename,
+    DeviceLogFile.last_processed_entry_timestamp, DeviceLogFile.created_at, DeviceLogFile.updated_at
+)
+
+def _metadata_row_to_dict(row):
+    return {
+        "package_id": row.package_id,
+        "device_id": row.device_id,
+        "server_filename": row.server_filename, # Ini hanya nama file, bukan path
+        "last_processed_entry_timestamp": row.last_processed_entry_timestamp.strftime(DATETIME_FORMAT) if row.last_processed_entry_timestamp else None,
+        "created_at": row.created_at.isoformat() + "Z" if row.created_at else None,
+        "updated_at": row.updated_at.isoformat() + "Z" if row.updated_at else None
+    }
+
+def _metadata_select(package_id=None, updated_since=None, after_id=None):
+    """Select kolom metadata (tanpa hidrasi objek ORM), terurut berdasarkan id untuk keyset pagination."""
+    stmt = select(*METADATA_COLUMNS).order_by(DeviceLogFile.id)
+    if package_id:
+        stmt = stmt.where(DeviceLogFile.package_id == package_id)
+    if updated_since is not None:
+        stmt = stmt.where(DeviceLogFile.updated_at >= updated_since)
+    if after_id is not None:
+        stmt = stmt.where(DeviceLogFile.id > after_id)
+    return stmt
+
+def _parse_metadata_filters(cursor=None, updated_since_str=None):
+    """Validasi cursor (id terakhir halaman sebelumnya) dan updated_since; ValueError jika tidak valid."""
+    after_id = None
+    if cursor:
+        if not cursor.isdigit():
+            raise ValueError(f"Invalid 'cursor': {cursor}")
+        after_id = int(cursor)
+    return after_id, _parse_time_bound(updated_since_str, 'updated_since')
+
+def get_logs_metadata_page(package_id=None, limit=None, cursor=None, updated_since_str=None):
+    """Satu halaman metadata log dengan keyset pagination pada id.
+
+    Mengembalikan {"items": [...], "next_cursor": ...}; next_cursor None berarti halaman terakhir.
+    """
+    try:
+        after_id, updated_since = _parse_metadata_filters(cursor, updated_since_str)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    page_limit = current_app.config.get('METADATA_PAGE_DEFAULT_LIMIT', 100)
+    max_limit = current_app.config.get('METADATA_PAGE_MAX_LIMIT', 1000)
+    if limit:
+        page_limit = int(limit) if limit.isdigit() else 0
+    if page_limit < 1 or page_limit > max_limit:
+        return {"error": f"'limit' must be between 1 and {max_limit}"}, 400
+
+    # Ambil satu baris lebih untuk mengetahui apakah masih ada halaman berikutnya
+    rows = db.session.execute(
+        _metadata_select(package_id, updated_since, after_id).limit(page_limit + 1)
+    ).all()
+    has_more = len(rows) > page_limit
+    rows = rows[:page_limit]
+    return {
+        "items": [_metadata_row_to_dict(row) for row in rows],
+        "next_cursor": str(rows[-1].id) if has_more else None
+    }, 200
+
+def iter_logs_metadata_ndjson(package_id=None, cursor=None, updated_since_str=None):
+    """Validasi filter lalu kembalikan generator baris NDJSON dari server-side cursor.
+
+    Mengembalikan (generator, 200) atau (error_dict, status_code). Memori tetap konstan karena
+    baris diambil per batch (yield_per) dan langsung di-serialisasi.
+    """
+    try:
+        after_id, updated_since = _parse_metadata_filters(cursor, updated_since_str)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    stmt = _metadata_select(package_id, updated_since, after_id).execution_options(
+        yield_per=current_app.config.get('METADATA_STREAM_BATCH_SIZE', 1000)
+    )
+
+    def generate():
+        result = db.session.execute(stmt)
+        try:
+            for row in result:
+                yield json.dumps(_metadata_row_to_dict(row)) + "\n"
+        finally:
+            result.close()
+    return generate(), 200
 
 def get_logs_metadata_for_package(package_id):
     """Mengambil metadata log untuk package_id tertentu."""
     if not package_id:
         return {"error": "Package ID is required"}, 400
     
-    entries = DeviceLogFile.query.filter_by(package_id=package_id).all()
-    if not entries:
+    rows = db.session.execute(_metadata_select(package_id=package_id)).all()
+    if not rows:
          return {"message": f"No log metadata found for package ID: {package_id}"}, 404
-    
-    results = [
-        {
-            "package_id": entry.package_id,
-            "device_id": entry.device_id,
-            "server_filename": entry.server_filename, # Ini hanya nama file, bukan path
-            "last_processed_entry_timestamp": entry.last_processed_entry_timestamp.strftime(DATETIME_FORMAT) if entry.last_processed_entry_timestamp else None,
-            "created_at": entry.created_at.isoformat() + "Z",
-            "updated_at": entry.updated_at.isoformat() + "Z"
-        } for entry in entries
-    ]
-    return results, 200
+    return [_metadata_row_to_dict(row) for row in rows], 200
 
 def get_all_logs_metadata():
     """Mengambil semua metadata log."""
-    entries = DeviceLogFile.query.all()
-    if not entries:
+    rows = db.session.execute(_metadata_select()).all()
+    if not rows:
          return {"message": "No log metadata found."}, 404
-    results = [
-        {
-            "package_id": entry.package_id,
-            "device_id": entry.device_id,
-            "server_filename": entry.server_filename,
-            "last_processed_entry_timestamp": entry.last_processed_entry_timestamp.strftime(DATETIME_FORMAT) if entry.last_processed_entry_timestamp else None,
-            "created_at": entry.created_at.isoformat() + "Z",
-            "updated_at": entry.updated_at.isoformat() + "Z"
-        } for entry in entries
-    ]
-    return results, 200
+    return [_metadata_row_to_dict(row) for row in rows], 200
+
+def get_cursor_cache_stats():
+    return cursor_cache.stats()
+
+def _device_cursor_response(package_id, device_id, device_cursor):
+    last_processed_timestamp_obj = device_cursor.last_processed_entry_timestamp
+    return {
+        "package_id": package_id,
+        "device_id": device_id,
+        "last_processed_timestamp_on_server": last_processed_timestamp_obj.strftime(DATETIME_FORMAT) if last_processed_timestamp_obj else None,
+        # Entri dengan timestamp <= nilai ini selalu dibuang sebagai duplikat; di atasnya dedup memakai hash isi entri
+        "dedup_floor_timestamp": load_dedup_window(device_cursor.dedup_state, last_processed_timestamp_obj).floor_timestamp_str
+    }
+
+def get_device_cursors(device_keys):
+    """Timestamp entri terakhir yang sudah diproses server untuk setiap (package_id, device_id).
+
+    Klien cukup mengunggah entri yang lebih baru dari timestamp ini; entri terlambat (jam perangkat
+    mundur, milidetik yang sama) masih diterima selama lebih baru dari dedup_floor_timestamp. Dibaca
+    tanpa lock perangkat (cache dulu, sisanya satu SELECT); nilainya hanya petunjuk, karena dedup saat
+    unggahan tetap memakai cursor yang dibaca di dalam lock.
+    """
+    if not device_keys:
+        return {"error": "At least one device is required"}, 400
+    max_devices = current_app.config.get('BATCH_UPLOAD_MAX_DEVICES', 500)
+    if len(device_keys) > max_devices:
+        return {"error": f"Too many devices in one request (max {max_devices})"}, 400
+    if not all(package_id and device_id for package_id, device_id in device_keys):
+        return {"error": "Package ID and Device ID are required for every device"}, 400
+
+    server_filepath_by_key = {
+        (package_id, device_id): locate_device_log(device_log_path(package_id, secure_filename(device_id) + ".log"))
+        for package_id, device_id in device_keys
+    }
+    device_cursors = _load_device_cursors(server_filepath_by_key)
+    return {
+        "cursors": [
+            _device_cursor_response(package_id, device_id, device_cursors[(package_id, device_id)])
+            for package_id, device_id in server_filepath_by_key
+        ]
+    }, 200
+
+def get_device_cursor(package_id, device_id):
+    response_data, status_code = get_device_cursors([(package_id, device_id)])
+    if status_code != 200:
+        return response_data, status_code
+    return response_data["cursors"][0], 200
 
 def get_log_file_content(package_id, device_id):
     """Mengambil konten file log tertentu."""
@@ -177,20 +923,100 @@ def get_log_file_content(package_id, device_id):
         return {"error": "Log file metadata not found for this package and device ID"}, 404
 
     server_filename_base = log_meta.server_filename # Ini adalah device_id.log
-    package_upload_folder_name = secure_filename(package_id) # Nama folder package
-    
-    # Path ke file log di server
-    # filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], package_upload_folder_name, server_filename_base)
-    # current_app.logger.info(f"Attempting to view log file for package {package_id}, device {device_id} at path: {filepath}")
 
-    # send_from_directory memerlukan path relatif dari UPLOAD_FOLDER jika UPLOAD_FOLDER adalah root
-    # Atau, kita bisa berikan path absolut ke direktori package.
-    # Mari gunakan path absolut ke direktori package untuk send_from_directory
+    # Path ke file log di server (layout fan-out, atau layout datar lama jika belum dipindah).
+    # send_from_directory memerlukan direktori dan nama file secara terpisah.
+    filepath = locate_device_log(device_log_path(package_id, server_filename_base))
 
-    package_specific_upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], package_upload_folder_name)
-
-    if os.path.exists(os.path.join(package_specific_upload_dir, server_filename_base)):
-        return package_specific_upload_dir, server_filename_base # Kembalikan dir dan nama file untuk send_from_directory
+    if os.path.exists(filepath):
+        return os.path.dirname(filepath), server_filename_base # Kembalikan dir dan nama file untuk send_from_directory
     else:
-        current_app.logger.warning(f"Log file not found on disk: {os.path.join(package_specific_upload_dir, server_filename_base)}")
-        return {"error": "Log file not found on disk for this package and device ID"}, 404
\ No newline at end of file
+        current_app.logger.warning(f"Log file not found on disk: {filepath}")
+        return {"error": "Log file not found on disk for this package and device ID"}, 404
+
+def _parse_time_bound(value, param_name):
+    """Parse parameter from/to: format log (YYYY-MM-DD HH:MM:SS.mmm) atau ISO 8601 (dianggap UTC)."""
+    if not value:
+        return None
+    timestamp_obj = parse_timestamp_from_log_entry_str(value)
+    if timestamp_obj:
+        return timestamp_obj
+    try:
+        timestamp_obj = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid '{param_name}' timestamp: {value}")
+    if timestamp_obj.tzinfo is not None:
+        timestamp_obj = timestamp_obj.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp_obj
+
+def get_log_file_range(package_id, device_id, from_str=None, to_str=None):
+    """Mencari rentang byte file log untuk entri dengan timestamp di antara from dan to (inklusif).
+
+    Mengembalikan (filepath, start_offset, end_offset) jika sukses, atau (error_dict, status_code).
+    """
+    try:
+        from_timestamp = _parse_time_bound(from_str, 'from')
+        to_timestamp = _parse_time_bound(to_str, 'to')
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    result = get_log_file_content(package_id, device_id)
+    if isinstance(result[0], dict):
+        return result
+    directory, filename = result
+    filepath = os.path.join(directory, filename)
+    try:
+        start_offset, end_offset = find_byte_range(
+            filepath, from_timestamp, to_timestamp, lock_filepath=device_log_path(package_id, filename)
+        )
+    except OSError as e:
+        current_app.logger.error(f"Could not read log index for {filepath}: {e}", exc_info=True)
+        return {"error": "Could not read log index"}, 500
+    return filepath, start_offset, end_offset
+
+def build_log_etag(log_version, *extra_parts):
+    """ETag berbasis ukuran logis dan mtime log; berubah setiap kali log di-append."""
+    return "-".join(str(part) for part in (log_version.size, log_version.mtime_ns) + extra_parts)
+
+def _gzip_view_cache_path(filepath):
+    return filepath + ".gz"
+
+def invalidate_view_cache(filepath):
+    """Menghapus salinan gzip untuk view setelah file log berubah."""
+    try:
+        os.remove(_gzip_view_cache_path(filepath))
+    except FileNotFoundError:
+        pass
+
+def get_gzip_view_copy(filepath, log_version):
+    """Mengembalikan path salinan gzip log sesuai log_version, membuatnya jika belum ada.
+
+    mtime salinan disamakan dengan mtime log saat dikompresi, sehingga salinan yang sudah
+    usang (log di-append setelahnya) tidak pernah dianggap valid.
+    """
+    gzip_path = _gzip_view_cache_path(filepath)
+    try:
+        if os.stat(gzip_path).st_mtime_ns == log_version.mtime_ns:
+            return gzip_path
+    except FileNotFoundError:
+        pass
+
+    tmp_path = f"{gzip_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    compress_level = current_app.config.get('LOG_VIEW_GZIP_LEVEL', 6)
+    try:
+        with open_log_reader(filepath) as source, gzip.open(tmp_path, 'wb', compresslevel=compress_level) as target:
+            # Hanya sampai ukuran pada log_version, agar isi cocok dengan ETag yang dikirim
+            remaining = log_version.size
+            while remaining > 0:
+                chunk = source.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                target.write(chunk)
+                remaining -= len(chunk)
+        os.utime(tmp_path, ns=(log_version.mtime_ns, log_version.mtime_ns))
+        os.replace(tmp_path, gzip_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return gzip_path
\ No newline at end of file
@@ -0,0 +1,409 @@
+import io
+import os
+import gzip
+import json
+import zlib
+import datetime
+from collections import namedtuple
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+# Mode penyimpanan 'segmented':
+#   <device_id>.log                   -> segmen aktif (teks biasa, tempat append)
+#   <device_id>.log.<seq:08d>.gz      -> segmen tertutup, dikompresi gzip
+#   <device_id>.segments              -> manifest JSON daftar segmen tertutup beserta offset logisnya
+# Isi log secara logis adalah gabungan semua segmen tertutup (setelah dekompresi) lalu segmen aktif.
+# Offset di indeks sidecar (.idx) selalu memakai offset logis ini. Pembacaan selalu transparan:
+# file tanpa manifest dibaca sebagai satu file teks biasa, apa pun mode yang sedang aktif.
+SEGMENT_MANIFEST_SUFFIX = '.segments'
+LogVersion = namedtuple('LogVersion', ['size', 'mtime_ns'])
+# Layout direktori (LOG_STORAGE_FANOUT_LEVELS): file perangkat disebar ke subdirektori dari crc32 nama
+# file, misalnya uploads/<package_id>/3f/a2/<device_id>.log untuk 2 tingkat. 0 = layout datar lama
+# (uploads/<package_id>/<device_id>.log). File di layout datar tetap terbaca dan dipindahkan ke
+# lokasi baru saat perangkat berikutnya ditulis (atau dengan perintah CLI migrate-log-layout).
+MAX_FANOUT_LEVELS = 4
+
+
+def _fanout_levels():
+    return min(current_app.config.get('LOG_STORAGE_FANOUT_LEVELS', 2), MAX_FANOUT_LEVELS)
+
+def fanout_log_path(package_folder, server_filename):
+    """Path file log perangkat di dalam folder package sesuai layout aktif."""
+    digest = f"{zlib.crc32(server_filename.encode('utf-8')):08x}"
+    return os.path.join(
+        package_folder, *(digest[2 * level:2 * level + 2] for level in range(_fanout_levels())), server_filename
+    )
+
+def device_log_path(package_id, server_filename):
+    """Path kanonik file log perangkat; satu-satunya tempat lokasi file log ditentukan."""
+    return fanout_log_path(os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(package_id)), server_filename)
+
+def legacy_log_path(log_filepath):
+    """Lokasi file log yang sama di layout datar lama (langsung di folder package)."""
+    package_folder = os.path.dirname(log_filepath)
+    for _ in range(_fanout_levels()):
+        package_folder = os.path.dirname(package_folder)
+    return os.path.join(package_folder, os.path.basename(log_filepath))
+
+def locate_device_log(log_filepath, legacy_filepath=None):
+    """Path yang benar-benar dipakai untuk membaca log: path kanonik, atau path lama jika belum dipindah.
+
+    Untuk pembaca tanpa lock. Path kanonik dicek lagi di akhir agar pemindahan yang terjadi di
+    antara dua pengecekan tidak membuat file dianggap tidak ada.
+    """
+    if os.path.exists(log_filepath):
+        return log_filepath
+    legacy_filepath = legacy_filepath or legacy_log_path(log_filepath)
+    if legacy_filepath != log_filepath and os.path.exists(legacy_filepath):
+        return legacy_filepath
+    return log_filepath
+
+def adopt_legacy_log(log_filepath):
+    """Memindahkan log perangkat dari layout datar lama ke path kanonik; harus memegang lock perangkat.
+
+    Segmen, manifest, dan indeks dipindah lebih dulu, file log terakhir, dengan hard link lalu
+    hapus nama lama, sehingga pembaca selalu menemukan kumpulan file yang lengkap di salah satu
+    lokasi. Mengembalikan True jika ada file yang dipindah.
+    """
+    from .log_index import index_path_for
+    from .log_writer import log_writer
+
+    legacy_filepath = legacy_log_path(log_filepath)
+    if legacy_filepath == log_filepath or not os.path.exists(legacy_filepath):
+        return False
+    if os.path.exists(log_filepath) and not os.path.samefile(log_filepath, legacy_filepath):
+        current_app.logger.warning(f"Both {legacy_filepath} and {log_filepath} exist; leaving the legacy log in place.")
+        return False
+
+    os.makedirs(os.path.dirname(log_filepath), exist_ok=True)
+    legacy_folder, target_folder = os.path.dirname(legacy_filepath), os.path.dirname(log_filepath)
+    file_names = [segment['file'] for segment in load_segments(legacy_filepath)]
+    file_names += [os.path.basename(manifest_path_for(legacy_filepath)), os.path.basename(index_path_for(legacy_filepath))]
+    file_names.append(os.path.basename(legacy_filepath))
+    moved_paths = []
+    for file_name in file_names:
+        source_path, target_path = os.path.join(legacy_folder, file_name), os.path.join(target_folder, file_name)
+        if not os.path.exists(source_path):
+            continue
+        try:
+            os.link(source_path, target_path + '.tmp')
+        except OSError: # Filesystem tanpa hard link: rename biasa
+            os.replace(source_path, target_path)
+            continue
+        os.replace(target_path + '.tmp', target_path)
+        moved_paths.append(source_path)
+    log_writer.discard(legacy_filepath, index_path_for(legacy_filepath))
+    for source_path in moved_paths + [legacy_filepath + '.gz', legacy_filepath + '.lock']:
+        try:
+            os.remove(source_path)
+        except FileNotFoundError:
+            pass
+    return True
+
+def iter_device_log_files(upload_folder, package_folder_name=None):
+    """Path kanonik setiap log perangkat di UPLOAD_FOLDER, baik yang sudah di layout baru maupun layout datar."""
+    with os.scandir(upload_folder) as package_entries:
+        for package_entry in package_entries:
+            if not package_entry.is_dir() or package_entry.name.startswith('.'):
+                continue
+            if package_folder_name and package_entry.name != package_folder_name:
+                continue
+            seen_names = set()
+            for folder, sub_folders, file_names in os.walk(package_entry.path):
+                sub_folders[:] = [name for name in sub_folders if not name.startswith('.')]
+                for file_name in file_names:
+                    if file_name.endswith('.log') and file_name not in seen_names:
+                        seen_names.add(file_name)
+                        yield fanout_log_path(package_entry.path, file_name)
+
+
+def manifest_path_for(log_filepath):
+    base, _ = os.path.splitext(log_filepath)
+    return base + SEGMENT_MANIFEST_SUFFIX
+
+def load_segments(log_filepath):
+    """Mengembalikan list segmen tertutup dari manifest, atau list kosong jika tidak ada."""
+    try:
+        with open(manifest_path_for(log_filepath), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def _write_manifest(log_filepath, segments):
+    manifest_path = manifest_path_for(log_filepath)
+    if not segments:
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        return
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(segments, f)
+    os.replace(tmp_path, manifest_path)
+
+def sealed_length(segments):
+    """Panjang logis semua segmen tertutup (= offset logis awal segmen aktif)."""
+    return segments[-1]['start'] + segments[-1]['length'] if segments else 0
+
+def segment_path(log_filepath, segment):
+    return os.path.join(os.path.dirname(log_filepath), segment['file'])
+
+def _active_size(log_filepath):
+    try:
+        return os.path.getsize(log_filepath)
+    except FileNotFoundError:
+        return 0
+
+def logical_size(log_filepath, segments=None):
+    """Ukuran logis log (segmen tertutup + segmen aktif)."""
+    if segments is None:
+        segments = load_segments(log_filepath)
+    return sealed_length(segments) + _active_size(log_filepath)
+
+def get_log_version(log_filepath):
+    """Ukuran logis dan mtime segmen aktif; keduanya berubah setiap kali log di-append atau di-roll."""
+    active_stat = os.stat(log_filepath)
+    return LogVersion(sealed_length(load_segments(log_filepath)) + active_stat.st_size, active_stat.st_mtime_ns)
+
+def has_sealed_segments(log_filepath):
+    return os.path.exists(manifest_path_for(log_filepath))
+
+
+class LogicalLogStream(io.RawIOBase):
+    """Stream baca-saja atas isi logis log, mulai dari start_offset sampai end_offset (eksklusif).
+
+    Segmen yang seluruhnya berada sebelum start_offset dilewati tanpa didekompresi.
+    """
+
+    def __init__(self, log_filepath, start_offset=0, end_offset=None):
+        super().__init__()
+        segments = load_segments(log_filepath)
+        self._parts = [
+            (segment_path(log_filepath, segment), segment['start'], segment['length'], True)
+            for segment in segments
+        ]
+        self._parts.append((log_filepath, sealed_length(segments), None, False))
+        self._part_index = 0
+        self._position = start_offset
+        self._end_offset = end_offset
+        self._file = None
+
+    def readable(self):
+        return True
+
+    def _open_current_part(self):
+        while self._part_index < len(self._parts):
+            path, start, length, compressed = self._parts[self._part_index]
+            if length is not None and self._position >= start + length:
+                self._part_index += 1
+                continue
+            try:
+                part_file = gzip.open(path, 'rb') if compressed else open(path, 'rb')
+            except FileNotFoundError:
+                if compressed:
+                    raise
+                return None # Segmen aktif belum ada = kosong
+            if self._position > start:
+                part_file.seek(self._position - start)
+            return part_file
+        return None
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)
+        while True:
+            limit = len(view)
+            if self._end_offset is not None:
+                limit = min(limit, self._end_offset - self._position)
+            if limit <= 0:
+                return 0
+            if self._file is None:
+                self._file = self._open_current_part()
+                if self._file is None:
+                    return 0
+            _, start, length, _ = self._parts[self._part_index]
+            if length is not None:
+                limit = min(limit, start + length - self._position)
+            read_count = self._file.readinto(view[:limit])
+            if read_count:
+                self._position += read_count
+                return read_count
+            self._file.close()
+            self._file = None
+            if length is None:
+                return 0 # Akhir segmen aktif = akhir log
+            self._part_index += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+
+def open_log_reader(log_filepath, start_offset=0, end_offset=None):
+    """Membuka isi logis log sebagai file biner ter-buffer (mendukung read, readline, iterasi baris)."""
+    if end_offset is None and not has_sealed_segments(log_filepath):
+        log_file = open(log_filepath, 'rb')
+        log_file.seek(start_offset)
+        return log_file
+    return io.BufferedReader(LogicalLogStream(log_filepath, start_offset, end_offset), buffer_size=64 * 1024)
+
+def iter_log_bytes(log_filepath, start_offset, end_offset, chunk_size=64 * 1024):
+    """Generator yang membaca isi logis log dari start_offset sampai end_offset secara bertahap."""
+    with open_log_reader(log_filepath, start_offset) as reader:
+        remaining = end_offset - start_offset
+        while remaining > 0:
+            chunk = reader.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def seal_active_segment(log_filepath, compress_level=6):
+    """Mengompresi segmen aktif menjadi segmen tertutup baru lalu mengosongkan segmen aktif.
+
+    Harus dipanggil saat memegang lock perangkat. Mengembalikan True jika ada segmen yang ditutup.
+    """
+    active_size = _active_size(log_filepath)
+    if active_size == 0:
+        return False
+    segments = load_segments(log_filepath)
+    sequence = max(segment['seq'] for segment in segments) + 1 if segments else 1
+    segment_name = f"{os.path.basename(log_filepath)}.{sequence:08d}.gz"
+    target_path = os.path.join(os.path.dirname(log_filepath), segment_name)
+    tmp_path = target_path + '.tmp'
+
+    with open(log_filepath, 'rb') as source, gzip.open(tmp_path, 'wb', compresslevel=compress_level) as target:
+        remaining = active_size
+        while remaining > 0:
+            chunk = source.read(min(1024 * 1024, remaining))
+            if not chunk:
+                break
+            target.write(chunk)
+            remaining -= len(chunk)
+    os.replace(tmp_path, target_path)
+
+    segments.append({
+        "seq": sequence,
+        "file": segment_name,
+        "start": sealed_length(segments),
+        "length": active_size,
+        "sealed_at": datetime.datetime.utcnow().isoformat() + "Z"
+    })
+    _write_manifest(log_filepath, segments)
+    # Dikosongkan (bukan dihapus) agar file aktif tetap ada dan mtime-nya menandai perubahan
+    os.truncate(log_filepath, 0)
+    return True
+
+def maybe_roll_active_segment(log_filepath):
+    """Menutup segmen aktif jika mode 'segmented' aktif dan segmen sudah terlalu besar atau dari hari sebelumnya."""
+    if current_app.config.get('LOG_STORAGE_MODE') != 'segmented':
+        return False
+    try:
+        active_stat = os.stat(log_filepath)
+    except FileNotFoundError:
+        return False
+    if active_stat.st_size == 0:
+        return False
+
+    roll_by_size = active_stat.st_size >= current_app.config.get('LOG_SEGMENT_MAX_BYTES', 8 * 1024 * 1024)
+    roll_by_day = current_app.config.get('LOG_SEGMENT_ROLL_DAILY', True) and \
+        datetime.datetime.utcfromtimestamp(active_stat.st_mtime).date() < datetime.datetime.utcnow().date()
+    if not (roll_by_size or roll_by_day):
+        return False
+    sealed = seal_active_segment(log_filepath, current_app.config.get('LOG_SEGMENT_COMPRESS_LEVEL', 6))
+    if sealed:
+        current_app.logger.info(f"Sealed active log segment {log_filepath} ({active_stat.st_size} bytes).")
+    return sealed
+
+def _physical_size(log_filepath, segments):
+    total = _active_size(log_filepath)
+    for segment in segments:
+        try:
+            total += os.path.getsize(segment_path(log_filepath, segment))
+        except FileNotFoundError:
+            continue
+    return total
+
+def _copy_stream_to_file(source, target_path, opener=open):
+    tmp_path = target_path + '.tmp'
+    try:
+        with opener(tmp_path, 'wb') as target:
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                target.write(chunk)
+        os.replace(tmp_path, target_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def trim_log_prefix(log_filepath, trim_offset, compress_level=6):
+    """Membuang trim_offset byte logis pertama dari log perangkat; mengembalikan byte disk yang dibebaskan.
+
+    Harus dipanggil saat memegang lock perangkat. File yang berubah ditulis ulang lewat file
+    sementara lalu os.replace, sehingga pembaca tidak pernah melihat file setengah jadi. Pada mode
+    segmented, segmen yang seluruhnya lebih tua dihapus tanpa didekompresi dan hanya segmen yang
+    memuat titik potong yang ditulis ulang.
+    """
+    if trim_offset <= 0:
+        return 0
+    segments = load_segments(log_filepath)
+    size_before = _physical_size(log_filepath, segments)
+    active_start = sealed_length(segments)
+
+    if trim_offset >= active_start:
+        with open(log_filepath, 'rb') as source:
+            source.seek(trim_offset - active_start)
+            _copy_stream_to_file(source, log_filepath)
+        kept_segments = []
+    else:
+        kept_segments = []
+        next_sequence = max(segment['seq'] for segment in segments) + 1
+        for segment in segments:
+            segment_end = segment['start'] + segment['length']
+            if segment_end <= trim_offset:
+                continue
+            if segment['start'] < trim_offset:
+                # Segmen yang memuat titik potong ditulis ulang dengan nama baru
+                new_name = f"{os.path.basename(log_filepath)}.{next_sequence:08d}.gz"
+                with gzip.open(segment_path(log_filepath, segment), 'rb') as source:
+                    source.seek(trim_offset - segment['start'])
+                    _copy_stream_to_file(
+                        source, os.path.join(os.path.dirname(log_filepath), new_name),
+                        opener=lambda path, mode: gzip.open(path, mode, compresslevel=compress_level)
+                    )
+                segment = {**segment, "seq": next_sequence, "file": new_name, "length": segment_end - trim_offset}
+            kept_segments.append(segment)
+        running_start = 0
+        for segment in kept_segments:
+            segment['start'] = running_start
+            running_start += segment['length']
+
+    # Manifest baru ditulis dulu, baru segmen lama yang tidak dipakai lagi dihapus
+    _write_manifest(log_filepath, kept_segments)
+    kept_files = {segment['file'] for segment in kept_segments}
+    for segment in segments:
+        if segment['file'] not in kept_files:
+            try:
+                os.remove(segment_path(log_filepath, segment))
+            except FileNotFoundError:
+                pass
+    return size_before - _physical_size(log_filepath, kept_segments)
+
+def delete_device_log(log_filepath):
+    """Menghapus log perangkat beserta segmen, manifest, indeks, dan cache view-nya."""
+    from .log_index import index_path_for
+
+    removed_bytes = 0
+    paths = [segment_path(log_filepath, segment) for segment in load_segments(log_filepath)]
+    paths += [log_filepath, manifest_path_for(log_filepath), index_path_for(log_filepath), log_filepath + ".gz"]
+    for path in paths:
+        try:
+            removed_bytes += os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+    return removed_bytes
@@ -0,0 +1,379 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from flask import current_app
+from ..models import db, DeviceLogFile
+from .log_index import index_path_for, read_first_timestamp_ms, ENTRY_START_LINE
+from .log_storage import open_log_reader, get_log_version, device_log_path, legacy_log_path, locate_device_log
+from .search_index import ENTRY_TIMESTAMP_REGEX
+from ..utils.device_locks import device_file_locks
+
+# Live tail log perangkat sebagai server-sent events. Semua follower satu perangkat di proses ini
+# berbagi satu _DeviceTail: hanya satu follower yang membaca byte baru dari file, lalu semua
+# follower mengambil entri dari buffer bersama. Unggahan di proses yang sama membangunkan follower
+# lewat notify(); unggahan di worker lain terdeteksi dengan pengecekan ukuran logis setiap
+# LOG_TAIL_POLL_SECONDS (satu stat per perangkat, bukan per follower).
+#
+# ID event adalah offset byte logis tepat setelah entri, sehingga klien bisa melanjutkan dengan
+# Last-Event-ID (atau ?offset=). Jika file dipotong retensi atau dihapus, offset lama tidak
+# berlaku lagi: follower menerima event 'reset' dan melanjutkan dari akhir file saat itu.
+ENTRY_END_LINE = b"--- End Log Entry ---"
+TAIL_FORMATS = ('text', 'json')
+SSE_RETRY_MS = 3000 # Jeda sebelum EventSource menyambung ulang setelah stream ditutup
+
+
+def iter_complete_entries(log_filepath, start_offset, end_offset, max_entry_size):
+    """(offset awal, offset akhir, bytes) setiap entri lengkap di [start, end); entri yang belum selesai diabaikan."""
+    offset = start_offset
+    entry_start = None
+    entry_lines = []
+    with open_log_reader(log_filepath, start_offset, end_offset) as log_file:
+        for line in log_file:
+            line_start = offset
+            offset += len(line)
+            if line.startswith(ENTRY_START_LINE):
+                entry_start, entry_lines = line_start, [line]
+                continue
+            if entry_start is None:
+                continue
+            entry_lines.append(line)
+            if line.startswith(ENTRY_END_LINE):
+                yield entry_start, offset, b"".join(entry_lines)
+                entry_start = None
+            elif offset - entry_start > max_entry_size:
+                entry_start = None
+
+
+class _DeviceTail:
+    """Pembaca bersama satu file log perangkat beserta buffer entri terbaru."""
+
+    def __init__(self, log_filepath, legacy_filepath):
+        self.log_filepath = log_filepath
+        self.legacy_filepath = legacy_filepath
+        self.condition = threading.Condition()
+        self.followers = 0
+        self.entries = deque() # (offset awal, offset akhir, bytes)
+        self.buffered_bytes = 0
+        self.end_offset = None # Offset setelah entri lengkap terakhir yang sudah dibaca
+        self.first_timestamp_ms = None
+        self.seen_size = None # Ukuran logis file saat pembacaan terakhir di bawah lock
+        self.generation = 0 # Naik setiap kali file dipotong/dihapus dan offset lama tidak berlaku
+        self.changed = True
+        self.checked_at = 0.0
+        self.refreshing = False
+
+    def refresh(self, poll_seconds, buffer_bytes, max_entry_size):
+        """Membaca entri baru jika ada notifikasi atau interval poll sudah lewat; dipanggil tanpa memegang condition.
+
+        Hanya satu follower yang membaca pada satu waktu. Setiap poll hanya mengecek ukuran logis dan
+        timestamp entri pertama tanpa lock (murah, juga untuk unggahan di worker lain); lock perangkat
+        baru diambil jika salah satunya berubah. Isi dibaca di bawah lock agar konsisten dengan writer
+        (tidak di tengah append, seal segmen, atau trim retensi), tetapi di luar condition: unggahan
+        atau trim yang lama hanya menunda pembaca ini, bukan follower lain atau notify() dari thread unggahan.
+        """
+        with self.condition:
+            now = time.monotonic()
+            if self.refreshing or (self.end_offset is not None and not self.changed and now - self.checked_at < poll_seconds):
+                return
+            self.refreshing = True
+            self.changed = False
+            self.checked_at = now
+        update = None
+        try:
+            if self.end_offset is None or self._file_changed():
+                os.makedirs(os.path.dirname(self.log_filepath), exist_ok=True)
+                with device_file_locks([self.log_filepath]):
+                    update = self._read_new_entries(buffer_bytes, max_entry_size)
+        finally:
+            with self.condition:
+                self.refreshing = False
+                if update is not None:
+                    self._apply_update(update, buffer_bytes)
+                self.condition.notify_all()
+
+    def _file_state(self):
+        """(ukuran logis, timestamp entri pertama dari indeks) file log saat ini."""
+        filepath = locate_device_log(self.log_filepath, self.legacy_filepath)
+        try:
+            size = get_log_version(filepath).size
+        except FileNotFoundError:
+            return filepath, 0, None
+        # Entri pertama berubah = awal file dipotong (offset bergeser), meskipun ukurannya bertambah
+        return filepath, size, read_first_timestamp_ms(index_path_for(filepath)) if size else None
+
+    def _file_changed(self):
+        """Pengecekan tanpa lock: apakah ukuran atau entri pertama berbeda dari pembacaan terakhir."""
+        _, size, first_timestamp_ms = self._file_state()
+        if size != self.seen_size:
+            return True
+        return first_timestamp_ms is not None and self.first_timestamp_ms is not None and first_timestamp_ms != self.first_timestamp_ms
+
+    def _read_new_entries(self, buffer_bytes, max_entry_size):
+        """Membaca perubahan file sejak end_offset; harus memegang lock perangkat. Mengembalikan (reset, ukuran
+        file, offset akhir, timestamp pertama, entri baru, masih ada sisa). end_offset, seen_size, dan
+        first_timestamp_ms hanya diubah oleh pembaca yang aktif."""
+        filepath, size, first_timestamp_ms = self._file_state()
+        if self.end_offset is None:
+            return False, size, size, first_timestamp_ms, [], False
+        if size < self.end_offset or (
+            self.first_timestamp_ms is not None and first_timestamp_ms is not None and first_timestamp_ms != self.first_timestamp_ms
+        ):
+            return True, size, size, first_timestamp_ms, [], False
+
+        new_entries = []
+        end_offset = self.end_offset
+        has_more = False
+        read_bytes = 0
+        if size > end_offset:
+            try:
+                for entry in iter_complete_entries(filepath, end_offset, size, max_entry_size):
+                    new_entries.append(entry)
+                    end_offset = entry[1]
+                    read_bytes += len(entry[2])
+                    if read_bytes >= buffer_bytes:
+                        has_more = True # Sisanya dibaca pada putaran berikutnya
+                        break
+            except FileNotFoundError:
+                has_more = True
+        return False, size, end_offset, first_timestamp_ms if first_timestamp_ms is not None else self.first_timestamp_ms, new_entries, has_more
+
+    def _apply_update(self, update, buffer_bytes):
+        """Menerapkan hasil _read_new_entries ke buffer bersama; harus memegang condition."""
+        is_reset, self.seen_size, end_offset, first_timestamp_ms, new_entries, has_more = update
+        if is_reset:
+            self.entries.clear()
+            self.buffered_bytes = 0
+            self.generation += 1
+        self.end_offset, self.first_timestamp_ms = end_offset, first_timestamp_ms
+        for entry in new_entries:
+            self.entries.append(entry)
+            self.buffered_bytes += len(entry[2])
+        while len(self.entries) > 1 and self.buffered_bytes > buffer_bytes:
+            self.buffered_bytes -= len(self.entries.popleft()[2])
+        if has_more:
+            # Sisa entri dibaca di refresh berikutnya meskipun ukuran file tidak berubah lagi
+            self.changed = True
+            self.seen_size = None
+
+    def entries_after(self, offset):
+        """Entri di buffer mulai dari offset; None jika offset sudah keluar dari buffer (perlu baca file)."""
+        if offset >= self.end_offset:
+            return []
+        if not self.entries or offset < self.entries[0][0]:
+            return None
+        return [entry for entry in self.entries if entry[0] >= offset]
+
+    def read_range(self, offset, end_offset, first_timestamp_ms, max_bytes, max_entry_size):
+        """Membaca entri [offset, end_offset) dari file di bawah lock perangkat, paling banyak ~max_bytes.
+
+        Mengembalikan None jika file sudah dipotong atau diganti sejak end_offset/first_timestamp_ms
+        diamati (offset klien tidak lagi menunjuk ke entri yang sama).
+        """
+        os.makedirs(os.path.dirname(self.log_filepath), exist_ok=True)
+        entries = []
+        with device_file_locks([self.log_filepath]):
+            filepath, size, current_first_ms = self._file_state()
+            if size < end_offset or (
+                first_timestamp_ms is not None and current_first_ms is not None and current_first_ms != first_timestamp_ms
+            ):
+                return None
+            read_bytes = 0
+            for entry in iter_complete_entries(filepath, offset, end_offset, max_entry_size):
+                entries.append(entry)
+                read_bytes += len(entry[2])
+                if read_bytes >= max_bytes:
+                    break
+        return entries
+
+
+class LogTailHub:
+    """Registry _DeviceTail per file log di proses ini; follower dibatasi LOG_TAIL_MAX_FOLLOWERS.
+
+    Setiap follower memakai satu thread worker selama stream terbuka, jadi batasnya harus di bawah
+    jumlah thread per worker (GUNICORN_THREADS) agar unggahan tetap terlayani.
+    """
+
+    def __init__(self):
+        self.poll_seconds = 1.0
+        self.heartbeat_seconds = 15.0
+        self.max_seconds = 300.0
+        self.buffer_bytes = 1024 * 1024
+        self.max_followers = 2
+        self.max_entry_size = 1024 * 1024
+        self._tails = {}
+        self._follower_count = 0
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def init_app(self, app):
+        self.poll_seconds = app.config.get('LOG_TAIL_POLL_SECONDS', 1.0)
+        self.heartbeat_seconds = app.config.get('LOG_TAIL_HEARTBEAT_SECONDS', 15)
+        self.max_seconds = app.config.get('LOG_TAIL_MAX_SECONDS', 300)
+        self.buffer_bytes = app.config.get('LOG_TAIL_BUFFER_BYTES', 1024 * 1024)
+        self.max_followers = app.config.get('LOG_TAIL_MAX_FOLLOWERS', 2)
+        self.max_entry_size = app.config.get('UPLOAD_MAX_PENDING_ENTRY_SIZE', 1024 * 1024)
+
+    def _reset_after_fork(self):
+        self._tails = {}
+        self._follower_count = 0
+        self._lock = threading.Lock()
+
+    def notify(self, log_filepath):
+        """Dipanggil jalur unggahan setelah commit; murah jika tidak ada follower untuk file ini."""
+        tail = self._tails.get(log_filepath)
+        if tail is None:
+            return
+        with tail.condition:
+            tail.changed = True
+            tail.condition.notify_all()
+
+    def _attach(self, log_filepath, legacy_filepath):
+        with self._lock:
+            if self._follower_count >= self.max_followers:
+                return None
+            tail = self._tails.get(log_filepath)
+            if tail is None:
+                tail = self._tails[log_filepath] = _DeviceTail(log_filepath, legacy_filepath)
+            tail.followers += 1
+            self._follower_count += 1
+            return tail
+
+    def _detach(self, tail):
+        with self._lock:
+            tail.followers -= 1
+            self._follower_count -= 1
+            if tail.followers == 0 and self._tails.get(tail.log_filepath) is tail:
+                del self._tails[tail.log_filepath]
+
+    def follow(self, log_filepath, legacy_filepath, start_offset=None):
+        """Generator event ('entry', offset akhir, bytes), ('reset', offset, None), atau ('heartbeat', offset, None).
+
+        start_offset None berarti mulai dari akhir file (hanya entri baru). Berhenti setelah
+        LOG_TAIL_MAX_SECONDS; klien menyambung ulang dengan Last-Event-ID. Mengembalikan None
+        (bukan generator) jika batas follower tercapai.
+        """
+        if self._follower_count >= self.max_followers:
+            return None
+        return self._follow(log_filepath, legacy_filepath, start_offset)
+
+    def _follow(self, log_filepath, legacy_filepath, start_offset):
+        # Attach di dalam generator: generator yang ditutup sebelum dimulai tidak menjalankan finally
+        tail = self._attach(log_filepath, legacy_filepath)
+        if tail is None:
+            return
+        started = last_sent = time.monotonic()
+        try:
+            while True:
+                tail.refresh(self.poll_seconds, self.buffer_bytes, self.max_entry_size)
+                with tail.condition:
+                    if tail.end_offset is not None:
+                        generation, end_offset = tail.generation, tail.end_offset
+                        break
+                    tail.condition.wait(timeout=self.poll_seconds) # Pembacaan pertama sedang dilakukan follower lain
+            offset = end_offset if start_offset is None else start_offset
+            if offset > end_offset:
+                offset = end_offset
+                yield 'reset', offset, None # Offset dari klien tidak ada lagi di file ini
+            while time.monotonic() - started < self.max_seconds:
+                tail.refresh(self.poll_seconds, self.buffer_bytes, self.max_entry_size)
+                with tail.condition:
+                    if tail.generation == generation and tail.entries_after(offset) == []:
+                        remaining = self.max_seconds - (time.monotonic() - started)
+                        tail.condition.wait(timeout=max(0.0, min(self.poll_seconds, remaining)))
+                    is_reset = tail.generation != generation
+                    generation, end_offset, first_timestamp_ms = tail.generation, tail.end_offset, tail.first_timestamp_ms
+                    pending = None if is_reset else tail.entries_after(offset)
+                if is_reset:
+                    offset = end_offset
+                    yield 'reset', offset, None
+                    last_sent = time.monotonic()
+                    continue
+                if pending is None:
+                    # Tertinggal dari buffer bersama: kejar dari file per potongan di bawah lock perangkat,
+                    # lalu kirim di luar lock agar klien yang lambat tidak menahan writer
+                    try:
+                        chunk = tail.read_range(offset, end_offset, first_timestamp_ms, self.buffer_bytes, self.max_entry_size)
+                    except FileNotFoundError:
+                        chunk = None
+                    if chunk is None:
+                        # File dipotong/diganti: paksa refresh berikutnya membaca ulang dan mengirim reset
+                        with tail.condition:
+                            tail.changed = True
+                            tail.seen_size = None
+                        continue
+                    for _, entry_end, entry_bytes in chunk:
+                        yield 'entry', entry_end, entry_bytes
+                        offset = entry_end
+                    if not chunk:
+                        offset = end_offset
+                    last_sent = time.monotonic()
+                    continue
+                for _, entry_end, entry_bytes in pending:
+                    yield 'entry', entry_end, entry_bytes
+                    offset = entry_end
+                if pending:
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= self.heartbeat_seconds:
+                    yield 'heartbeat', offset, None
+                    last_sent = time.monotonic()
+        finally:
+            self._detach(tail)
+
+log_tail_hub = LogTailHub()
+
+
+def _format_sse(events, output_format):
+    """Mengubah event follow() menjadi teks server-sent events; id event = offset untuk melanjutkan."""
+    from .merge_service import parse_entry_fields
+
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    try:
+        for event_type, offset, entry_bytes in events:
+            if event_type == 'heartbeat':
+                yield ": keep-alive\n\n"
+                continue
+            if event_type == 'reset':
+                yield f"id: {offset}\nevent: reset\ndata: {json.dumps({'offset': offset})}\n\n"
+                continue
+            entry_text = entry_bytes.decode('utf-8', errors='replace').rstrip("\n")
+            if output_format == 'json':
+                timestamp_match = ENTRY_TIMESTAMP_REGEX.search(entry_text)
+                data_lines = [json.dumps({
+                    "offset": offset,
+                    "timestamp": timestamp_match.group(1) if timestamp_match else None,
+                    **parse_entry_fields(entry_text)
+                })]
+            else:
+                data_lines = entry_text.splitlines()
+            yield f"id: {offset}\nevent: entry\n" + "".join(f"data: {line}\n" for line in data_lines) + "\n"
+    finally:
+        events.close()
+
+def iter_device_tail_events(package_id, device_id, offset_str=None, last_event_id=None, output_format='text'):
+    """Validasi parameter lalu kembalikan (generator server-sent events, 200) atau (error_dict, status_code).
+
+    Posisi awal dari header Last-Event-ID (sambung ulang) atau ?offset=; tanpa keduanya hanya
+    entri yang ditambahkan setelah koneksi dibuka yang dikirim.
+    """
+    if not package_id or not device_id:
+        return {"error": "Package ID and Device ID are required"}, 400
+    if output_format not in TAIL_FORMATS:
+        return {"error": f"Invalid 'format': {output_format} (expected one of: {', '.join(TAIL_FORMATS)})"}, 400
+    resume_offset = last_event_id or offset_str
+    if resume_offset and not resume_offset.isdigit():
+        return {"error": f"Invalid {'Last-Event-ID' if last_event_id else 'offset'}: {resume_offset}"}, 400
+
+    log_meta = db.session.query(DeviceLogFile.server_filename).filter_by(package_id=package_id, device_id=device_id).first()
+    db.session.rollback() # Jangan tahan transaksi baca selama stream terbuka
+    if not log_meta:
+        return {"error": "Log file metadata not found for this package and device ID"}, 404
+
+    log_filepath = device_log_path(package_id, log_meta.server_filename)
+    events = log_tail_hub.follow(log_filepath, legacy_log_path(log_filepath), int(resume_offset) if resume_offset else None)
+    if events is None:
+        current_app.logger.warning(f"Live tail follower limit ({log_tail_hub.max_followers}) reached; rejecting {package_id}/{device_id}.")
+        return {"error": "Too many live tail followers on this server, try again later"}, 503
+    return _format_sse(events, output_format), 200
@@ -0,0 +1,283 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from ..utils import metrics
+
+# Kebijakan durability untuk data yang di-append ke file log perangkat (LOG_FSYNC_POLICY):
+#   none   -> tanpa fsync; data aman dari crash proses, tetapi tidak dari crash OS/listrik
+#   upload -> fsync file log dan indeks di setiap unggahan sebelum metadata di-commit
+#   group  -> group commit: unggahan menunggu satu fsync bersama yang dijalankan setiap
+#             LOG_FSYNC_GROUP_INTERVAL_MS untuk semua file yang ditulis sejak putaran sebelumnya
+FSYNC_POLICIES = ('none', 'upload', 'group')
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+_fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+
+class _PooledHandle:
+    """File descriptor O_APPEND beserta identitas inode saat dibuka."""
+
+    __slots__ = ('path', 'fd', 'file_id', 'last_used')
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        file_stat = os.fstat(self.fd)
+        self.file_id = (file_stat.st_dev, file_stat.st_ino)
+        self.last_used = time.monotonic()
+
+    def is_current(self):
+        """False jika path sudah dihapus atau diganti (os.replace oleh trim/rebuild) sejak dibuka."""
+        try:
+            file_stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (file_stat.st_dev, file_stat.st_ino) == self.file_id
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class LogAppend:
+    """Append ke satu file dalam satu sesi; write() hanya mengumpulkan byte, flush() menulis dengan writev."""
+
+    def __init__(self, handle, buffer_limit):
+        self.handle = handle
+        self.start_size = os.fstat(handle.fd).st_size # Akurat karena dipanggil di bawah lock perangkat
+        self._written_size = 0
+        self._chunks = []
+        self._buffered_size = 0
+        self._buffer_limit = buffer_limit
+
+    def tell(self):
+        return self.start_size + self._written_size + self._buffered_size
+
+    def write(self, data):
+        self._chunks.append(data)
+        self._buffered_size += len(data)
+        if self._buffered_size >= self._buffer_limit or len(self._chunks) >= IOV_MAX:
+            self.flush()
+
+    def flush(self):
+        if not self._chunks:
+            return
+        chunks, self._chunks = self._chunks, []
+        if hasattr(os, 'writev'):
+            written = os.writev(self.handle.fd, chunks)
+        else:
+            written = os.write(self.handle.fd, b"".join(chunks))
+        if written < self._buffered_size:
+            # Penulisan parsial (jarang untuk file biasa): tulis sisanya dengan loop biasa
+            remaining = memoryview(b"".join(chunks))[written:]
+            while remaining:
+                remaining = remaining[os.write(self.handle.fd, remaining):]
+        self._written_size += self._buffered_size
+        self._buffered_size = 0
+
+    def discard(self):
+        self._chunks = []
+        self._buffered_size = 0
+
+
+class WriteSession:
+    """Semua append satu unggahan (file log dan indeksnya); commit() menerapkan kebijakan fsync sekaligus."""
+
+    def __init__(self, writer):
+        self._writer = writer
+        self._appends = []
+
+    def open_append(self, path):
+        log_append = LogAppend(self._writer.acquire(path), self._writer.buffer_bytes)
+        self._appends.append(log_append)
+        return log_append
+
+    def commit(self):
+        """Menulis sisa buffer, menunggu fsync sesuai kebijakan, lalu mengembalikan handle ke pool.
+
+        OSError (misalnya disk penuh atau fsync gagal) diteruskan ke pemanggil; handle tetap dikembalikan.
+        """
+        try:
+            for log_append in self._appends:
+                log_append.flush()
+            self._writer.make_durable([log_append.handle for log_append in self._appends if log_append._written_size])
+        finally:
+            self._release()
+
+    def abort(self):
+        """Membuang buffer yang belum ditulis; byte yang sudah ditulis dipotong oleh pemanggil (rollback)."""
+        for log_append in self._appends:
+            log_append.discard()
+        self._release()
+
+    def _release(self):
+        appends, self._appends = self._appends, []
+        for log_append in appends:
+            self._writer.release(log_append.handle)
+
+
+class _SyncRequest:
+    __slots__ = ('handles', 'done', 'error')
+
+    def __init__(self, handles):
+        self.handles = handles
+        self.done = False
+        self.error = None
+
+
+class DeviceLogWriter:
+    """Pool LRU file descriptor append untuk file log perangkat dan indeksnya.
+
+    Handle dipinjam (acquire) di bawah lock perangkat dan dikeluarkan dari pool selama dipakai,
+    sehingga eviction tidak pernah menutup handle yang sedang menulis. Sebelum dipakai ulang,
+    inode handle dicocokkan dengan path; file yang sudah dihapus atau diganti oleh proses lain
+    (cleanup retensi) otomatis dibuka ulang. Pemotongan (rollback, seal segmen) aman karena
+    O_APPEND selalu menulis di akhir file. Pool dan thread group commit milik setiap proses;
+    setelah fork (worker gunicorn) proses anak mulai dengan pool kosong.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.max_open_files = 256
+        self.idle_seconds = 30.0
+        self.buffer_bytes = 256 * 1024
+        self.fsync_policy = 'none'
+        self.group_interval_seconds = 0.01
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+        self._sync_condition = threading.Condition()
+        self._pending_syncs = []
+        self._sync_thread = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LOG_WRITER_POOL_ENABLED', True)
+        self.max_open_files = app.config.get('LOG_WRITER_MAX_OPEN_FILES', 256)
+        self.idle_seconds = app.config.get('LOG_WRITER_IDLE_SECONDS', 30)
+        self.buffer_bytes = app.config.get('LOG_WRITER_BUFFER_BYTES', 256 * 1024)
+        self.group_interval_seconds = app.config.get('LOG_FSYNC_GROUP_INTERVAL_MS', 10) / 1000.0
+        self.fsync_policy = app.config.get('LOG_FSYNC_POLICY', 'none')
+        if self.fsync_policy not in FSYNC_POLICIES:
+            app.logger.warning(f"Unknown LOG_FSYNC_POLICY '{self.fsync_policy}'; using 'none'.")
+            self.fsync_policy = 'none'
+        self.close_all()
+
+    def session(self):
+        return WriteSession(self)
+
+    def _reset_after_fork(self):
+        # Di proses anak: lock bisa saja terkunci saat fork dan thread group commit tidak ikut
+        for handle in self._handles.values():
+            handle.close()
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+        self._sync_condition = threading.Condition()
+        self._pending_syncs = []
+        self._sync_thread = None
+
+    def acquire(self, path):
+        """Meminjam handle append untuk path; harus dipanggil saat memegang lock perangkat."""
+        with self._lock:
+            handle = self._handles.pop(path, None)
+        if handle is not None and not handle.is_current():
+            handle.close()
+            handle = None
+        return handle or _PooledHandle(path)
+
+    def release(self, handle):
+        handle.last_used = time.monotonic()
+        evicted = []
+        with self._lock:
+            if not self.enabled:
+                evicted.append(handle)
+            else:
+                previous = self._handles.pop(handle.path, None)
+                if previous is not None:
+                    evicted.append(previous)
+                self._handles[handle.path] = handle
+                idle_before = handle.last_used - self.idle_seconds
+                while self._handles:
+                    oldest = next(iter(self._handles.values()))
+                    if len(self._handles) <= self.max_open_files and oldest.last_used > idle_before:
+                        break
+                    evicted.append(self._handles.pop(oldest.path))
+        for evicted_handle in evicted:
+            evicted_handle.close()
+
+    def discard(self, *paths):
+        """Menutup handle di pool untuk path yang dihapus, agar ruang disk-nya segera dibebaskan."""
+        with self._lock:
+            handles = [self._handles.pop(path) for path in paths if path in self._handles]
+        for handle in handles:
+            handle.close()
+
+    def close_all(self):
+        with self._lock:
+            handles, self._handles = list(self._handles.values()), OrderedDict()
+        for handle in handles:
+            handle.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "open_files": len(self._handles),
+                "max_open_files": self.max_open_files,
+                "fsync_policy": self.fsync_policy
+            }
+
+    def make_durable(self, handles):
+        if not handles or self.fsync_policy == 'none':
+            return
+        started = time.perf_counter()
+        if self.fsync_policy == 'upload':
+            for handle in handles:
+                _fdatasync(handle.fd)
+        else:
+            self._wait_for_group_commit(handles)
+        metrics.LOG_FSYNC_WAIT_SECONDS.labels(self.fsync_policy).observe(time.perf_counter() - started)
+
+    def _wait_for_group_commit(self, handles):
+        request = _SyncRequest(handles)
+        with self._sync_condition:
+            if self._sync_thread is None:
+                self._sync_thread = threading.Thread(target=self._group_commit_loop, name="log-group-commit", daemon=True)
+                self._sync_thread.start()
+            self._pending_syncs.append(request)
+            self._sync_condition.notify_all()
+            while not request.done:
+                self._sync_condition.wait()
+        if request.error is not None:
+            raise request.error
+
+    def _group_commit_loop(self):
+        condition = self._sync_condition
+        while True:
+            with condition:
+                while not self._pending_syncs:
+                    condition.wait()
+            time.sleep(self.group_interval_seconds) # Kumpulkan unggahan lain yang selesai dalam interval ini
+            with condition:
+                requests, self._pending_syncs = self._pending_syncs, []
+            # Handle masih dipinjam oleh unggahan yang menunggu, jadi fd tidak mungkin ditutup di sini
+            errors = {}
+            for fd in {handle.fd for request in requests for handle in request.handles}:
+                try:
+                    _fdatasync(fd)
+                except OSError as e:
+                    errors[fd] = e
+            with condition:
+                for request in requests:
+                    request.error = next((errors[handle.fd] for handle in request.handles if handle.fd in errors), None)
+                    request.done = True
+                condition.notify_all()
+
+
+log_writer = DeviceLogWriter()
@@ -0,0 +1,171 @@
+import re
+import json
+import heapq
+import datetime
+from flask import current_app
+from sqlalchemy import select
+from ..models import db, DeviceLogFile
+from .log_index import find_byte_range, ENTRY_START_LINE, TIMESTAMP_LINE_REGEX
+from .log_storage import open_log_reader, device_log_path, locate_device_log
+
+# Stream gabungan entri log semua perangkat sebuah package, terurut berdasarkan timestamp.
+# Setiap perangkat dibaca oleh satu reader berurutan (rentang byte dari indeks sidecar), lalu
+# semua reader digabung dengan k-way heap merge (heapq.merge). Memori sebanding dengan jumlah
+# perangkat (satu entri terbuka + jendela reorder kecil per perangkat), bukan dengan volume data.
+MERGED_STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'text': 'text/plain',
+}
+ENTRY_END_LINE = b"--- End Log Entry ---"
+ENTRY_FIELD_REGEX = re.compile(
+    r"^\s*(Occurrences|Last Timestamp|Device Name|Device ID|Endpoint|Method|Status Code): ?(.*?)\s*$", re.MULTILINE
+)
+RESPONSE_BODY_REGEX = re.compile(r"^\s*Response Body: ?([\s\S]*?)\s*--- End Log Entry ---", re.MULTILINE)
+ENTRY_FIELD_NAMES = {
+    'Occurrences': 'occurrences',
+    'Last Timestamp': 'last_timestamp',
+    'Device Name': 'device_name',
+    'Device ID': 'client_device_id',
+    'Endpoint': 'endpoint',
+    'Method': 'method',
+    'Status Code': 'status_code',
+}
+
+
+def parse_entry_fields(entry_text):
+    """Field entri log (device_name, client_device_id, endpoint, method, status_code, response_body).
+
+    occurrences/last_timestamp berasal dari entri collapse (LOG_COLLAPSE_REPEATS); entri biasa = 1 kemunculan.
+    """
+    fields = dict.fromkeys(ENTRY_FIELD_NAMES.values())
+    for match in ENTRY_FIELD_REGEX.finditer(entry_text):
+        field_name = ENTRY_FIELD_NAMES[match.group(1)]
+        if fields[field_name] is None:
+            fields[field_name] = match.group(2)
+    for field_name in ('status_code', 'occurrences'):
+        if fields[field_name] is not None:
+            fields[field_name] = int(fields[field_name]) if fields[field_name].isdigit() else None
+    if fields['occurrences'] is None:
+        fields['occurrences'] = 1
+    body_match = RESPONSE_BODY_REGEX.search(entry_text)
+    fields['response_body'] = body_match.group(1) if body_match else None
+    return fields
+
+def _iter_raw_entries(log_file, max_entry_size):
+    """(timestamp_str, entry_bytes) untuk setiap entri lengkap di stream, sesuai urutan di file."""
+    lines = None
+    timestamp_str = None
+    entry_size = 0
+    for line in log_file:
+        if line.startswith(ENTRY_START_LINE):
+            lines, timestamp_str, entry_size = [line], None, len(line)
+            continue
+        if lines is None:
+            continue
+        lines.append(line)
+        entry_size += len(line)
+        if timestamp_str is None:
+            match = TIMESTAMP_LINE_REGEX.match(line)
+            if match:
+                timestamp_str = match.group(1).decode('ascii')
+        if line.startswith(ENTRY_END_LINE):
+            if timestamp_str is not None:
+                yield timestamp_str, b"".join(lines)
+            lines = None
+        elif entry_size > max_entry_size:
+            lines = None # Entri rusak tanpa penanda akhir; lewati sampai penanda awal berikutnya
+
+def _iter_device_entries(filepath, start_offset, end_offset, from_str, to_str, reorder_window, max_entry_size):
+    """Entri satu perangkat dalam [from, to], terurut timestamp.
+
+    Entri di file umumnya sudah berurutan; entri terlambat (timestamp lebih lama dari entri
+    sebelumnya) diurutkan ulang dalam jendela reorder_window entri. Entri yang terlambat lebih
+    jauh dari jendela itu tetap dikirim, pada posisi sedekat mungkin.
+    """
+    pending = []
+    sequence = 0
+    try:
+        with open_log_reader(filepath, start_offset, end_offset) as log_file:
+            for timestamp_str, entry_bytes in _iter_raw_entries(log_file, max_entry_size):
+                if (from_str and timestamp_str < from_str) or (to_str and timestamp_str > to_str):
+                    continue
+                heapq.heappush(pending, (timestamp_str, sequence, entry_bytes))
+                sequence += 1
+                if len(pending) > reorder_window:
+                    timestamp_str, _, entry_bytes = heapq.heappop(pending)
+                    yield timestamp_str, entry_bytes
+    except FileNotFoundError:
+        pass # File dihapus retensi di tengah jalan
+    while pending:
+        timestamp_str, _, entry_bytes = heapq.heappop(pending)
+        yield timestamp_str, entry_bytes
+
+def _tag_device(device_id, device_entries):
+    for timestamp_str, entry_bytes in device_entries:
+        yield timestamp_str, device_id, entry_bytes
+
+def _format_ndjson(merged_entries):
+    for timestamp_str, device_id, entry_bytes in merged_entries:
+        entry_text = entry_bytes.decode('utf-8', errors='replace')
+        yield json.dumps({"device_id": device_id, "timestamp": timestamp_str, **parse_entry_fields(entry_text)}) + "\n"
+
+def _format_text(merged_entries):
+    for _, device_id, entry_bytes in merged_entries:
+        yield f"# device: {device_id}\n".encode('utf-8') + entry_bytes
+
+def iter_package_merged_entries(package_id, device_ids=None, from_str=None, to_str=None, output_format='ndjson', limit=None):
+    """Validasi parameter lalu kembalikan (generator stream gabungan, 200) atau (error_dict, status_code).
+
+    device_ids membatasi perangkat yang digabung; limit membatasi jumlah entri yang dikirim.
+    """
+    from .log_service import _parse_time_bound, truncate_timestamp_for_compare
+
+    if not package_id:
+        return {"error": "Package ID is required"}, 400
+    if output_format not in MERGED_STREAM_FORMATS:
+        return {"error": f"Invalid 'format': {output_format} (expected one of: {', '.join(MERGED_STREAM_FORMATS)})"}, 400
+    try:
+        from_timestamp = _parse_time_bound(from_str, 'from')
+        to_timestamp = _parse_time_bound(to_str, 'to')
+        if limit and (not limit.isdigit() or int(limit) < 1):
+            raise ValueError(f"Invalid 'limit': {limit}")
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    query = select(DeviceLogFile.device_id, DeviceLogFile.server_filename).where(DeviceLogFile.package_id == package_id)
+    if device_ids:
+        query = query.where(DeviceLogFile.device_id.in_(device_ids))
+    rows = db.session.execute(query.order_by(DeviceLogFile.device_id)).all()
+    db.session.rollback() # Jangan tahan transaksi baca selama stream berjalan
+    if not rows:
+        return {"message": f"No log metadata found for package ID: {package_id}"}, 404
+    max_devices = current_app.config.get('MERGED_STREAM_MAX_DEVICES', 500)
+    if len(rows) > max_devices:
+        return {"error": f"Too many devices to merge ({len(rows)}, max {max_devices}); filter with 'device_id'"}, 400
+
+    # Entri selalu presisi milidetik: batas bawah dibulatkan ke atas, batas atas ke bawah
+    if from_timestamp is not None and from_timestamp.microsecond % 1000:
+        from_timestamp += datetime.timedelta(microseconds=1000 - from_timestamp.microsecond % 1000)
+    from_str = truncate_timestamp_for_compare(from_timestamp)
+    to_str = truncate_timestamp_for_compare(to_timestamp)
+    reorder_window = current_app.config.get('MERGED_STREAM_REORDER_ENTRIES', 64)
+    max_entry_size = current_app.config.get('UPLOAD_MAX_PENDING_ENTRY_SIZE', 1024 * 1024)
+    device_readers = []
+    for row in rows:
+        canonical_filepath = device_log_path(package_id, row.server_filename)
+        filepath = locate_device_log(canonical_filepath)
+        try:
+            start_offset, end_offset = find_byte_range(filepath, from_timestamp, to_timestamp, canonical_filepath)
+        except FileNotFoundError:
+            continue # Metadata tanpa file (misalnya sudah dihapus retensi)
+        if start_offset == end_offset:
+            continue
+        device_readers.append(_tag_device(row.device_id, _iter_device_entries(
+            filepath, start_offset, end_offset, from_str, to_str, reorder_window, max_entry_size
+        )))
+
+    # heapq.merge stabil: entri dengan timestamp sama diurutkan menurut device_id
+    merged_entries = heapq.merge(*device_readers, key=lambda item: item[0])
+    if limit:
+        merged_entries = (item for _, item in zip(range(int(limit)), merged_entries))
+    return (_format_ndjson(merged_entries) if output_format == 'ndjson' else _format_text(merged_entries)), 200
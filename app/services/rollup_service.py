@@ -0,0 +1,192 @@
+import re
+import datetime
+from collections import Counter
+from flask import current_app
+from sqlalchemy import select, func
+from ..models import db, ErrorRollup
+
+# Field entri log yang dihitung di rollup (lihat format entri di log_service)
+ENDPOINT_FIELD_REGEX = re.compile(r"^\s*Endpoint: (.*?)\s*$", re.MULTILINE)
+METHOD_FIELD_REGEX = re.compile(r"^\s*Method: (\S*)", re.MULTILINE)
+STATUS_CODE_FIELD_REGEX = re.compile(r"^\s*Status Code: (\d{1,3})\b", re.MULTILINE)
+# Segmen path numerik/UUID/hex panjang diganti ':id' agar kardinalitas endpoint tetap kecil
+ID_PATH_SEGMENT_REGEX = re.compile(r"(?<=/)(?:\d+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27}|[0-9a-fA-F]{16,})(?=/|$)")
+ENDPOINT_MAX_LENGTH = 300
+UPSERT_CHUNK_ROWS = 1000
+STATS_GROUP_COLUMNS = {
+    'endpoint': ErrorRollup.endpoint,
+    'method': ErrorRollup.method,
+    'status_code': ErrorRollup.status_code,
+}
+STATS_INTERVALS = {'hour': datetime.timedelta(hours=1), 'day': datetime.timedelta(days=1)}
+
+
+def normalize_endpoint(endpoint):
+    """Buang query string/host dan ganti segmen ID, misalnya https://x/api/users/42?a=1 -> /api/users/:id."""
+    endpoint = endpoint.split('?', 1)[0].split('#', 1)[0]
+    scheme_split = endpoint.split('://', 1)
+    if len(scheme_split) == 2:
+        endpoint = '/' + scheme_split[1].split('/', 1)[1] if '/' in scheme_split[1] else '/'
+    return ID_PATH_SEGMENT_REGEX.sub(':id', endpoint)[:ENDPOINT_MAX_LENGTH] or '(unknown)'
+
+def hour_bucket(timestamp_obj):
+    return timestamp_obj.replace(minute=0, second=0, microsecond=0)
+
+
+class RollupAccumulator:
+    """Mengumpulkan hitungan rollup di memori; ditulis ke DB sekaligus dengan flush()."""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add_entry(self, package_id, timestamp_obj, entry_text):
+        endpoint_match = ENDPOINT_FIELD_REGEX.search(entry_text)
+        method_match = METHOD_FIELD_REGEX.search(entry_text)
+        status_match = STATUS_CODE_FIELD_REGEX.search(entry_text)
+        self.counts[(
+            package_id,
+            hour_bucket(timestamp_obj),
+            normalize_endpoint(endpoint_match.group(1)) if endpoint_match else '(unknown)',
+            method_match.group(1).upper()[:10] if method_match and method_match.group(1) else '(unknown)',
+            int(status_match.group(1)) if status_match else 0
+        )] += 1
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    def flush(self):
+        """Upsert semua hitungan dengan INSERT ... ON CONFLICT massal (tanpa commit); hitungan di memori dikosongkan."""
+        if not self.counts:
+            return
+        from .log_service import _dialect_insert
+
+        insert = _dialect_insert()
+        if insert is None:
+            for (package_id, bucket_start, endpoint, method, status_code), count in self.counts.items():
+                rollup = ErrorRollup.query.filter_by(
+                    package_id=package_id, bucket_start=bucket_start, endpoint=endpoint, method=method, status_code=status_code
+                ).first()
+                if rollup is None:
+                    db.session.add(ErrorRollup(
+                        package_id=package_id, bucket_start=bucket_start, endpoint=endpoint,
+                        method=method, status_code=status_code, count=count
+                    ))
+                else:
+                    rollup.count += count
+        else:
+            rows = [
+                {
+                    "package_id": package_id, "bucket_start": bucket_start, "endpoint": endpoint,
+                    "method": method, "status_code": status_code, "count": count
+                }
+                for (package_id, bucket_start, endpoint, method, status_code), count in self.counts.items()
+            ]
+            table = ErrorRollup.__table__
+            # Biasanya satu statement; dipecah hanya agar tidak melewati batas parameter per statement
+            for chunk_start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+                stmt = insert(ErrorRollup).values(rows[chunk_start:chunk_start + UPSERT_CHUNK_ROWS])
+                db.session.execute(stmt.on_conflict_do_update(
+                    index_elements=[table.c.package_id, table.c.bucket_start, table.c.endpoint, table.c.method, table.c.status_code],
+                    set_={"count": table.c.count + stmt.excluded.count}
+                ))
+        self.counts.clear()
+
+
+def _status_filter(stmt, status_filter):
+    """Filter status: kode persis (misalnya 503) atau kelas (misalnya 5xx)."""
+    if not status_filter:
+        return stmt
+    status_filter = status_filter.lower()
+    if re.fullmatch(r"[1-5]xx", status_filter):
+        status_class = int(status_filter[0]) * 100
+        return stmt.where(ErrorRollup.status_code >= status_class, ErrorRollup.status_code < status_class + 100)
+    if status_filter.isdigit():
+        return stmt.where(ErrorRollup.status_code == int(status_filter))
+    raise ValueError(f"Invalid 'status' filter: {status_filter}")
+
+def _parse_stats_window(from_str, to_str, default_span):
+    from .log_service import _parse_time_bound
+
+    to_timestamp = _parse_time_bound(to_str, 'to') or datetime.datetime.utcnow()
+    from_timestamp = _parse_time_bound(from_str, 'from') or to_timestamp - default_span
+    if from_timestamp > to_timestamp:
+        raise ValueError("'from' must not be later than 'to'")
+    return from_timestamp, to_timestamp
+
+def _window_filter(stmt, package_id, from_timestamp, to_timestamp, endpoint=None, method=None, status_filter=None):
+    stmt = stmt.where(
+        ErrorRollup.package_id == package_id,
+        ErrorRollup.bucket_start >= hour_bucket(from_timestamp),
+        ErrorRollup.bucket_start <= to_timestamp
+    )
+    if endpoint:
+        stmt = stmt.where(ErrorRollup.endpoint == endpoint)
+    if method:
+        stmt = stmt.where(ErrorRollup.method == method.upper())
+    return _status_filter(stmt, status_filter)
+
+def get_top_errors(package_id, group_by='endpoint', from_str=None, to_str=None, status_filter=None, limit=None):
+    """Top-N endpoint/method/status_code berdasarkan jumlah entri dalam jendela waktu (default 24 jam)."""
+    group_column = STATS_GROUP_COLUMNS.get(group_by)
+    if group_column is None:
+        return {"error": f"Invalid 'by': {group_by}. Use one of: {', '.join(STATS_GROUP_COLUMNS)}"}, 400
+    try:
+        from_timestamp, to_timestamp = _parse_stats_window(from_str, to_str, datetime.timedelta(days=1))
+        top_limit = (int(limit) if limit.isdigit() else 0) if limit else 10
+        if not 1 <= top_limit <= 1000:
+            raise ValueError("'limit' must be between 1 and 1000")
+        total = func.sum(ErrorRollup.count).label('count')
+        stmt = _window_filter(select(group_column, total), package_id, from_timestamp, to_timestamp, status_filter=status_filter)
+        rows = db.session.execute(stmt.group_by(group_column).order_by(total.desc(), group_column).limit(top_limit)).all()
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return {
+        "package_id": package_id,
+        "by": group_by,
+        "from": from_timestamp.isoformat() + "Z",
+        "to": to_timestamp.isoformat() + "Z",
+        "items": [{group_by: row[0], "count": int(row.count)} for row in rows]
+    }, 200
+
+def get_error_timeseries(package_id, interval='hour', from_str=None, to_str=None, endpoint=None, method=None, status_filter=None):
+    """Jumlah entri per jam atau per hari dalam jendela waktu; bucket kosong diisi 0."""
+    bucket_size = STATS_INTERVALS.get(interval)
+    if bucket_size is None:
+        return {"error": f"Invalid 'interval': {interval}. Use one of: {', '.join(STATS_INTERVALS)}"}, 400
+    try:
+        from_timestamp, to_timestamp = _parse_stats_window(
+            from_str, to_str, datetime.timedelta(days=1) if interval == 'hour' else datetime.timedelta(days=30)
+        )
+        max_buckets = current_app.config.get('ERROR_ROLLUP_MAX_SERIES_POINTS', 2000)
+        if (to_timestamp - from_timestamp) / bucket_size > max_buckets:
+            raise ValueError(f"Time window too large for interval '{interval}' (max {max_buckets} points)")
+        stmt = _window_filter(
+            select(ErrorRollup.bucket_start, func.sum(ErrorRollup.count).label('count')),
+            package_id, from_timestamp, to_timestamp, endpoint, method, status_filter
+        )
+        rows = db.session.execute(stmt.group_by(ErrorRollup.bucket_start)).all()
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    # Rollup disimpan per jam; untuk interval harian dijumlahkan di sini (agnostik dialect DB)
+    def series_bucket(timestamp_obj):
+        return hour_bucket(timestamp_obj) if interval == 'hour' else timestamp_obj.replace(hour=0, minute=0, second=0, microsecond=0)
+    counts = Counter()
+    for row in rows:
+        counts[series_bucket(row.bucket_start)] += int(row.count)
+    points = []
+    bucket = series_bucket(from_timestamp)
+    while bucket <= to_timestamp:
+        points.append({"bucket": bucket.isoformat() + "Z", "count": counts.get(bucket, 0)})
+        bucket += bucket_size
+    return {
+        "package_id": package_id,
+        "interval": interval,
+        "total": sum(point["count"] for point in points),
+        "points": points
+    }, 200
+
+def purge_old_rollups(retention_days):
+    """Menghapus bucket rollup yang lebih tua dari retention_days (tanpa commit); mengembalikan jumlah baris."""
+    cutoff = hour_bucket(datetime.datetime.utcnow() - datetime.timedelta(days=retention_days))
+    return db.session.execute(ErrorRollup.__table__.delete().where(ErrorRollup.bucket_start < cutoff)).rowcount
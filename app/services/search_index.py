@@ -0,0 +1,246 @@
+import re
+import datetime
+from flask import current_app
+from sqlalchemy import insert, text, bindparam, BigInteger, DateTime, String
+from werkzeug.utils import secure_filename
+from ..models import db, LogSearchEntry
+from .log_storage import open_log_reader, device_log_path, locate_device_log
+
+# Indeks full-text entri log. Baris di log_search_entries menyimpan lokasi entri (package, device,
+# timestamp, offset logis di file log); teks yang diindeks disimpan di tabel khusus per dialect:
+#   SQLite     -> virtual table FTS5 log_search_fts (rowid = log_search_entries.id)
+#   PostgreSQL -> log_search_documents (entry_id, tsvector) dengan indeks GIN
+# Hasil pencarian selalu dibaca ulang dari file log berdasarkan offset, sehingga isi yang dikirim
+# sama persis dengan /view.
+SQLITE_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS log_search_fts USING fts5(body, tokenize='unicode61')",
+)
+POSTGRES_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS log_search_documents ("
+    " entry_id BIGINT PRIMARY KEY REFERENCES log_search_entries(id) ON DELETE CASCADE,"
+    " body_tsv TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_log_search_documents_body_tsv ON log_search_documents USING GIN (body_tsv)",
+)
+SEARCH_TERM_REGEX = re.compile(r"\S+")
+ENTRY_END_LINE = b"--- End Log Entry ---"
+ENTRY_TIMESTAMP_REGEX = re.compile(r"Timestamp: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d{1,6})?)")
+
+_search_backend = None
+
+
+def init_search_schema(app):
+    """Membuat tabel teks sesuai dialect DB (dipanggil saat startup, di dalam app context).
+
+    Mengembalikan nama backend ('fts5' atau 'postgresql'), atau None jika pencarian tidak tersedia.
+    """
+    global _search_backend
+    _search_backend = None
+    if not app.config.get('SEARCH_INDEX_ENABLED', True):
+        return None
+    dialect_name = db.engine.dialect.name
+    statements = {'sqlite': SQLITE_SCHEMA, 'postgresql': POSTGRES_SCHEMA}.get(dialect_name)
+    if statements is None:
+        app.logger.warning(f"Full-text log search is not supported on database dialect '{dialect_name}'; search disabled.")
+        return None
+    try:
+        with db.engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+    except Exception as e:
+        app.logger.warning(f"Could not create full-text search schema ({dialect_name}): {e}; search disabled.")
+        return None
+    _search_backend = 'fts5' if dialect_name == 'sqlite' else 'postgresql'
+    return _search_backend
+
+def search_enabled():
+    return _search_backend is not None
+
+
+class SearchIndexBatch:
+    """Mengumpulkan entri baru untuk diindeks; ditulis ke DB sekaligus dengan flush()."""
+
+    def __init__(self):
+        self.documents = []
+
+    def add_entry(self, package_id, device_id, timestamp_obj, byte_offset, entry_text):
+        self.documents.append((package_id, device_id, timestamp_obj, byte_offset, entry_text))
+
+    def merge(self, other):
+        self.documents.extend(other.documents)
+
+    def flush(self):
+        """Menulis lokasi dan teks semua entri ke indeks (tanpa commit)."""
+        if not self.documents or not search_enabled():
+            self.documents = []
+            return
+        entry_ids = db.session.scalars(
+            insert(LogSearchEntry).returning(LogSearchEntry.id, sort_by_parameter_order=True),
+            [
+                {"package_id": package_id, "device_id": device_id, "entry_timestamp": timestamp_obj, "byte_offset": byte_offset}
+                for package_id, device_id, timestamp_obj, byte_offset, _ in self.documents
+            ]
+        ).all()
+        if _search_backend == 'fts5':
+            document_sql = "INSERT INTO log_search_fts (rowid, body) VALUES (:entry_id, :body)"
+        else:
+            document_sql = "INSERT INTO log_search_documents (entry_id, body_tsv) VALUES (:entry_id, to_tsvector('simple', :body))"
+        db.session.execute(text(document_sql), [
+            {"entry_id": entry_id, "body": document[4]} for entry_id, document in zip(entry_ids, self.documents)
+        ])
+        self.documents = []
+
+
+def _delete_entries(where_sql, params):
+    if _search_backend == 'fts5':
+        # FTS5 tidak punya foreign key; hapus teksnya dulu berdasarkan rowid
+        db.session.execute(text(
+            f"DELETE FROM log_search_fts WHERE rowid IN (SELECT id FROM log_search_entries WHERE {where_sql})"
+        ), params)
+    db.session.execute(text(f"DELETE FROM log_search_entries WHERE {where_sql}"), params)
+
+def remove_device_entries(package_id, device_id):
+    """Menghapus seluruh entri indeks milik satu perangkat (tanpa commit)."""
+    if search_enabled():
+        _delete_entries("package_id = :package_id AND device_id = :device_id", {"package_id": package_id, "device_id": device_id})
+
+def remove_trimmed_entries(package_id, device_id, trim_offset):
+    """Menyelaraskan indeks setelah trim_log_prefix: hapus entri sebelum trim_offset dan geser offset sisanya."""
+    if not search_enabled():
+        return
+    params = {"package_id": package_id, "device_id": device_id, "trim_offset": trim_offset}
+    _delete_entries("package_id = :package_id AND device_id = :device_id AND byte_offset < :trim_offset", params)
+    db.session.execute(text(
+        "UPDATE log_search_entries SET byte_offset = byte_offset - :trim_offset "
+        "WHERE package_id = :package_id AND device_id = :device_id"
+    ), params)
+
+
+def _match_clause(query_str):
+    """Klausa pencarian: semua kata harus ada (AND), tanpa sintaks query khusus dari pengguna."""
+    terms = SEARCH_TERM_REGEX.findall(query_str)
+    if _search_backend == 'fts5':
+        # Setiap kata dikutip sebagai string FTS5 agar karakter seperti ':' atau '-' tidak dianggap operator
+        match_query = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        return ("FROM log_search_fts JOIN log_search_entries e ON e.id = log_search_fts.rowid "
+                "WHERE log_search_fts MATCH :match_query"), match_query
+    return ("FROM log_search_documents d JOIN log_search_entries e ON e.id = d.entry_id "
+            "WHERE d.body_tsv @@ plainto_tsquery('simple', :match_query)"), " ".join(terms)
+
+def _read_entry_text(log_filepath, byte_offset):
+    """Membaca satu entri dari file log mulai dari offset logisnya; None jika file/entri tidak ada."""
+    max_entry_size = current_app.config.get('UPLOAD_MAX_PENDING_ENTRY_SIZE', 1024 * 1024)
+    try:
+        with open_log_reader(log_filepath, byte_offset) as log_file:
+            lines = []
+            read_size = 0
+            for line in log_file:
+                lines.append(line)
+                read_size += len(line)
+                if line.startswith(ENTRY_END_LINE) or read_size > max_entry_size:
+                    break
+    except FileNotFoundError:
+        return None
+    return b"".join(lines).decode('utf-8', errors='replace').rstrip("\n") or None
+
+def search_log_entries(package_id, query_str, device_id=None, from_str=None, to_str=None, limit=None, cursor=None):
+    """Mencari entri log sebuah package yang memuat semua kata di query_str, terbaru lebih dulu.
+
+    Paginasi keyset: next_cursor adalah id entri indeks terakhir di halaman ini.
+    """
+    from .log_service import _parse_time_bound
+
+    if not search_enabled():
+        return {"error": "Full-text log search is not available on this server"}, 501
+    if not package_id:
+        return {"error": "Package ID is required"}, 400
+    if not query_str or not SEARCH_TERM_REGEX.search(query_str):
+        return {"error": "Search query 'q' is required"}, 400
+    try:
+        from_timestamp = _parse_time_bound(from_str, 'from')
+        to_timestamp = _parse_time_bound(to_str, 'to')
+        if cursor and not cursor.isdigit():
+            raise ValueError(f"Invalid 'cursor': {cursor}")
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    page_limit = current_app.config.get('SEARCH_PAGE_DEFAULT_LIMIT', 50)
+    max_limit = current_app.config.get('SEARCH_PAGE_MAX_LIMIT', 500)
+    if limit:
+        page_limit = int(limit) if limit.isdigit() else 0
+    if page_limit < 1 or page_limit > max_limit:
+        return {"error": f"'limit' must be between 1 and {max_limit}"}, 400
+
+    from_sql, match_query = _match_clause(query_str)
+    conditions = ["e.package_id = :package_id"]
+    params = {"match_query": match_query, "package_id": package_id, "row_limit": page_limit + 1}
+    if device_id:
+        conditions.append("e.device_id = :device_id")
+        params["device_id"] = device_id
+    if from_timestamp is not None:
+        conditions.append("e.entry_timestamp >= :from_timestamp")
+        params["from_timestamp"] = from_timestamp
+    if to_timestamp is not None:
+        conditions.append("e.entry_timestamp <= :to_timestamp")
+        params["to_timestamp"] = to_timestamp
+    if cursor:
+        conditions.append("e.id < :cursor_id")
+        params["cursor_id"] = int(cursor)
+    stmt = text(
+        f"SELECT e.id, e.device_id, e.entry_timestamp, e.byte_offset {from_sql} AND {' AND '.join(conditions)} "
+        "ORDER BY e.id DESC LIMIT :row_limit"
+    ).bindparams(
+        *(bindparam(name, type_=DateTime) for name in ('from_timestamp', 'to_timestamp') if name in params)
+    ).columns(id=BigInteger, device_id=String, entry_timestamp=DateTime, byte_offset=BigInteger)
+    rows = db.session.execute(stmt, params).all()
+
+    has_more = len(rows) > page_limit
+    rows = rows[:page_limit]
+    items = []
+    for row in rows:
+        items.append({
+            "device_id": row.device_id,
+            "timestamp": row.entry_timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")[:23],
+            "offset": row.byte_offset,
+            "entry": _read_entry_text(
+                locate_device_log(device_log_path(package_id, secure_filename(row.device_id) + ".log")), row.byte_offset
+            )
+        })
+    return {
+        "package_id": package_id,
+        "query": query_str,
+        "items": items,
+        "next_cursor": str(rows[-1].id) if has_more else None
+    }, 200
+
+
+def rebuild_device_index(package_id, device_id, log_filepath):
+    """Mengindeks ulang seluruh entri satu file log (untuk log yang sudah ada sebelum indeks ini).
+
+    Harus dipanggil saat memegang lock perangkat; tanpa commit. Mengembalikan jumlah entri terindeks.
+    """
+    from .log_index import ensure_log_index, INDEX_RECORD
+
+    remove_device_entries(package_id, device_id)
+    index_filepath = ensure_log_index(log_filepath)
+    with open(index_filepath, 'rb') as index_file:
+        offsets = [offset for _, offset in INDEX_RECORD.iter_unpack(index_file.read())]
+    batch = SearchIndexBatch()
+    indexed_count = 0
+    with open_log_reader(log_filepath) as log_file:
+        position = 0
+        for record_number, entry_offset in enumerate(offsets):
+            if entry_offset > position:
+                log_file.read(entry_offset - position)
+            next_offset = offsets[record_number + 1] if record_number + 1 < len(offsets) else None
+            entry_bytes = log_file.read(next_offset - entry_offset) if next_offset is not None else log_file.read()
+            position = entry_offset + len(entry_bytes)
+            entry_text = entry_bytes.decode('utf-8', errors='replace').rstrip("\n")
+            timestamp_match = ENTRY_TIMESTAMP_REGEX.search(entry_text)
+            if not timestamp_match:
+                continue
+            timestamp_obj = datetime.datetime.fromisoformat(timestamp_match.group(1))
+            batch.add_entry(package_id, device_id, timestamp_obj, entry_offset, entry_text)
+            indexed_count += 1
+            if len(batch.documents) >= 1000:
+                batch.flush()
+    batch.flush()
+    return indexed_count
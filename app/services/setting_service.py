@@ -1,34 +1,193 @@
 import os
+import time
+import threading
+from collections import namedtuple
 from flask import current_app
-from ..models import AppSetting, db # Impor model dan db
+from sqlalchemy import select
+from ..models import AppSetting, PackageSetting, db # Impor model dan db
 
-def get_log_retention_days_from_db():
-    """Mengambil durasi retensi log dari database."""
-    setting = AppSetting.query.filter_by(key='LOG_RETENTION_DAYS').first()
-    if setting and setting.value.isdigit():
-        return int(setting.value)
-    # Fallback ke environment variable jika tidak ada di DB atau tidak valid
-    env_val = current_app.config.get('DEFAULT_LOG_RETENTION_DAYS') # Ambil dari config yang sudah load env
-    return int(env_val)
+# Pengaturan global bertipe: key di tabel app_settings -> (tipe, key config untuk nilai default, nilai minimum)
+SETTING_DEFINITIONS = {
+    'LOG_RETENTION_DAYS': (int, 'DEFAULT_LOG_RETENTION_DAYS', 1),
+    'MAX_BYTES_PER_DEVICE': (int, 'DEFAULT_MAX_BYTES_PER_DEVICE', 0),
+}
+# Kolom override per package -> key pengaturan global yang di-override
+PACKAGE_SETTING_FIELDS = {
+    'log_retention_days': 'LOG_RETENTION_DAYS',
+    'max_bytes_per_device': 'MAX_BYTES_PER_DEVICE',
+}
 
+# retention_days 0 = entri tidak pernah kedaluwarsa, max_bytes_per_device 0 = tanpa batas ukuran
+RetentionPolicy = namedtuple('RetentionPolicy', ['retention_days', 'max_bytes_per_device'])
 
-def set_log_retention_days_in_db(days):
-    """Menyimpan durasi retensi log ke database."""
-    if not isinstance(days, int) or days <= 0:
-        raise ValueError("Retention days must be a positive integer.")
-    
-    setting = AppSetting.query.filter_by(key='LOG_RETENTION_DAYS').first()
+
+class SettingsSnapshot:
+    """Salinan baca-saja semua pengaturan (global dan override per package) di memori proses."""
+
+    def __init__(self, global_settings, package_overrides, expires_at):
+        self.global_settings = global_settings
+        self.package_overrides = package_overrides
+        self.expires_at = expires_at
+        self.default_policy = RetentionPolicy(global_settings['LOG_RETENTION_DAYS'], global_settings['MAX_BYTES_PER_DEVICE'])
+
+    def get(self, key):
+        return self.global_settings[key]
+
+    def policy_for(self, package_id):
+        """Kebijakan efektif untuk package: nilai override jika ada, selain itu nilai global."""
+        override = self.package_overrides.get(package_id)
+        if override is None:
+            return self.default_policy
+        return RetentionPolicy(
+            override['log_retention_days'] if override['log_retention_days'] is not None else self.default_policy.retention_days,
+            override['max_bytes_per_device'] if override['max_bytes_per_device'] is not None else self.default_policy.max_bytes_per_device
+        )
+
+    def packages_without_expiry(self):
+        """Package yang kebijakannya tidak pernah membuang data (bisa dilewati oleh cleanup)."""
+        return [
+            package_id for package_id in self.package_overrides
+            if self.policy_for(package_id) == RetentionPolicy(0, 0)
+        ]
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def _validate_setting_value(key, value):
+    value_type, _, minimum = SETTING_DEFINITIONS[key]
+    if isinstance(value, bool) or not isinstance(value, value_type) or value < minimum:
+        raise ValueError(f"{key} must be an integer >= {minimum}.")
+    return value
+
+def _default_setting_value(key):
+    return SETTING_DEFINITIONS[key][0](current_app.config.get(SETTING_DEFINITIONS[key][1]))
+
+def _load_settings_snapshot():
+    global_settings = {key: _default_setting_value(key) for key in SETTING_DEFINITIONS}
+    for setting in AppSetting.query.filter(AppSetting.key.in_(SETTING_DEFINITIONS)).all():
+        try:
+            global_settings[setting.key] = _validate_setting_value(setting.key, SETTING_DEFINITIONS[setting.key][0](setting.value))
+        except ValueError:
+            current_app.logger.warning(f"Ignoring invalid value for setting {setting.key}: {setting.value}")
+    package_overrides = {
+        row.package_id: {"log_retention_days": row.log_retention_days, "max_bytes_per_device": row.max_bytes_per_device}
+        for row in db.session.execute(
+            select(PackageSetting.package_id, PackageSetting.log_retention_days, PackageSetting.max_bytes_per_device)
+        )
+    }
+    return SettingsSnapshot(
+        global_settings, package_overrides,
+        time.monotonic() + current_app.config.get('SETTINGS_CACHE_TTL_SECONDS', 30)
+    )
+
+def get_settings_snapshot():
+    """Snapshot pengaturan dari memori; dimuat ulang dari DB setelah ditulis atau setelah TTL habis.
+
+    TTL membatasi berapa lama proses lain (worker gunicorn lain) melihat nilai lama setelah ada perubahan.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.expires_at > time.monotonic():
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.expires_at <= time.monotonic():
+            _snapshot = _load_settings_snapshot()
+        return _snapshot
+
+def invalidate_settings_snapshot():
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
+
+def get_setting(key):
+    return get_settings_snapshot().get(key)
+
+def get_retention_policy(package_id):
+    return get_settings_snapshot().policy_for(package_id)
+
+def set_setting(key, value):
+    """Menyimpan pengaturan global bertipe ke database lalu membuang snapshot."""
+    if key not in SETTING_DEFINITIONS:
+        raise ValueError(f"Unknown setting: {key}")
+    _validate_setting_value(key, value)
+    setting = AppSetting.query.filter_by(key=key).first()
     if setting:
-        setting.value = str(days)
+        setting.value = str(value)
     else:
-        setting = AppSetting(key='LOG_RETENTION_DAYS', value=str(days))
+        setting = AppSetting(key=key, value=str(value))
         db.session.add(setting)
     db.session.commit()
-    current_app.logger.info(f"Log retention period updated in DB to {days} days.")
+    invalidate_settings_snapshot()
+    current_app.logger.info(f"Setting {key} updated in DB to {value}.")
+
+
+def set_log_retention_days_in_db(days):
+    """Menyimpan durasi retensi log ke database."""
+    if not isinstance(days, int) or days <= 0:
+        raise ValueError("Retention days must be a positive integer.")
+
+    set_setting('LOG_RETENTION_DAYS', days)
     # Update juga nilai di app.config agar konsisten untuk sesi saat ini
     current_app.config['CURRENT_LOG_RETENTION_DAYS'] = days
 
 
+def _package_settings_to_dict(package_id, override, snapshot):
+    policy = snapshot.policy_for(package_id)
+    return {
+        "package_id": package_id,
+        "overrides": override,
+        "effective": {"log_retention_days": policy.retention_days, "max_bytes_per_device": policy.max_bytes_per_device}
+    }
+
+def list_package_settings():
+    """Semua override per package beserta kebijakan efektifnya."""
+    snapshot = get_settings_snapshot()
+    return [
+        _package_settings_to_dict(package_id, override, snapshot)
+        for package_id, override in sorted(snapshot.package_overrides.items())
+    ]
+
+def get_package_settings(package_id):
+    snapshot = get_settings_snapshot()
+    return _package_settings_to_dict(package_id, snapshot.package_overrides.get(package_id), snapshot)
+
+def set_package_settings(package_id, values):
+    """Membuat atau mengganti override package. Field yang bernilai None (atau tidak dikirim) ikut pengaturan global."""
+    if not package_id:
+        raise ValueError("Package ID is required.")
+    unknown_fields = set(values) - set(PACKAGE_SETTING_FIELDS)
+    if unknown_fields:
+        raise ValueError(f"Unknown package setting(s): {', '.join(sorted(unknown_fields))}")
+    for field_name in PACKAGE_SETTING_FIELDS:
+        value = values.get(field_name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+            raise ValueError(f"{field_name} must be a non-negative integer or null.")
+
+    package_setting = db.session.get(PackageSetting, package_id)
+    if package_setting is None:
+        package_setting = PackageSetting(package_id=package_id)
+        db.session.add(package_setting)
+    package_setting.log_retention_days = values.get('log_retention_days')
+    package_setting.max_bytes_per_device = values.get('max_bytes_per_device')
+    db.session.commit()
+    invalidate_settings_snapshot()
+    current_app.logger.info(f"Package settings for {package_id} updated: {values}.")
+    return get_package_settings(package_id)
+
+def delete_package_settings(package_id):
+    """Menghapus override package; mengembalikan False jika tidak ada override."""
+    package_setting = db.session.get(PackageSetting, package_id)
+    if package_setting is None:
+        return False
+    db.session.delete(package_setting)
+    db.session.commit()
+    invalidate_settings_snapshot()
+    current_app.logger.info(f"Package settings for {package_id} removed.")
+    return True
+
+
 def initialize_app_settings_on_startup(app_instance):
     """Dipanggil saat aplikasi dimulai untuk memastikan pengaturan ada di DB."""
     with app_instance.app_context(): # Gunakan konteks dari app_instance yang di-pass
@@ -36,7 +195,7 @@ def initialize_app_settings_on_startup(app_instance):
         if not AppSetting.query.filter_by(key='LOG_RETENTION_DAYS').first():
             # Ambil dari config yang sudah memproses env var atau default
             initial_days = app_instance.config.get('DEFAULT_LOG_RETENTION_DAYS')
-            
+
             # Cek juga env var LOG_API_KEY secara langsung jika ingin override default di config
             env_retention_days = os.environ.get('LOG_RETENTION_DAYS')
             if env_retention_days and env_retention_days.isdigit():
@@ -44,7 +203,8 @@ def initialize_app_settings_on_startup(app_instance):
 
             set_log_retention_days_in_db(int(initial_days)) # Pastikan int
             app_instance.logger.info(f"Initialized LOG_RETENTION_DAYS in DB to {initial_days} days.")
-        
+
         # Simpan nilai terkini (dari DB atau default) ke app.config untuk akses mudah
-        current_retention = get_log_retention_days_from_db()
-        app_instance.config['CURRENT_LOG_RETENTION_DAYS'] = current_retention
\ No newline at end of file
+        invalidate_settings_snapshot()
+        current_retention = get_setting('LOG_RETENTION_DAYS')
+        app_instance.config['CURRENT_LOG_RETENTION_DAYS'] = current_retention
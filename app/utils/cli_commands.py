@@ -0,0 +1,86 @@
+import os
+import click
+from flask import current_app
+from ..services.log_storage import (
+    seal_active_segment, load_segments, segment_path, iter_device_log_files, adopt_legacy_log, legacy_log_path,
+    device_log_path
+)
+from .device_locks import device_file_locks
+
+
+def register_cli_commands(app):
+    """Mendaftarkan perintah CLI aplikasi (dijalankan dengan `flask --app run <perintah>`)."""
+
+    @app.cli.command('migrate-log-storage')
+    @click.option('--package-id', default=None, help='Hanya migrasi satu package.')
+    def migrate_log_storage(package_id):
+        """Mengonversi file .log yang ada menjadi segmen tertutup terkompresi (mode segmented)."""
+        from werkzeug.utils import secure_filename
+
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        compress_level = current_app.config.get('LOG_SEGMENT_COMPRESS_LEVEL', 6)
+        migrated_count = 0
+        original_bytes = 0
+        compressed_bytes = 0
+        for log_filepath in iter_device_log_files(upload_folder, secure_filename(package_id) if package_id else None):
+            os.makedirs(os.path.dirname(log_filepath), exist_ok=True)
+            # Lock yang sama dengan jalur upload, sehingga migrasi aman dijalankan saat aplikasi hidup
+            with device_file_locks([log_filepath]):
+                adopt_legacy_log(log_filepath)
+                active_size = os.path.getsize(log_filepath)
+                if not seal_active_segment(log_filepath, compress_level):
+                    continue
+                new_segment = load_segments(log_filepath)[-1]
+                original_bytes += active_size
+                compressed_bytes += os.path.getsize(segment_path(log_filepath, new_segment))
+                migrated_count += 1
+        click.echo(
+            f"Migrated {migrated_count} log files to compressed segments "
+            f"({original_bytes} bytes -> {compressed_bytes} bytes)."
+        )
+
+    @app.cli.command('migrate-log-layout')
+    @click.option('--package-id', default=None, help='Hanya migrasi satu package.')
+    def migrate_log_layout(package_id):
+        """Memindahkan file log dari layout datar lama ke subdirektori fan-out (LOG_STORAGE_FANOUT_LEVELS)."""
+        from werkzeug.utils import secure_filename
+
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        moved_count = 0
+        for log_filepath in iter_device_log_files(upload_folder, secure_filename(package_id) if package_id else None):
+            if legacy_log_path(log_filepath) == log_filepath or not os.path.exists(legacy_log_path(log_filepath)):
+                continue
+            os.makedirs(os.path.dirname(log_filepath), exist_ok=True)
+            # Satu perangkat per lock, sama dengan jalur upload: aplikasi tetap melayani unggahan selama migrasi
+            with device_file_locks([log_filepath]):
+                if adopt_legacy_log(log_filepath):
+                    moved_count += 1
+        click.echo(f"Moved {moved_count} device logs to the fan-out directory layout.")
+
+    @app.cli.command('rebuild-search-index')
+    @click.option('--package-id', default=None, help='Hanya indeks ulang satu package.')
+    def rebuild_search_index(package_id):
+        """Mengindeks ulang semua entri log yang sudah ada ke indeks pencarian full-text."""
+        from werkzeug.utils import secure_filename
+        from sqlalchemy import select
+        from ..models import db, DeviceLogFile
+        from ..services.search_index import search_enabled, rebuild_device_index
+
+        if not search_enabled():
+            raise click.ClickException("Full-text log search is not available for this database.")
+        query = select(DeviceLogFile.package_id, DeviceLogFile.device_id, DeviceLogFile.server_filename).order_by(DeviceLogFile.id)
+        if package_id:
+            query = query.where(DeviceLogFile.package_id == package_id)
+        device_count = 0
+        entry_count = 0
+        for row in db.session.execute(query).all():
+            log_filepath = device_log_path(row.package_id, row.server_filename)
+            if not os.path.exists(log_filepath) and not os.path.exists(legacy_log_path(log_filepath)):
+                continue
+            os.makedirs(os.path.dirname(log_filepath), exist_ok=True)
+            with device_file_locks([log_filepath]):
+                adopt_legacy_log(log_filepath)
+                entry_count += rebuild_device_index(row.package_id, row.device_id, log_filepath)
+                db.session.commit()
+            device_count += 1
+        click.echo(f"Indexed {entry_count} log entries from {device_count} device logs.")
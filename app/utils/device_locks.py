@@ -0,0 +1,74 @@
+import os
+import zlib
+import threading
+from contextlib import contextmanager
+
+try: # fcntl hanya tersedia di POSIX; di platform lain hanya lock dalam proses yang dipakai
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEVICE_LOCK_STRIPES = 64
+_device_lock_stripes = [threading.Lock() for _ in range(DEVICE_LOCK_STRIPES)]
+LOCK_FILE_SUFFIX = '.lock'
+
+# Folder file stripe flock (init_device_locks); None = file <log>.lock di samping setiap log (layout lama)
+_lock_folder = None
+_lock_file_count = 1024
+
+
+def init_device_locks(app):
+    """Menyiapkan folder file lock antar proses dari DEVICE_LOCK_FOLDER (default <UPLOAD_FOLDER>/.locks)."""
+    global _lock_folder, _lock_file_count
+    _lock_folder = app.config.get('DEVICE_LOCK_FOLDER') or os.path.join(app.config['UPLOAD_FOLDER'], '.locks')
+    _lock_file_count = max(1, app.config.get('DEVICE_LOCK_FILES', 1024))
+    os.makedirs(_lock_folder, exist_ok=True)
+
+def uses_lock_folder():
+    return _lock_folder is not None
+
+def _stripe_index(server_filepath):
+    return zlib.crc32(server_filepath.encode('utf-8')) % DEVICE_LOCK_STRIPES
+
+def device_lock_path(server_filepath):
+    """Path file untuk advisory lock; terpisah dari file log agar tetap valid jika log diganti (rename).
+
+    Dengan folder lock, beberapa perangkat berbagi satu file stripe sehingga jumlah file lock tetap
+    (tidak bertambah dengan jumlah perangkat) dan file lock tidak perlu dihapus bersama log-nya.
+    """
+    if _lock_folder is None:
+        return server_filepath + LOCK_FILE_SUFFIX
+    lock_index = zlib.crc32(server_filepath.encode('utf-8')) % _lock_file_count
+    return os.path.join(_lock_folder, f"{lock_index:04x}{LOCK_FILE_SUFFIX}")
+
+@contextmanager
+def device_file_locks(server_filepaths):
+    """Mengunci satu atau beberapa file log perangkat secara eksklusif.
+
+    Lock dua lapis: striped threading.Lock untuk thread dalam proses yang sama, lalu flock pada
+    file lock (device_lock_path) untuk antar proses (misalnya beberapa worker gunicorn). Lock selalu
+    diambil dengan urutan yang sama (indeks stripe, lalu path file lock) agar tidak terjadi deadlock
+    antar batch; file lock yang dipakai bersama beberapa perangkat hanya dikunci sekali.
+    """
+    lock_paths = sorted({device_lock_path(path) for path in server_filepaths})
+    stripe_indexes = sorted({_stripe_index(path) for path in server_filepaths})
+    acquired_stripes = []
+    lock_fds = []
+    try:
+        for index in stripe_indexes:
+            _device_lock_stripes[index].acquire()
+            acquired_stripes.append(index)
+        if fcntl is not None:
+            for lock_path in lock_paths:
+                fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                lock_fds.append(fd)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        for fd in reversed(lock_fds):
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        for index in reversed(acquired_stripes):
+            _device_lock_stripes[index].release()
@@ -0,0 +1,89 @@
+import os
+import time
+from flask import request, g, Response
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from .request_decompression import COMPRESSED_LENGTH_ENVIRON_KEY
+
+# Metrik Prometheus aplikasi. Dengan beberapa worker proses, set PROMETHEUS_MULTIPROC_DIR ke folder
+# kosong yang sama untuk semua worker SEBELUM aplikasi diimpor; nilai setiap proses ditulis ke file
+# di folder itu dan /metrics menjumlahkannya. Folder harus dikosongkan setiap kali server dimulai.
+# Hanya Counter dan Histogram yang dipakai agar agregasi antar proses selalu benar.
+METRIC_PREFIX = "mobile_log_api"
+
+REQUEST_LATENCY = Histogram(
+    f"{METRIC_PREFIX}_request_duration_seconds", "HTTP request latency per route.", ["endpoint", "method"]
+)
+REQUESTS_TOTAL = Counter(
+    f"{METRIC_PREFIX}_requests_total", "HTTP requests per route and status code.", ["endpoint", "method", "status"]
+)
+BYTES_RECEIVED = Counter(
+    f"{METRIC_PREFIX}_request_bytes_received_total", "Request body bytes received per route.", ["endpoint"]
+)
+
+ENTRIES_PARSED = Counter(f"{METRIC_PREFIX}_log_entries_parsed_total", "Log entries matched by the upload parser.")
+ENTRIES_APPENDED = Counter(f"{METRIC_PREFIX}_log_entries_appended_total", "New log entries appended to device logs.")
+ENTRIES_SKIPPED_DUPLICATE = Counter(
+    f"{METRIC_PREFIX}_log_entries_skipped_duplicate_total", "Parsed log entries skipped as already processed."
+)
+ENTRIES_COLLAPSED = Counter(
+    f"{METRIC_PREFIX}_log_entries_collapsed_total", "Repeated log entries stored as an occurrence of an earlier entry (LOG_COLLAPSE_REPEATS)."
+)
+BYTES_SKIPPED_AHEAD = Counter(
+    f"{METRIC_PREFIX}_upload_bytes_skipped_ahead_total", "Upload bytes skipped as duplicates without parsing (skip-ahead)."
+)
+UPLOAD_PARSE_SECONDS = Histogram(f"{METRIC_PREFIX}_upload_parse_seconds", "Regex parse time per device upload.")
+UPLOAD_APPEND_SECONDS = Histogram(f"{METRIC_PREFIX}_upload_append_seconds", "Log file and index append time per device upload.")
+LOG_FSYNC_WAIT_SECONDS = Histogram(
+    f"{METRIC_PREFIX}_log_fsync_wait_seconds", "Time an upload waits for its log writes to be fsynced.", ["policy"]
+)
+DB_COMMIT_SECONDS = Histogram(
+    f"{METRIC_PREFIX}_upload_db_commit_seconds", "Metadata, rollup and search index writes plus commit per upload request."
+)
+
+SCHEDULER_JOB_SECONDS = Histogram(
+    f"{METRIC_PREFIX}_scheduler_job_duration_seconds", "Scheduled job duration.", ["job"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600, float("inf"))
+)
+FILES_RECLAIMED = Counter(
+    f"{METRIC_PREFIX}_retention_files_reclaimed_total", "Log files deleted or trimmed by retention cleanup.", ["action"]
+)
+BYTES_RECLAIMED = Counter(f"{METRIC_PREFIX}_retention_bytes_reclaimed_total", "Bytes reclaimed by retention cleanup.")
+
+
+def _collect_metrics():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def metrics_view():
+    return Response(_collect_metrics(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def _start_request_timer():
+    g.metrics_request_started = time.perf_counter()
+
+def _observe_request(response):
+    started = g.pop('metrics_request_started', None)
+    if started is None or request.endpoint == 'metrics':
+        return response
+    endpoint = request.endpoint or 'unmatched' # 404 tidak punya endpoint; jangan pakai path agar label tetap sedikit
+    REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+    REQUESTS_TOTAL.labels(endpoint, request.method, str(response.status_code)).inc()
+    received_length = request.environ.get(COMPRESSED_LENGTH_ENVIRON_KEY, request.content_length)
+    if received_length:
+        BYTES_RECEIVED.labels(endpoint).inc(received_length)
+    return response
+
+def init_app(app):
+    """Mendaftarkan hook pengukur latensi request dan endpoint /metrics (jika METRICS_ENABLED)."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    from .. import limiter
+
+    app.before_request(_start_request_timer)
+    app.after_request(_observe_request)
+    # Scraper Prometheus tidak boleh terkena rate limit default
+    app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', limiter.exempt(metrics_view))
@@ -0,0 +1,97 @@
+import io
+import json
+import zlib
+from werkzeug.exceptions import BadRequest
+from werkzeug.wsgi import get_content_length
+
+SUPPORTED_REQUEST_ENCODINGS = ('gzip', 'x-gzip')
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+# Ukuran body terkompresi asli, untuk metrik bytes yang benar-benar diterima
+COMPRESSED_LENGTH_ENVIRON_KEY = 'mobile_log_api.compressed_content_length'
+
+
+class GzipRequestStream(io.RawIOBase):
+    """Stream baca yang mendekompresi body gzip dari wsgi.input secara bertahap.
+
+    Output setiap langkah dekompresi dibatasi chunk_size, sehingga body kecil yang mengembang
+    sangat besar (gzip bomb) tidak pernah dimuat sekaligus; batas total tetap MAX_CONTENT_LENGTH
+    yang diterapkan Werkzeug pada hasil dekompresi. Beberapa member gzip berturut-turut didukung.
+    """
+
+    def __init__(self, stream, compressed_length=None, chunk_size=64 * 1024):
+        self._stream = stream
+        self._remaining = compressed_length # None = server yang membatasi akhir stream
+        self._chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj(GZIP_WBITS)
+        self._buffer = bytearray()
+        self._finished = False
+
+    def readable(self):
+        return True
+
+    def _read_compressed(self):
+        size = self._chunk_size if self._remaining is None else min(self._chunk_size, self._remaining)
+        if size <= 0:
+            return b""
+        data = self._stream.read(size)
+        if self._remaining is not None:
+            self._remaining -= len(data)
+        return data
+
+    def _decompress_more(self):
+        if self._decompressor.eof:
+            data = self._decompressor.unused_data or self._read_compressed()
+            if not data:
+                self._finished = True
+                return
+            self._decompressor = zlib.decompressobj(GZIP_WBITS) # Member gzip berikutnya
+        else:
+            data = self._decompressor.unconsumed_tail or self._read_compressed()
+            if not data:
+                raise BadRequest("Truncated gzip request body")
+        try:
+            self._buffer += self._decompressor.decompress(data, self._chunk_size)
+        except zlib.error as e:
+            raise BadRequest(f"Invalid gzip request body: {e}")
+
+    def readinto(self, target):
+        while not self._buffer and not self._finished:
+            self._decompress_more()
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        del self._buffer[:size]
+        return size
+
+
+def _json_error(start_response, status, message):
+    body = json.dumps({"error": message}).encode('utf-8')
+    start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+class RequestDecompressionMiddleware:
+    """Middleware WSGI: body request dengan Content-Encoding: gzip didekompresi sebelum diparsing Flask.
+
+    Setelah dibungkus, Content-Length tidak diketahui lagi, sehingga stream ditandai
+    wsgi.input_terminated dan Werkzeug menerapkan max_content_length pada hasil dekompresi.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        content_encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not content_encoding or content_encoding == 'identity':
+            return self.wsgi_app(environ, start_response)
+        if content_encoding not in SUPPORTED_REQUEST_ENCODINGS:
+            return _json_error(start_response, '415 Unsupported Media Type', f"Unsupported Content-Encoding: {content_encoding}")
+
+        compressed_length = get_content_length(environ)
+        if compressed_length is None and 'wsgi.input_terminated' not in environ:
+            return _json_error(start_response, '411 Length Required', "Compressed request bodies require a Content-Length header")
+        environ['wsgi.input'] = GzipRequestStream(environ['wsgi.input'], compressed_length)
+        environ['wsgi.input_terminated'] = True
+        environ[COMPRESSED_LENGTH_ENVIRON_KEY] = compressed_length
+        environ.pop('CONTENT_LENGTH', None)
+        environ.pop('HTTP_CONTENT_ENCODING', None)
+        return self.wsgi_app(environ, start_response)
@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+
+try: # fcntl hanya tersedia di POSIX; di platform lain proses ini selalu menjadi leader
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class SchedulerLeader:
+    """Pemilihan leader APScheduler antar proses dengan flock pada SCHEDULER_LOCK_FILE.
+
+    Setiap proses (misalnya setiap worker gunicorn) menjalankan thread yang mencoba mengambil lock
+    secara non-blocking. Proses yang berhasil menjadi leader, menjadwalkan job, dan memegang lock
+    sampai proses berhenti. Kernel melepas flock saat proses mati, sehingga worker lain mengambil
+    alih pada percobaan berikutnya (setiap SCHEDULER_LEADER_RETRY_SECONDS detik).
+    """
+
+    def __init__(self):
+        self.app = None
+        self.scheduler = None
+        self.lock_filepath = None
+        self.retry_seconds = 15
+        self.is_leader = False
+        self._lock_fd = None
+        self._thread = None
+        self._owner_pid = None
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app, scheduler):
+        self.app = app
+        self.scheduler = scheduler
+        self.lock_filepath = app.config['SCHEDULER_LOCK_FILE']
+        self.retry_seconds = app.config.get('SCHEDULER_LEADER_RETRY_SECONDS', 15)
+
+    def start(self):
+        """Memulai thread pemilihan leader di proses ini (aman dipanggil berulang, juga setelah fork)."""
+        with self._start_lock:
+            if self._owner_pid == os.getpid():
+                return
+            # Setelah fork, thread dan lock milik proses induk tidak ikut; mulai dari awal
+            self._owner_pid = os.getpid()
+            self.is_leader = False
+            self._lock_fd = None
+            self._thread = threading.Thread(target=self._election_loop, name="scheduler-leader", daemon=True)
+            self._thread.start()
+
+    def _try_acquire(self):
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_filepath) or '.', exist_ok=True)
+        fd = os.open(self.lock_filepath, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode('ascii')) # Hanya informasi: pid leader saat ini
+        self._lock_fd = fd # Tetap terbuka selama proses hidup
+        return True
+
+    def _election_loop(self):
+        from .scheduler_tasks import schedule_cleanup_job
+
+        while True:
+            try:
+                acquired = self._try_acquire()
+            except OSError as e:
+                self.app.logger.error(f"Scheduler leader election failed on {self.lock_filepath}: {e}")
+                acquired = False
+            if acquired:
+                break
+            time.sleep(self.retry_seconds)
+
+        self.is_leader = True
+        if self.scheduler.running:
+            return
+        schedule_cleanup_job(self.app, self.scheduler)
+        try:
+            self.scheduler.start()
+            self.app.logger.info(f"Process {os.getpid()} is the scheduler leader; APScheduler started for log cleanup.")
+        except Exception as e:
+            self.app.logger.warning(f"APScheduler already running or failed to start: {e}")
+
+
+scheduler_leader = SchedulerLeader()
@@ -1,80 +1,246 @@
 import os
+import time
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app # Gunakan current_app jika fungsi dipanggil dalam konteks request atau app
-from ..models import db, DeviceLogFile
-from ..services.setting_service import get_log_retention_days_from_db # Impor fungsi dari service
+from sqlalchemy import select, update, delete, or_, tuple_
+from ..models import db, DeviceLogFile, DeviceDedupState
+from ..services.setting_service import get_settings_snapshot # Impor fungsi dari service
+from ..services.log_storage import (
+    delete_device_log, trim_log_prefix, logical_size, device_log_path, legacy_log_path, locate_device_log, adopt_legacy_log
+)
+from ..services.log_index import index_path_for, read_first_timestamp_ms, find_retention_cut, find_size_cut, shift_log_index, timestamp_to_ms
+from ..services.log_service import invalidate_view_cache
+from ..services.log_writer import log_writer
+from ..services.cursor_cache import cursor_cache
+from ..services.rollup_service import purge_old_rollups
+from ..services.search_index import remove_device_entries, remove_trimmed_entries
+from .device_locks import device_file_locks, uses_lock_folder, LOCK_FILE_SUFFIX
+from . import metrics
+
+def _inspect_log_file(filepath, legacy_filepath):
+    """Dijalankan di thread pool: stat file log, ukuran logis, dan timestamp entri pertama dari indeks."""
+    filepath = locate_device_log(filepath, legacy_filepath)
+    try:
+        file_stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None, None, None
+    return file_stat, read_first_timestamp_ms(index_path_for(filepath)), logical_size(filepath)
+
+def _apply_retention_to_file(filepath, package_id, device_id, cutoff_date, max_bytes):
+    """Menerapkan kebijakan retensi ke satu file log di bawah lock perangkat.
+
+    File yang terakhir ditulis sebelum cutoff dihapus seluruhnya (cursor di DB direset). File yang
+    masih aktif dipotong mulai dari entri pertama yang masih dalam periode retensi, dan jika
+    max_bytes > 0, entri tertua juga dibuang sampai ukuran logisnya <= max_bytes. cutoff_date None
+    berarti entri tidak pernah kedaluwarsa.
+    Mengembalikan (aksi, byte dibebaskan, entri dibuang) atau None jika tidak ada perubahan.
+    """
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with device_file_locks([filepath]):
+        adopt_legacy_log(filepath) # Log di layout datar lama dipindahkan dulu ke path kanonik
+        try:
+            file_stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+
+        first_kept_record, trim_offset, record_count = 0, 0, None
+        if cutoff_date is not None:
+            first_kept_record, trim_offset, record_count = find_retention_cut(filepath, cutoff_date)
+            if datetime.datetime.utcfromtimestamp(file_stat.st_mtime) < cutoff_date:
+                removed_bytes = delete_device_log(filepath)
+                log_writer.discard(filepath, index_path_for(filepath)) # Tutup handle pool agar ruang disk dibebaskan
+                # Indeks pencarian diselaraskan dan di-commit selagi lock masih dipegang
+                remove_device_entries(package_id, device_id)
+                db.session.commit()
+                return 'deleted', removed_bytes, record_count
+        if max_bytes:
+            size_cut = find_size_cut(filepath, max_bytes)
+            if size_cut[0] > first_kept_record:
+                first_kept_record, trim_offset, record_count = size_cut
+        if first_kept_record == 0:
+            return None
+
+        reclaimed_bytes = trim_log_prefix(
+            filepath, trim_offset, current_app.config.get('LOG_SEGMENT_COMPRESS_LEVEL', 6)
+        )
+        shift_log_index(filepath, first_kept_record, trim_offset)
+        invalidate_view_cache(filepath)
+        remove_trimmed_entries(package_id, device_id, trim_offset)
+        db.session.commit()
+        return 'trimmed', reclaimed_bytes, first_kept_record
+
+def _sweep_stale_temp_files(upload_folder, max_age_seconds=3600):
+    """Menghapus file .tmp sisa proses yang terhenti (rebuild indeks, seal segmen, cache gzip).
+
+    Jika lock perangkat memakai folder lock, file <log>.lock lama di pohon upload juga dihapus.
+    """
+    removed_count = 0
+    cutoff = datetime.datetime.utcnow().timestamp() - max_age_seconds
+    stale_suffixes = ('.tmp', LOCK_FILE_SUFFIX) if uses_lock_folder() else ('.tmp',)
+    pending_folders = [upload_folder]
+    while pending_folders:
+        try:
+            with os.scandir(pending_folders.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith('.'): # .locks, .cache, dll. dikelola modulnya sendiri
+                                pending_folders.append(entry.path)
+                        elif entry.name.endswith(stale_suffixes) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                            os.remove(entry.path)
+                            removed_count += 1
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return removed_count
 
 def cleanup_old_logs_task(app_instance): # Terima app_instance
-    """Tugas yang dijalankan oleh scheduler untuk membersihkan log lama."""
+    """Tugas yang dijalankan oleh scheduler untuk membersihkan log lama.
+
+    Metadata dibaca per batch (keyset pagination pada id) dan di-commit per batch, file di-stat
+    secara paralel, dan entri lama dipotong dari file yang masih aktif. Mengembalikan ringkasan.
+    """
+    job_started = time.perf_counter()
     with app_instance.app_context(): # Gunakan konteks dari app_instance
         current_app.logger.info("Starting scheduled log cleanup task...")
-        retention_period_days = get_log_retention_days_from_db()
+        # Kebijakan per package dibaca dari snapshot pengaturan (satu kali load, lalu lookup di memori)
+        settings_snapshot = get_settings_snapshot()
+        retention_period_days = settings_snapshot.default_policy.retention_days
         
         # Update juga di config jika perlu untuk referensi lain
         current_app.config['CURRENT_LOG_RETENTION_DAYS'] = retention_period_days 
         
-        cutoff_date = datetime.datetime.utcnow() - datetime.timedelta(days=retention_period_days)
+        now = datetime.datetime.utcnow()
+        cutoff_date = now - datetime.timedelta(days=retention_period_days)
         
         current_app.logger.info(f"Current log retention period: {retention_period_days} days. Cutoff date for old files: {cutoff_date.strftime('%Y-%m-%d %H:%M:%S UTC')}")
+        if settings_snapshot.package_overrides:
+            current_app.logger.info(f"{len(settings_snapshot.package_overrides)} packages have retention policy overrides.")
 
-        # Ambil semua metadata file log
-        # Kita akan cek tanggal modifikasi file, bukan last_processed_entry_timestamp,
-        # karena file bisa saja tidak diupdate tapi masih dalam periode retensi.
-        # Namun, jika file sangat besar dan hanya di-append, last_processed_entry_timestamp bisa jadi acuan kapan data terakhir masuk.
-        # Untuk kesederhanaan, kita gunakan tanggal modifikasi file fisik.
-        
-        device_log_files_metadata = DeviceLogFile.query.all()
-        cleaned_count = 0
         upload_folder = current_app.config['UPLOAD_FOLDER']
+        batch_size = current_app.config.get('CLEANUP_BATCH_SIZE', 500)
+        summary = {
+            "files_scanned": 0, "files_deleted": 0, "files_trimmed": 0,
+            "bytes_reclaimed": 0, "entries_removed": 0, "temp_files_removed": 0
+        }
+
+        # Package yang kebijakannya tidak pernah membuang data tidak perlu dibaca sama sekali
+        metadata_query = select(DeviceLogFile.id, DeviceLogFile.package_id, DeviceLogFile.device_id, DeviceLogFile.server_filename)
+        exempt_packages = settings_snapshot.packages_without_expiry()
+        if exempt_packages:
+            metadata_query = metadata_query.where(DeviceLogFile.package_id.notin_(exempt_packages))
+        policy_cutoffs = {}
 
-        for log_meta in device_log_files_metadata:
-            # Pastikan path file log dibuat dengan benar, termasuk subdirektori package_id
-            # Jika struktur folder: uploads/package_id/device_id.log
-            # server_filename di DB seharusnya hanya device_id.log
-            # atau server_filename di DB adalah path relatif: package_id/device_id.log
-            # Mari kita asumsikan server_filename di DB adalah nama file unik (misal package_id_device_id.log)
-            # dan disimpan langsung di UPLOAD_FOLDER.
-            # Jika Anda membuat subfolder per package_id, logika path perlu disesuaikan.
-            
-            # Asumsi: server_filename di DB adalah nama file unik seperti "com.app.1_device123.log"
-            # Jika Anda membuat struktur folder uploads/com.app.1/device123.log, maka:
-            # filepath = os.path.join(upload_folder, log_meta.package_id, log_meta.server_filename)
-            # Untuk saat ini, kita anggap server_filename sudah termasuk package_id jika diperlukan untuk keunikan,
-            # atau kita buat subfolder. Mari buat subfolder.
-
-            package_upload_folder = os.path.join(upload_folder, log_meta.package_id)
-            filepath = os.path.join(package_upload_folder, log_meta.server_filename) # server_filename di DB adalah device_id.log
-
-            if os.path.exists(filepath):
-                try:
-                    file_mod_timestamp = os.path.getmtime(filepath)
-                    file_mod_date = datetime.datetime.utcfromtimestamp(file_mod_timestamp) # Gunakan UTC
-
-                    if file_mod_date < cutoff_date:
+        last_seen_id = 0
+        with ThreadPoolExecutor(max_workers=current_app.config.get('CLEANUP_STAT_WORKERS', 8)) as stat_pool:
+            while True:
+                # Hanya kolom yang dibutuhkan, tanpa hidrasi objek ORM
+                rows = db.session.execute(
+                    metadata_query
+                    .where(DeviceLogFile.id > last_seen_id)
+                    .order_by(DeviceLogFile.id)
+                    .limit(batch_size)
+                    .execution_options(yield_per=batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_seen_id = rows[-1].id
+
+                filepaths = [device_log_path(row.package_id, row.server_filename) for row in rows]
+                # Path layout lama dihitung di sini karena thread pool tidak punya konteks aplikasi
+                legacy_filepaths = [legacy_log_path(filepath) for filepath in filepaths]
+                reset_ids_by_cutoff = {}
+                inspections = stat_pool.map(_inspect_log_file, filepaths, legacy_filepaths)
+                for row, filepath, (file_stat, first_timestamp_ms, log_size) in zip(rows, filepaths, inspections):
+                    if file_stat is None:
+                        continue
+                    summary["files_scanned"] += 1
+                    policy = settings_snapshot.policy_for(row.package_id)
+                    if policy not in policy_cutoffs:
+                        package_cutoff = now - datetime.timedelta(days=policy.retention_days) if policy.retention_days else None
+                        policy_cutoffs[policy] = (package_cutoff, timestamp_to_ms(package_cutoff) if package_cutoff else None)
+                    package_cutoff, package_cutoff_ms = policy_cutoffs[policy]
+
+                    # Lewati tanpa lock jika entri pertama (menurut indeks) masih dalam periode retensi
+                    # dan ukuran log masih di bawah batas
+                    is_expiring = package_cutoff is not None and (
+                        datetime.datetime.utcfromtimestamp(file_stat.st_mtime) < package_cutoff or
+                        first_timestamp_ms is None or first_timestamp_ms < package_cutoff_ms
+                    )
+                    is_oversized = bool(policy.max_bytes_per_device) and log_size > policy.max_bytes_per_device
+                    if not (is_expiring or is_oversized):
+                        continue
+                    try:
+                        outcome = _apply_retention_to_file(
+                            filepath, row.package_id, row.device_id, package_cutoff, policy.max_bytes_per_device
+                        )
+                    except Exception as e:
+                        db.session.rollback()
+                        current_app.logger.error(f"Error applying retention to log file {filepath}: {e}", exc_info=True)
+                        continue
+                    if outcome is None:
+                        continue
+
+                    action, reclaimed_bytes, removed_entries = outcome
+                    summary["bytes_reclaimed"] += reclaimed_bytes
+                    summary["entries_removed"] += removed_entries
+                    if action == 'deleted':
+                        summary["files_deleted"] += 1
+                        reset_ids_by_cutoff.setdefault(package_cutoff, []).append(row.id)
+                        cursor_cache.invalidate((row.package_id, row.device_id))
                         current_app.logger.info(
-                            f"Log file {filepath} (last modified: {file_mod_date.strftime('%Y-%m-%d %H:%M:%S UTC')}) "
-                            f"is older than {retention_period_days} days. Resetting..."
+                            f"Log file {filepath} (last modified: {datetime.datetime.utcfromtimestamp(file_stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S UTC')}) "
+                            f"is older than {policy.retention_days} days. Deleted and reset metadata."
                         )
-                        
-                        os.remove(filepath) # Hapus file fisik
-                        
-                        # Reset timestamp di database
-                        log_meta.last_processed_entry_timestamp = None
-                        # db.session.delete(log_meta) # Atau hapus entri metadata juga? Untuk saat ini reset timestamp.
-                        db.session.add(log_meta) # Tandai untuk di-update
-                        
-                        current_app.logger.info(f"Successfully reset (deleted file and updated metadata for) {filepath}.")
-                        cleaned_count += 1
-                except Exception as e:
-                    current_app.logger.error(f"Error processing or deleting log file {filepath}: {e}", exc_info=True)
-            # else:
-            #     current_app.logger.warning(f"Log file {filepath} for package {log_meta.package_id}, device {log_meta.device_id} not found on disk during cleanup.")
-
-        if cleaned_count > 0:
-            db.session.commit() # Commit semua perubahan DB sekaligus
-            current_app.logger.info(f"Log cleanup task finished. {cleaned_count} log files were reset.")
-        else:
-            current_app.logger.info("Log cleanup task finished. No log files needed resetting.")
+                    else:
+                        summary["files_trimmed"] += 1
+                        current_app.logger.info(f"Trimmed {removed_entries} expired entries ({reclaimed_bytes} bytes) from {filepath}.")
+
+                for package_cutoff, reset_ids in reset_ids_by_cutoff.items():
+                    # Reset cursor hanya jika tidak ada unggahan baru sejak cutoff (updated_at maju saat ada entri baru)
+                    db.session.execute(
+                        update(DeviceLogFile)
+                        .where(DeviceLogFile.id.in_(reset_ids))
+                        .where(or_(DeviceLogFile.updated_at.is_(None), DeviceLogFile.updated_at < package_cutoff))
+                        .values(last_processed_entry_timestamp=None)
+                    )
+                    # State jendela dedup perangkat yang cursornya direset ikut dihapus (mulai dari kosong)
+                    db.session.execute(
+                        delete(DeviceDedupState)
+                        .where(tuple_(DeviceDedupState.package_id, DeviceDedupState.device_id).in_(
+                            select(DeviceLogFile.package_id, DeviceLogFile.device_id)
+                            .where(DeviceLogFile.id.in_(reset_ids))
+                            .where(DeviceLogFile.last_processed_entry_timestamp.is_(None))
+                        ))
+                    )
+                db.session.commit() # Commit per batch agar transaksi tetap kecil
+
+        if os.path.isdir(upload_folder):
+            summary["temp_files_removed"] = _sweep_stale_temp_files(upload_folder)
+
+        current_app.logger.info(
+            f"Log cleanup task finished. Scanned {summary['files_scanned']} files: {summary['files_deleted']} deleted, "
+            f"{summary['files_trimmed']} trimmed, {summary['entries_removed']} entries and "
+            f"{summary['bytes_reclaimed']} bytes reclaimed."
+        )
+
+        purged_rollups = purge_old_rollups(current_app.config.get('ERROR_ROLLUP_RETENTION_DAYS', 400))
+        db.session.commit()
+        if purged_rollups:
+            current_app.logger.info(f"Purged {purged_rollups} expired error rollup buckets.")
+
+        if current_app.config.get('INGEST_ASYNC_MODE'):
+            from ..services.ingest_queue import ingest_queue
+            purged_count = ingest_queue.purge_finished_jobs(current_app.config['INGEST_JOB_RESULT_RETENTION_HOURS'])
+            current_app.logger.info(f"Purged {purged_count} finished ingest job results.")
+
+        metrics.FILES_RECLAIMED.labels('deleted').inc(summary["files_deleted"])
+        metrics.FILES_RECLAIMED.labels('trimmed').inc(summary["files_trimmed"])
+        metrics.BYTES_RECLAIMED.inc(summary["bytes_reclaimed"])
+        metrics.SCHEDULER_JOB_SECONDS.labels('cleanup_old_logs').observe(time.perf_counter() - job_started)
+        return summary
 
 
 def schedule_cleanup_job(app_instance, scheduler_instance):
@@ -0,0 +1,5 @@
+"""Suite benchmark dan load test mobile-log-api (offline, SQLite sementara).
+
+    python -m benchmarks.run --suite all --output bench-results.json
+    python -m benchmarks.run --baseline bench-baseline.json --threshold 0.2
+"""
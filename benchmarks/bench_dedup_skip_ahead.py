@@ -0,0 +1,97 @@
+"""Micro-benchmark dedup unggahan: pemindaian penuh (strptime per entri) vs skip-ahead berbasis string.
+
+Membuat unggahan sintetis ~16MB yang 99% isinya sudah pernah diproses, lalu membandingkan
+waktu yang dibutuhkan untuk menemukan entri baru. Jalankan dari root repo:
+
+    python -m benchmarks.bench_dedup_skip_ahead --size-mb 16 --duplicate-ratio 0.99
+"""
+import io
+import argparse
+import datetime
+
+from .harness import prepare_environment, create_bench_app, best_of, BenchResults
+
+ENTRY_TEMPLATE = (
+    "--- API Error Log ---\n"
+    "Timestamp: {timestamp}\n"
+    "Device Name: Pixel 7\n"
+    "Device ID: bench-device\n"
+    "Endpoint: /api/v1/orders/{n}\n"
+    "Method: POST\n"
+    "Status Code: 500\n"
+    "Response Body: {{\"error\": \"Internal Server Error\", \"trace_id\": \"{n:08x}\"}}\n"
+    "--- End Log Entry ---\n"
+)
+
+
+def build_upload(size_bytes, duplicate_ratio):
+    """Membuat isi unggahan dan timestamp terakhir yang dianggap sudah tersimpan di server."""
+    base = datetime.datetime(2026, 1, 1)
+    entries = []
+    total = 0
+    n = 0
+    while total < size_bytes:
+        timestamp = (base + datetime.timedelta(milliseconds=n * 7)).strftime("%Y-%m-%d %H:%M:%S.%f")[:23]
+        entry = ENTRY_TEMPLATE.format(timestamp=timestamp, n=n)
+        entries.append(entry)
+        total += len(entry)
+        n += 1
+    duplicate_count = int(len(entries) * duplicate_ratio)
+    last_known = base + datetime.timedelta(milliseconds=(duplicate_count - 1) * 7)
+    return "".join(entries).encode('utf-8'), last_known, len(entries) - duplicate_count
+
+
+def full_scan(payload, last_known, log_service):
+    """Perilaku lama: decode seluruh isi lalu strptime untuk setiap entri."""
+    accepted = 0
+    for match in log_service.LOG_ENTRY_REGEX.finditer(payload.decode('utf-8')):
+        entry_timestamp = log_service.parse_timestamp_from_log_entry_str(match.group(1))
+        if entry_timestamp and entry_timestamp > last_known:
+            accepted += 1
+    return accepted
+
+
+def skip_ahead_scan(payload, last_known, log_service):
+    """Jalur cepat: lompat ke entri baru pertama lalu bandingkan timestamp sebagai string."""
+    stream = io.BytesIO(payload)
+    last_known_str = log_service.truncate_timestamp_for_compare(last_known)
+    offset = log_service.find_first_newer_entry_offset(stream, last_known_str)
+    if offset is None:
+        return 0
+    stream.seek(offset)
+    accepted = 0
+    for match in log_service.iter_log_entries(stream):
+        if match.group(1) > last_known_str and log_service.parse_timestamp_from_log_entry_str(match.group(1)):
+            accepted += 1
+    return accepted
+
+
+def run(results, size_mb=16, duplicate_ratio=0.99, repeat=3):
+    from app.services import log_service
+
+    app = create_bench_app()
+    payload, last_known, expected_new = build_upload(int(size_mb * 1024 * 1024), duplicate_ratio)
+    print(f"Dedup suite: {len(payload) / (1024 * 1024):.1f} MB ({duplicate_ratio:.0%} duplicates), {expected_new} new entries")
+
+    with app.app_context():
+        full_time, full_result = best_of(lambda: full_scan(payload, last_known, log_service), repeat)
+        skip_time, skip_result = best_of(lambda: skip_ahead_scan(payload, last_known, log_service), repeat)
+
+    assert full_result == skip_result == expected_new, (full_result, skip_result, expected_new)
+    results.add_latency_ms("dedup.full_scan_ms", full_time)
+    results.add_latency_ms("dedup.skip_ahead_scan_ms", skip_time)
+    results.add("dedup.skip_ahead_speedup", full_time / skip_time, "x", True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=16)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.99)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    prepare_environment()
+    run(BenchResults(vars(args)), args.size_mb, args.duplicate_ratio, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""Benchmark end-to-end: upload, view, metadata, dan cleanup_old_logs_task untuk ribuan perangkat sintetis.
+
+Semua berjalan offline dengan SQLite di folder sementara: lewat Flask test client, lalu lewat server
+WSGI lokal (werkzeug, threaded) dengan beberapa klien HTTP paralel.
+
+    python -m benchmarks.bench_e2e --devices 2000 --size-kb 4
+"""
+import io
+import time
+import uuid
+import argparse
+import datetime
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+from .harness import prepare_environment, create_bench_app, percentile, BenchResults, BENCH_HEADERS
+from .generator import DeviceLogGenerator, format_timestamp
+
+PACKAGE_ID = "com.example.bench"
+
+
+def _timed_requests(request_func, items):
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        request_started = time.perf_counter()
+        request_func(item)
+        latencies.append(time.perf_counter() - request_started)
+    return time.perf_counter() - started, latencies
+
+def _add_request_metrics(results, name, elapsed, latencies):
+    results.add_throughput(f"{name}_per_s", len(latencies), elapsed, "req/s")
+    results.add_latency_ms(f"{name}_p95_ms", percentile(latencies, 0.95))
+
+
+def _bench_test_client(results, app, generators, start, size_bytes, duplicate_ratio, batch_size, view_sample):
+    client = app.test_client()
+
+    def upload(generator, payload):
+        response = client.post('/api/v1/logs/upload', headers=BENCH_HEADERS, data={
+            'package_id': PACKAGE_ID, 'device_id': generator.device_id,
+            'log_file': (io.BytesIO(payload), 'app.log')
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    initial_uploads = [(generator, generator.next_upload(size_bytes)[0]) for generator in generators]
+    elapsed, latencies = _timed_requests(lambda item: upload(*item), initial_uploads)
+    _add_request_metrics(results, "upload.initial", elapsed, latencies)
+
+    repeat_uploads = [(generator, generator.next_upload(size_bytes, duplicate_ratio)[0]) for generator in generators]
+    elapsed, latencies = _timed_requests(lambda item: upload(*item), repeat_uploads)
+    _add_request_metrics(results, "upload.repeat_with_duplicates", elapsed, latencies)
+
+    def upload_batch(batch):
+        response = client.post('/api/v1/logs/upload/batch', headers=BENCH_HEADERS, data={
+            'package_id': PACKAGE_ID,
+            'device_id': [generator.device_id for generator, _ in batch],
+            'log_file': [(io.BytesIO(payload), 'app.log') for _, payload in batch]
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    batch_uploads = [(generator, generator.next_upload(size_bytes, duplicate_ratio)[0]) for generator in generators]
+    batches = [batch_uploads[start:start + batch_size] for start in range(0, len(batch_uploads), batch_size)]
+    elapsed, _ = _timed_requests(upload_batch, batches)
+    results.add_throughput("upload.batch_devices_per_s", len(batch_uploads), elapsed, "devices/s")
+
+    sample = generators[:view_sample]
+    def view(generator, **query):
+        response = client.get(f'/api/v1/logs/view/{PACKAGE_ID}/{generator.device_id}', headers=BENCH_HEADERS, query_string=query)
+        assert response.status_code == 200, response.status_code
+        response.get_data()
+    elapsed, latencies = _timed_requests(view, sample)
+    _add_request_metrics(results, "view.full", elapsed, latencies)
+    time_range = {
+        'from': format_timestamp(start + datetime.timedelta(seconds=10)),
+        'to': format_timestamp(start + datetime.timedelta(minutes=5))
+    }
+    elapsed, latencies = _timed_requests(lambda generator: view(generator, **time_range), sample)
+    _add_request_metrics(results, "view.time_range", elapsed, latencies)
+
+    def metadata(query):
+        response = client.get('/api/v1/logs/metadata', headers=BENCH_HEADERS, query_string=query)
+        assert response.status_code == 200, response.status_code
+        return response
+    started = time.perf_counter()
+    metadata({}).get_data()
+    results.add_latency_ms("metadata.list_all_ms", time.perf_counter() - started)
+    started = time.perf_counter()
+    metadata({'format': 'ndjson'}).get_data()
+    results.add_latency_ms("metadata.ndjson_ms", time.perf_counter() - started)
+    started = time.perf_counter()
+    cursor = None
+    while True:
+        page = metadata({'limit': 500, **({'cursor': cursor} if cursor else {})}).get_json()
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    results.add_latency_ms("metadata.paginated_walk_ms", time.perf_counter() - started)
+
+
+def _bench_cleanup(results, app, size_bytes, device_count):
+    from app.utils.scheduler_tasks import cleanup_old_logs_task
+    from app.services import setting_service
+
+    started = time.perf_counter()
+    summary = cleanup_old_logs_task(app)
+    results.add_latency_ms("cleanup.scan_only_ms", time.perf_counter() - started)
+    assert summary["files_trimmed"] == 0, summary
+
+    # Batas ukuran per perangkat memaksa setiap file dipotong
+    with app.app_context():
+        setting_service.set_package_settings(PACKAGE_ID, {"max_bytes_per_device": size_bytes})
+    started = time.perf_counter()
+    summary = cleanup_old_logs_task(app)
+    results.add_latency_ms("cleanup.trim_all_ms", time.perf_counter() - started)
+    assert summary["files_trimmed"] == device_count, summary
+    with app.app_context():
+        setting_service.delete_package_settings(PACKAGE_ID)
+
+
+def _multipart_body(fields, file_field, filename, payload):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f'Content-Type: text/plain\r\n\r\n'.encode('utf-8') + payload + b'\r\n'
+    )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+def _bench_wsgi_server(results, app, generators, size_bytes, duplicate_ratio, concurrency):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    local = threading.local()
+
+    def request(method, path, body=None, headers=None):
+        if getattr(local, 'connection', None) is None:
+            local.connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=60)
+        local.connection.request(method, path, body=body, headers={**BENCH_HEADERS, **(headers or {})})
+        response = local.connection.getresponse()
+        response.read()
+        assert response.status == 200, response.status
+
+    def upload(item):
+        generator, payload = item
+        body, content_type = _multipart_body(
+            {'package_id': PACKAGE_ID, 'device_id': generator.device_id}, 'log_file', 'app.log', payload
+        )
+        started = time.perf_counter()
+        request('POST', '/api/v1/logs/upload', body, {'Content-Type': content_type})
+        return time.perf_counter() - started
+
+    def view(generator):
+        started = time.perf_counter()
+        request('GET', f'/api/v1/logs/view/{PACKAGE_ID}/{generator.device_id}')
+        return time.perf_counter() - started
+
+    try:
+        uploads = [(generator, generator.next_upload(size_bytes, duplicate_ratio)[0]) for generator in generators]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            latencies = list(pool.map(upload, uploads))
+            _add_request_metrics(results, "wsgi.upload", time.perf_counter() - started, latencies)
+            started = time.perf_counter()
+            latencies = list(pool.map(view, generators))
+            _add_request_metrics(results, "wsgi.view_full", time.perf_counter() - started, latencies)
+    finally:
+        server.shutdown()
+        server_thread.join()
+
+
+def run(results, devices=1000, size_kb=4, duplicate_ratio=0.8, batch_size=50, view_sample=200, concurrency=8,
+        out_of_order_rate=0.01):
+    app = create_bench_app()
+    size_bytes = int(size_kb * 1024)
+    # Timestamp dimulai kemarin agar entri tidak langsung kedaluwarsa oleh retensi default
+    start = datetime.datetime.now().replace(microsecond=0) - datetime.timedelta(days=1)
+    generators = [
+        DeviceLogGenerator(f"bench-device-{number:05d}", start=start, out_of_order_rate=out_of_order_rate)
+        for number in range(devices)
+    ]
+    print(f"End-to-end suite: {devices} devices, {size_kb} KB per upload, {duplicate_ratio:.0%} duplicates on re-upload")
+    _bench_test_client(results, app, generators, start, size_bytes, duplicate_ratio, batch_size, min(view_sample, devices))
+    _bench_cleanup(results, app, size_bytes, len(generators))
+    _bench_wsgi_server(results, app, generators, size_bytes, duplicate_ratio, concurrency)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--size-kb', type=float, default=4)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.8)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args(argv)
+    prepare_environment()
+    run(BenchResults(vars(args)), args.devices, args.size_kb, args.duplicate_ratio, args.batch_size, concurrency=args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
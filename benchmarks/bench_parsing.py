@@ -0,0 +1,46 @@
+"""Micro-benchmark parsing: LOG_ENTRY_REGEX, parse_timestamp_from_log_entry_str, dan iter_log_entries.
+
+    python -m benchmarks.bench_parsing --size-mb 8
+"""
+import io
+import argparse
+
+from .harness import prepare_environment, create_bench_app, best_of, BenchResults
+from .generator import DeviceLogGenerator
+
+
+def run(results, size_mb=8, repeat=3, out_of_order_rate=0.05):
+    from app.services import log_service
+
+    payload, entry_count = DeviceLogGenerator("bench-parse", out_of_order_rate=out_of_order_rate).next_upload(int(size_mb * 1024 * 1024))
+    text = payload.decode('utf-8')
+    payload_mb = len(payload) / (1024 * 1024)
+    print(f"Parsing suite: {payload_mb:.1f} MB, {entry_count} entries")
+
+    regex_time, matches = best_of(lambda: [match.group(1) for match in log_service.LOG_ENTRY_REGEX.finditer(text)], repeat)
+    assert len(matches) == entry_count, (len(matches), entry_count)
+    results.add_throughput("parse.regex_finditer_entries_per_s", entry_count, regex_time, "entries/s")
+    results.add_throughput("parse.regex_finditer_mb_per_s", payload_mb, regex_time, "MB/s")
+
+    timestamp_time, parsed = best_of(lambda: [log_service.parse_timestamp_from_log_entry_str(value) for value in matches], repeat)
+    assert all(parsed)
+    results.add_throughput("parse.parse_timestamp_per_s", len(matches), timestamp_time, "calls/s")
+
+    app = create_bench_app()
+    with app.app_context():
+        stream_time, streamed_count = best_of(lambda: sum(1 for _ in log_service.iter_log_entries(io.BytesIO(payload))), repeat)
+    assert streamed_count == entry_count, (streamed_count, entry_count)
+    results.add_throughput("parse.iter_log_entries_mb_per_s", payload_mb, stream_time, "MB/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    prepare_environment()
+    run(BenchResults(vars(args)), args.size_mb, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Generator log mobile sintetis dengan format uploads/file.log.example.
+
+Setiap perangkat punya riwayat entri lokal yang terus bertambah; seperti aplikasi Flutter, setiap
+unggahan mengirim ulang sebagian riwayat lama (duplicate_ratio) ditambah entri baru. Sebagian entri
+bisa ditulis tidak berurutan (out_of_order_rate), seperti log yang di-flush dari beberapa isolate.
+
+    python -m benchmarks.generator --devices 5 --size-kb 256 --out /tmp/synthetic_logs
+"""
+import os
+import random
+import argparse
+import datetime
+
+ENTRY_TEMPLATE = (
+    "--- API Error Log ---\n"
+    "Timestamp: {timestamp}\n"
+    "Device Name: {device_name}\n"
+    "Device ID: {device_id}\n"
+    "Endpoint: {endpoint}\n"
+    "Method: {method}\n"
+    "Status Code: {status_code}\n"
+    "Response Body: {body}\n"
+    "--- End Log Entry ---\n"
+)
+DEVICE_NAMES = ("Pixel 7", "Pixel 8 Pro", "Galaxy S23", "Galaxy A54", "iPhone 14", "iPhone 15 Pro", "Redmi Note 12")
+ENDPOINTS = (
+    ("GET", "https://api.example.com/api/v1/orders/{id}"),
+    ("POST", "https://api.example.com/api/v1/orders"),
+    ("GET", "https://api.example.com/api/v1/users/{id}/profile"),
+    ("PUT", "https://api.example.com/api/v1/users/{id}/settings?lang=id"),
+    ("POST", "https://api.example.com/api/v1/payments/charge"),
+    ("GET", "https://api.example.com/api/v1/catalog/search?q=sepatu"),
+    ("DELETE", "https://api.example.com/api/v1/cart/items/{id}"),
+)
+ERRORS = (
+    (500, '{{"error": "Internal Server Error", "trace_id": "{trace}"}}'),
+    (502, '{{"error": "Bad Gateway"}}'),
+    (503, '{{"error": "Service Unavailable", "retry_after": 30}}'),
+    (504, '{{"error": "Gateway Timeout", "upstream": "payments"}}'),
+    (400, '{{"error": "Validation failed", "fields": ["email", "phone"]}}'),
+    (401, '{{"error": "Token expired"}}'),
+    (404, '{{"error": "Not Found", "path": "/api/v1/orders/{trace}"}}'),
+    (429, '{{"error": "Too Many Requests"}}'),
+)
+
+
+def format_timestamp(timestamp_obj):
+    return timestamp_obj.strftime("%Y-%m-%d %H:%M:%S.%f")[:23]
+
+def render_entry(timestamp_obj, device_id, rng):
+    method, endpoint = rng.choice(ENDPOINTS)
+    status_code, body = rng.choice(ERRORS)
+    trace = f"{rng.getrandbits(48):012x}"
+    return ENTRY_TEMPLATE.format(
+        timestamp=format_timestamp(timestamp_obj),
+        device_name=rng.choice(DEVICE_NAMES),
+        device_id=device_id,
+        endpoint=endpoint.format(id=rng.randint(1, 99999)),
+        method=method,
+        status_code=status_code,
+        body=body.format(trace=trace)
+    )
+
+
+class DeviceLogGenerator:
+    """Riwayat log lokal satu perangkat; next_upload() menghasilkan isi unggahan berikutnya (bytes)."""
+
+    def __init__(self, device_id, seed=0, start=None, mean_interval_ms=1500, out_of_order_rate=0.0):
+        self.device_id = device_id
+        self.rng = random.Random(f"{seed}:{device_id}")
+        self.current_time = start or datetime.datetime(2026, 1, 1)
+        self.mean_interval_ms = mean_interval_ms
+        self.out_of_order_rate = out_of_order_rate
+        self.history = [] # Entri yang sudah pernah diunggah, urut seperti di file lokal perangkat
+
+    def _new_entries(self, size_bytes):
+        entries = []
+        total_size = 0
+        while total_size < size_bytes:
+            self.current_time += datetime.timedelta(milliseconds=max(1, int(self.rng.expovariate(1 / self.mean_interval_ms))))
+            entry = render_entry(self.current_time, self.device_id, self.rng)
+            entries.append(entry)
+            total_size += len(entry)
+        # Tukar sebagian entri bersebelahan agar urutan timestamp di file tidak selalu naik
+        for index in range(len(entries) - 1):
+            if self.rng.random() < self.out_of_order_rate:
+                entries[index], entries[index + 1] = entries[index + 1], entries[index]
+        return entries
+
+    def next_upload(self, size_bytes, duplicate_ratio=0.0):
+        """Isi unggahan ~size_bytes: bagian duplicate_ratio berasal dari riwayat, sisanya entri baru."""
+        duplicate_budget = int(size_bytes * duplicate_ratio)
+        duplicates = []
+        duplicate_size = 0
+        for entry in reversed(self.history):
+            if duplicate_size >= duplicate_budget:
+                break
+            duplicates.append(entry)
+            duplicate_size += len(entry)
+        duplicates.reverse()
+        new_entries = self._new_entries(max(size_bytes - duplicate_size, 1))
+        self.history.extend(new_entries)
+        return "".join(duplicates + new_entries).encode('utf-8'), len(new_entries)
+
+
+def generate_device_logs(device_count, size_bytes, duplicate_ratio=0.0, out_of_order_rate=0.0, seed=0, prefix="bench-device"):
+    """Satu unggahan per perangkat: list (device_id, bytes isi, jumlah entri baru)."""
+    uploads = []
+    for device_number in range(device_count):
+        generator = DeviceLogGenerator(f"{prefix}-{device_number:05d}", seed=seed, out_of_order_rate=out_of_order_rate)
+        if duplicate_ratio:
+            generator.next_upload(size_bytes) # Riwayat awal yang dianggap sudah pernah diunggah
+        payload, new_count = generator.next_upload(size_bytes, duplicate_ratio)
+        uploads.append((generator.device_id, payload, new_count))
+    return uploads
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=5)
+    parser.add_argument('--size-kb', type=float, default=256, help='Ukuran per file log (KB).')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0)
+    parser.add_argument('--out-of-order-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True, help='Folder tujuan file <device_id>.log.')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    for device_id, payload, new_count in generate_device_logs(
+        args.devices, int(args.size_kb * 1024), args.duplicate_ratio, args.out_of_order_rate, args.seed
+    ):
+        with open(os.path.join(args.out, f"{device_id}.log"), 'wb') as f:
+            f.write(payload)
+        print(f"{device_id}.log: {len(payload)} bytes, {new_count} new entries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Utilitas bersama benchmark: lingkungan SQLite sementara, pengukuran waktu, hasil JSON, dan cek regresi."""
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+BENCH_API_KEY = "bench-api-key"
+BENCH_HEADERS = {"X-API-KEY": BENCH_API_KEY}
+
+
+def prepare_environment(workdir=None):
+    """Mengarahkan DB, folder upload, dan spool ke folder sementara. Harus dipanggil sebelum `import app`,
+    karena kelas Config membaca environment variable saat diimpor."""
+    workdir = workdir or tempfile.mkdtemp(prefix='log_api_bench_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    os.environ['INGEST_SPOOL_FOLDER'] = os.path.join(workdir, 'spool')
+    os.environ['LOG_API_KEY'] = BENCH_API_KEY
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    return workdir
+
+def create_bench_app(**config_overrides):
+    """create_app() dengan rate limiter dimatikan dan log aplikasi diredam."""
+    from app import create_app, limiter
+
+    app = create_app()
+    app.config.update(config_overrides)
+    app.logger.setLevel(os.environ.get('LOG_LEVEL', 'WARNING'))
+    limiter.enabled = False
+    return app
+
+def best_of(func, repeat=3):
+    """Menjalankan func beberapa kali; mengembalikan (waktu tercepat dalam detik, hasil terakhir)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class BenchResults:
+    """Kumpulan metrik satu run benchmark; setiap metrik punya unit dan arah (lebih besar/kecil lebih baik)."""
+
+    def __init__(self, params=None):
+        self.params = params or {}
+        self.metrics = {}
+
+    def add(self, name, value, unit, higher_is_better):
+        self.metrics[name] = {"value": round(value, 4), "unit": unit, "higher_is_better": higher_is_better}
+        direction = "higher is better" if higher_is_better else "lower is better"
+        print(f"  {name:<45} {value:>14,.2f} {unit:<12} ({direction})")
+
+    def add_throughput(self, name, count, seconds, unit):
+        self.add(name, count / seconds if seconds else 0.0, unit, True)
+
+    def add_latency_ms(self, name, seconds):
+        self.add(name, seconds * 1000, "ms", False)
+
+    def to_dict(self):
+        return {
+            "meta": {
+                "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+                "git_commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "params": self.params
+            },
+            "metrics": self.metrics
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare_results(current, baseline, default_threshold, thresholds=None):
+    """Membandingkan dua hasil (dict dari BenchResults.to_dict); mengembalikan list regresi.
+
+    thresholds dapat berisi ambang per metrik (fraksi, misalnya 0.25 = boleh 25% lebih buruk).
+    Metrik yang tidak ada di salah satu run dilewati.
+    """
+    thresholds = thresholds or {}
+    regressions = []
+    for name, metric in sorted(current["metrics"].items()):
+        baseline_metric = baseline.get("metrics", {}).get(name)
+        if not baseline_metric or not baseline_metric["value"]:
+            continue
+        threshold = thresholds.get(name, default_threshold)
+        change = (metric["value"] - baseline_metric["value"]) / baseline_metric["value"]
+        worse_by = -change if metric["higher_is_better"] else change
+        if worse_by > threshold:
+            regressions.append({
+                "metric": name,
+                "baseline": baseline_metric["value"],
+                "current": metric["value"],
+                "unit": metric["unit"],
+                "worse_by": round(worse_by, 4),
+                "threshold": threshold
+            })
+    return regressions
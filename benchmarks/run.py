@@ -0,0 +1,68 @@
+"""Menjalankan suite benchmark, menulis hasil JSON, dan membandingkannya dengan baseline.
+
+    python -m benchmarks.run --suite all --output bench-results.json
+    python -m benchmarks.run --baseline bench-baseline.json --threshold 0.2 --thresholds bench-thresholds.json
+
+Exit code 1 jika ada metrik yang lebih buruk dari ambang regresi terhadap baseline.
+File --thresholds berisi ambang per metrik, misalnya {"wsgi.upload_per_s": 0.35}.
+"""
+import sys
+import json
+import argparse
+
+from .harness import prepare_environment, compare_results, BenchResults
+
+SUITES = ('parsing', 'dedup', 'e2e')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suite', choices=('all',) + SUITES, default='all')
+    parser.add_argument('--output', default='bench-results.json', help='File hasil JSON.')
+    parser.add_argument('--baseline', help='File hasil JSON sebelumnya untuk cek regresi.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Ambang regresi default (fraksi, 0.2 = 20%% lebih buruk).')
+    parser.add_argument('--thresholds', help='File JSON berisi ambang per metrik.')
+    parser.add_argument('--size-mb', type=float, default=8, help='Ukuran unggahan untuk suite parsing dan dedup.')
+    parser.add_argument('--devices', type=int, default=1000, help='Jumlah perangkat untuk suite e2e.')
+    parser.add_argument('--size-kb', type=float, default=4, help='Ukuran unggahan per perangkat untuk suite e2e.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Jumlah klien HTTP paralel untuk server WSGI.')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    # Environment harus siap sebelum modul app diimpor oleh suite
+    prepare_environment()
+    from . import bench_parsing, bench_dedup_skip_ahead, bench_e2e
+
+    suites = SUITES if args.suite == 'all' else (args.suite,)
+    results = BenchResults(vars(args))
+    if 'parsing' in suites:
+        bench_parsing.run(results, args.size_mb, args.repeat)
+    if 'dedup' in suites:
+        bench_dedup_skip_ahead.run(results, args.size_mb, repeat=args.repeat)
+    if 'e2e' in suites:
+        bench_e2e.run(results, args.devices, args.size_kb, concurrency=args.concurrency)
+    results.write(args.output)
+    print(f"Results written to {args.output}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    thresholds = {}
+    if args.thresholds:
+        with open(args.thresholds, encoding='utf-8') as f:
+            thresholds = json.load(f)
+    regressions = compare_results(results.to_dict(), baseline, args.threshold, thresholds)
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']} {regression['unit']} "
+            f"({regression['worse_by']:.0%} worse, threshold {regression['threshold']:.0%})"
+        )
+    if regressions:
+        return 1
+    print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+# Konfigurasi gunicorn untuk produksi:  gunicorn -c gunicorn.conf.py run:app
+#
+# App dimuat sekali di master (preload_app) sehingga startup di create_app (db.create_all,
+# inisialisasi pengaturan) hanya berjalan sekali, lalu di-fork ke beberapa worker. Scheduler dan
+# worker ingest dimulai di setiap worker setelah fork; hanya worker yang memenangkan lock
+# SCHEDULER_LOCK_FILE yang menjalankan job APScheduler.
+import os
+import glob
+import tempfile
+import multiprocessing
+
+# Harus di-set sebelum app (dan prometheus_client) diimpor oleh preload_app
+os.environ['PREFORK_SERVER'] = 'true'
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'mobile_log_api_metrics'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120)) # Unggahan batch besar bisa lama
+graceful_timeout = 30
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+preload_app = True
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') # Misalnya '-' untuk stdout; default mati
+
+
+def on_starting(server):
+    # Sisa metrik dari run sebelumnya (pid lama) akan ikut dijumlahkan jika tidak dihapus
+    for path in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+        os.remove(path)
+
+def post_fork(server, worker):
+    from app import db, start_background_services
+
+    app = server.app.wsgi()
+    with app.app_context():
+        # Koneksi pool milik master tidak boleh dipakai bersama; worker membuka koneksinya sendiri
+        db.engine.dispose(close=False)
+    start_background_services(app)